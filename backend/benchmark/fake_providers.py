@@ -0,0 +1,380 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import logging
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Median latency (seconds) and spread (sigma of the log-normal distribution) of every upstream call
+DEFAULT_PROFILE = {
+    "groq": (0.3, 0.3),
+    "newsapi": (0.4, 0.4),
+    "reddit_token": (0.3, 0.3),
+    "reddit": (0.6, 0.5),
+    "vectara_index": (0.2, 0.3),
+    "vectara_query": (1.5, 0.4),
+    "openai_chat": (2.0, 0.4),
+    "openai_images": (8.0, 0.3),
+    "imgflip": (0.3, 0.3),
+    "runway_create": (0.5, 0.3),
+    "runway_render": (20.0, 0.3),  # Time a render stays RUNNING
+    "runway_poll": (0.1, 0.3),
+}
+
+# Share of the latency of a streamed response spent before its first token (or search results)
+FIRST_TOKEN_SHARE = 0.2
+
+
+class ProviderProfile:
+    """
+    Latency and error model of the fake providers.
+
+    Latencies follow a log-normal distribution around their median; each call fails with a
+    503, or is throttled with a 429 and a `Retry-After`, with the configured probabilities.
+
+    Args:
+        latencies (dict): Endpoint name -> (median seconds, sigma). Missing endpoints use the defaults.
+        error_rates (dict): Endpoint name -> probability of returning an error.
+        scale (float): Multiplier applied to every latency, e.g. 0.1 for quick runs.
+        throttle_rates (dict): Endpoint name -> probability of returning a 429.
+        retry_after (float): `Retry-After` of the 429 responses, in seconds.
+    """
+
+    def __init__(self, latencies: dict = None, error_rates: dict = None, scale: float = 1.0,
+                 throttle_rates: dict = None, retry_after: float = 1.0):
+        self.latencies = {**DEFAULT_PROFILE, **(latencies or {})}
+        self.error_rates = error_rates or {}
+        self.scale = scale
+        self.throttle_rates = throttle_rates or {}
+        self.retry_after = retry_after
+
+    def latency(self, endpoint: str) -> float:
+        median, sigma = self.latencies[endpoint]
+        return median * self.scale * random.lognormvariate(0, sigma)
+
+    def fails(self, endpoint: str) -> bool:
+        return random.random() < self.error_rates.get(endpoint, 0.0)
+
+    def throttles(self, endpoint: str) -> bool:
+        return random.random() < self.throttle_rates.get(endpoint, 0.0)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _chat_completion(content: str) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    }
+
+
+async def _chat_stream(content: str, duration: float):
+    # The completion as server-sent chunks, one per word, spread over `duration`
+    words = content.split(" ")
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+    for i, word in enumerate(words):
+        if i:
+            await asyncio.sleep(duration / len(words))
+        delta = {"content": word if i == 0 else f" {word}"}
+        yield "data: " + json.dumps(_chat_chunk(chunk_id, delta, None)) + "\n\n"
+    yield "data: " + json.dumps(_chat_chunk(chunk_id, {}, "stop")) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def _query_stream(query: str, duration: float):
+    # A Vectara streamed query: the search results, then the summary one word at a time over `duration`
+    def event(kind: str, **fields) -> str:
+        return f"event:{kind}\ndata:" + json.dumps({"type": kind, **fields}) + "\n\n"
+
+    yield event("search_results", search_results=[])
+    words = f"Summary of the latest news about {query}.".split(" ")
+    for i, word in enumerate(words):
+        await asyncio.sleep(duration / len(words))
+        yield event("generation_chunk", generation_chunk=word if i == 0 else f" {word}")
+    yield event("generation_end")
+    yield event("end")
+
+
+def _chat_chunk(chunk_id: str, delta: dict, finish_reason) -> dict:
+    return {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "delta": delta}],
+    }
+
+
+def _from_schema(schema: dict, name: str, key: str):
+    # A value matching a JSON schema, as returned by structured outputs
+    if schema.get("type") == "object":
+        return {prop: _from_schema(sub, prop, key) for prop, sub in schema.get("properties", {}).items()}
+    return f"Fake {name.replace('_', ' ')} {key}"
+
+
+def create_app(profile: ProviderProfile) -> FastAPI:
+    """
+    Build the FastAPI app serving every fake provider under its own path prefix.
+
+    Point the services at it with the *_BASE_URL variables returned by `provider_environment`.
+    """
+    app = FastAPI(title="PostGenius fake providers")
+    renders = {}  # Runway task id -> time at which the render completes
+
+    async def simulate(endpoint: str, latency: float = None):
+        if profile.throttles(endpoint):
+            return JSONResponse({"error": f"Simulated {endpoint} rate limit"}, status_code=429,
+                                headers={"Retry-After": str(profile.retry_after)})
+        await asyncio.sleep(profile.latency(endpoint) if latency is None else latency)
+        if profile.fails(endpoint):
+            return JSONResponse({"error": f"Simulated {endpoint} failure"}, status_code=503)
+        return None
+
+    @app.get("/newsapi/v2/everything")
+    async def newsapi(q: str = "", pageSize: int = 3):
+        if (error := await simulate("newsapi")) is not None:
+            return error
+        key = _digest(q)
+        return {"status": "ok", "articles": [
+            {
+                "title": f"{q} news {i}",
+                "description": f"What is new about {q}.",
+                "content": f"A long article about {q}, number {i}.",
+                "url": f"https://news.example/{key}/{i}",
+                "author": "Fake Reporter",
+                "publishedAt": "2024-01-01T00:00:00Z",
+            }
+            for i in range(pageSize)
+        ]}
+
+    @app.post("/reddit/api/v1/access_token")
+    async def reddit_token():
+        if (error := await simulate("reddit_token")) is not None:
+            return error
+        return {"access_token": uuid.uuid4().hex, "token_type": "bearer", "expires_in": 3600}
+
+    @app.get("/reddit/search")
+    async def reddit_search(q: str = "", limit: int = 3):
+        if (error := await simulate("reddit")) is not None:
+            return error
+        key = _digest(q)
+        return {"data": {"children": [
+            {"data": {
+                "author": "fake_redditor",
+                "title": f"Thoughts on {q} #{i}",
+                "selftext": f"Discussion about {q}.",
+                "url": f"https://reddit.example/{key}/{i}",
+                "created_utc": 1704067200.0,
+            }}
+            for i in range(limit)
+        ]}}
+
+    @app.post("/groq/openai/v1/chat/completions")
+    async def groq_chat(request: Request):
+        body = await request.json()
+        if (error := await simulate("groq")) is not None:
+            return error
+        user = body["messages"][-1]["content"]
+        prompt = user.split("\n")[0].replace("Prompt: ", "").strip()
+        content = json.dumps({
+            "metadata": {"category": "news", "keywords": prompt.split()[:3]},
+            "en_prompt": prompt,
+            "improved_prompt": f"title:{prompt} OR subreddit:all",
+        })
+        return _chat_completion(content)
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        key = _digest(body["messages"][-1]["content"])
+        if body.get("stream"):
+            latency = profile.latency("openai_chat")
+            if (error := await simulate("openai_chat", latency * FIRST_TOKEN_SHARE)) is not None:
+                return error
+            content = f"Fake post {key} about the news #benchmark"
+            return StreamingResponse(_chat_stream(content, latency * (1 - FIRST_TOKEN_SHARE)), media_type="text/event-stream")
+        if (error := await simulate("openai_chat")) is not None:
+            return error
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            return _chat_completion(json.dumps(_from_schema(response_format["json_schema"]["schema"], "", key)))
+        return _chat_completion(f"Top caption: Fake caption {key}\nBottom caption: When the benchmark runs")
+
+    @app.post("/openai/v1/images/generations")
+    async def openai_images():
+        if (error := await simulate("openai_images")) is not None:
+            return error
+        return {"created": int(time.time()), "data": [{"url": f"https://images.example/{uuid.uuid4().hex}.png"}]}
+
+    @app.post("/vectara/v2/corpora/{corpus}/documents")
+    async def vectara_index(corpus: str):
+        if (error := await simulate("vectara_index")) is not None:
+            return error
+        return JSONResponse({}, status_code=201)
+
+    @app.get("/vectara/v2/corpora/{corpus}/documents")
+    async def vectara_documents(corpus: str):
+        return {"documents": [], "metadata": {}}
+
+    @app.post("/vectara/v2/query")
+    async def vectara_query(request: Request):
+        body = await request.json()
+        if body.get("stream_response"):
+            latency = profile.latency("vectara_query")
+            if (error := await simulate("vectara_query", latency * FIRST_TOKEN_SHARE)) is not None:
+                return error
+            return StreamingResponse(_query_stream(body.get("query", ""), latency * (1 - FIRST_TOKEN_SHARE)),
+                                     media_type="text/event-stream")
+        if (error := await simulate("vectara_query")) is not None:
+            return error
+        return {"summary": f"Summary of the latest news about {body.get('query', '')}.", "search_results": []}
+
+    @app.get("/imgflip/get_memes")
+    async def imgflip_templates():
+        if (error := await simulate("imgflip")) is not None:
+            return error
+        names = ["Drake Hotline Bling", "Distracted Boyfriend", "Two Buttons", "Expanding Brain", "Surprised Pikachu"]
+        return {"success": True, "data": {"memes": [
+            {"id": str(i), "name": name, "box_count": 2} for i, name in enumerate(names)
+        ]}}
+
+    @app.post("/imgflip/caption_image")
+    async def imgflip_caption():
+        if (error := await simulate("imgflip")) is not None:
+            return error
+        return {"success": True, "data": {"url": f"https://memes.example/{uuid.uuid4().hex}.jpg"}}
+
+    @app.post("/runway/v1/image_to_video")
+    async def runway_create():
+        if (error := await simulate("runway_create")) is not None:
+            return error
+        task_id = str(uuid.uuid4())
+        renders[task_id] = time.monotonic() + profile.latency("runway_render")
+        return {"id": task_id}
+
+    @app.get("/runway/v1/tasks/{task_id}")
+    async def runway_task(task_id: str):
+        if (error := await simulate("runway_poll")) is not None:
+            return error
+        if task_id not in renders:
+            return JSONResponse({"error": "Task not found"}, status_code=404)
+        done = time.monotonic() >= renders[task_id]
+        return {
+            "id": task_id,
+            "status": "SUCCEEDED" if done else "RUNNING",
+            "createdAt": "2024-01-01T00:00:00Z",
+            "output": [f"https://videos.example/{task_id}.mp4"] if done else None,
+        }
+
+    @app.delete("/runway/v1/tasks/{task_id}")
+    async def runway_cancel(task_id: str):
+        renders.pop(task_id, None)
+        return Response(status_code=204)
+
+    return app
+
+
+def provider_environment(base_url: str) -> dict:
+    """
+    Return the environment variables pointing every service at the fake providers.
+    """
+    return {
+        "NEWSAPI_BASE_URL": f"{base_url}/newsapi",
+        "REDDIT_AUTH_BASE_URL": f"{base_url}/reddit",
+        "REDDIT_API_BASE_URL": f"{base_url}/reddit",
+        "GROQ_BASE_URL": f"{base_url}/groq",
+        "OPENAI_BASE_URL": f"{base_url}/openai/v1",
+        "VECTARA_BASE_URL": f"{base_url}/vectara",
+        "IMGFLIP_BASE_URL": f"{base_url}/imgflip",
+        "RUNWAYML_BASE_URL": f"{base_url}/runway",
+        # Credentials are required by the services but never checked by the fakes
+        "NEWSAPI_KEY": "fake",
+        "REDDIT_CLIENT_ID": "fake",
+        "REDDIT_SECRET": "fake",
+        "GROQ_API_KEY": "fake",
+        "OPENAI_API_KEY": "fake",
+        "VECTARA_API_KEY": "fake",
+        "VECTARA_CORPORA": "benchmark",
+        "RUNWAYML_API_KEY": "fake",
+        "RUNWAYML_API_SECRET": "fake",
+        "IMGFLIP_USERNAME": "fake",
+        "IMGFLIP_PASSWORD": "fake",
+    }
+
+
+def _parse_overrides(values, parse) -> dict:
+    overrides = {}
+    for value in values or []:
+        endpoint, _, setting = value.partition("=")
+        if endpoint not in DEFAULT_PROFILE:
+            raise ValueError(f"Unknown endpoint '{endpoint}', expected one of {sorted(DEFAULT_PROFILE)}")
+        overrides[endpoint] = parse(setting)
+    return overrides
+
+
+def add_profile_arguments(parser):
+    """
+    Add the options describing a ProviderProfile to an argparse parser.
+    """
+    parser.add_argument("--latency", action="append", metavar="ENDPOINT=MEDIAN[,SIGMA]",
+                        help=f"Latency of an endpoint in seconds. Endpoints: {', '.join(DEFAULT_PROFILE)}")
+    parser.add_argument("--error-rate", action="append", metavar="ENDPOINT=RATE",
+                        help="Probability that a call to the endpoint fails with a 503")
+    parser.add_argument("--throttle-rate", action="append", metavar="ENDPOINT=RATE",
+                        help="Probability that a call to the endpoint is throttled with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429 responses, in seconds")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier applied to every latency")
+
+
+def profile_from_arguments(args) -> ProviderProfile:
+    """
+    Build a ProviderProfile from the options added by `add_profile_arguments`.
+    """
+    def latency(setting):
+        median, _, sigma = setting.partition(",")
+        return float(median), float(sigma) if sigma else 0.3
+
+    return ProviderProfile(
+        latencies=_parse_overrides(args.latency, latency),
+        error_rates=_parse_overrides(args.error_rate, float),
+        scale=args.scale,
+        throttle_rates=_parse_overrides(args.throttle_rate, float),
+        retry_after=args.retry_after,
+    )
+
+
+def profile_arguments(args) -> list:
+    """
+    Return the command line options reproducing the profile given to `add_profile_arguments`.
+    """
+    argv = ["--scale", str(args.scale), "--retry-after", str(args.retry_after)]
+    for value in args.latency or []:
+        argv += ["--latency", value]
+    for value in args.error_rate or []:
+        argv += ["--error-rate", value]
+    for value in args.throttle_rate or []:
+        argv += ["--throttle-rate", value]
+    return argv
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve local stand-ins of every upstream provider.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(profile_from_arguments(args)), host=args.host, port=args.port, log_level="warning")
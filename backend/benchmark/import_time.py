@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Provider SDKs must only be imported when their client is first used
+LAZY_MODULES = ("openai", "groq", "runwayml")
+
+# Variables removed from the environment: importing the API must not need any credential
+CREDENTIALS = (
+    "OPENAI_API_KEY", "GROQ_API_KEY", "RUNWAYML_API_KEY", "NEWSAPI_KEY", "REDDIT_CLIENT_ID",
+    "REDDIT_SECRET", "VECTARA_API_KEY", "VECTARA_CORPORA", "IMGFLIP_USERNAME", "IMGFLIP_PASSWORD",
+)
+
+_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def measure_import(module: str = "main") -> dict:
+    """
+    Import `module` in a fresh interpreter without credentials, the .env file included.
+
+    Returns:
+        dict: `seconds` spent importing and the names of the loaded `modules`.
+    """
+    env = {key: value for key, value in os.environ.items() if key not in CREDENTIALS}
+    # Nor reload them from the .env file of the checkout
+    env["ENV_FILE"] = os.devnull
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check_import_budget(budget: float, module: str = "main", runs: int = 3) -> dict:
+    """
+    Check that `module` imports within `budget` seconds, without credentials nor provider SDKs.
+
+    Returns:
+        dict: The best import time of the runs in `seconds`, and the `problems` found, empty
+              if the check passed.
+    """
+    results = [measure_import(module) for _ in range(runs)]
+    best = min(result["seconds"] for result in results)
+
+    problems = []
+    if best > budget:
+        problems.append(f"importing {module} took {best:.3f}s, over the budget of {budget:.3f}s")
+    eager = sorted({name.split(".")[0] for name in results[0]["modules"]} & set(LAZY_MODULES))
+    if eager:
+        problems.append(f"provider SDKs imported eagerly: {', '.join(eager)}")
+    return {"seconds": best, "problems": problems}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the import time of the API.")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "1.0")),
+                        help="Maximum import time in seconds")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=3, help="Imports measured, the fastest one counts")
+    args = parser.parse_args()
+    result = check_import_budget(args.budget, args.module, args.runs)
+    print(f"import {args.module}: best of {args.runs} runs {result['seconds']:.3f}s (budget {args.budget:.3f}s)")
+    for problem in result["problems"]:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if result["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
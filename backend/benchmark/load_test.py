@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import tempfile
+import subprocess
+from collections import defaultdict
+import httpx
+from benchmark.fake_providers import add_profile_arguments, profile_arguments, provider_environment
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Events of /generate/stream, in the order they usually arrive, followed by the whole request.
+# `first_summary` and `first_text` are the first pieces of the summary and of the post.
+STAGES = ("sources", "first_summary", "summary", "first_text", "text", "meme", "image", "video", "done")
+
+# Events carrying the first piece of the summary or of the post (`text` alone when served from the cache)
+FIRST_PIECES = {"summary_delta": "first_summary", "summary": "first_summary", "text_delta": "first_text", "text": "first_text"}
+
+
+def load_requests(path: str) -> list:
+    """
+    Read the request bodies to replay from a JSONL file.
+
+    Lines are ContentRequest objects; lines without a `prompt` use their `title` as prompt,
+    so that any JSONL of titled items can be replayed.
+    """
+    bodies = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            prompt = item.get("prompt") or item.get("title")
+            if not prompt:
+                continue
+            body = {"prompt": prompt}
+            for field in ("tone", "platform", "assets", "timeout"):
+                if field in item:
+                    body[field] = item[field]
+            bodies.append(body)
+    return bodies
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_until_up(url: str, timeout: float = 30, require_ok: bool = False):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                response = await client.get(url)
+                if not require_ok or response.status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not start within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def _timed_request(client: httpx.AsyncClient, target: str, body: dict, timings: dict, errors: dict):
+    started = time.perf_counter()
+    event = None
+    seen = set()
+    try:
+        async with client.stream("POST", f"{target}/generate/stream", json=body) as response:
+            if response.status_code != 200:
+                errors[f"HTTP {response.status_code}"] += 1
+                return
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "error":
+                        errors["pipeline error"] += 1
+                        return
+                    if (first := FIRST_PIECES.get(event)) is not None and first not in seen:
+                        seen.add(first)
+                        timings[first].append(time.perf_counter() - started)
+                    if not event.endswith("_delta"):
+                        timings[event].append(time.perf_counter() - started)
+    except httpx.HTTPError as e:
+        errors[type(e).__name__] += 1
+
+
+async def replay(target: str, bodies: list, concurrency: int, total: int) -> dict:
+    """
+    Send `total` requests cycling through `bodies`, `concurrency` at a time, to /generate/stream.
+
+    Returns:
+        dict: `timings` (event -> seconds since the request started), `errors` (kind -> count)
+              and `elapsed` (wall-clock duration of the run).
+    """
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(bodies[i % len(bodies)])
+
+    async def worker(client):
+        while not queue.empty():
+            await _timed_request(client, target, queue.get_nowait(), timings, errors)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=httpx.Timeout(900), limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return {"timings": timings, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def format_report(result: dict, total: int) -> str:
+    """
+    Format the per-stage latency percentiles and the throughput of a run.
+    """
+    lines = [f"{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for stage in STAGES:
+        values = result["timings"].get(stage)
+        if not values:
+            continue
+        p50, p95, p99 = (_percentile(values, q) * 1000 for q in (50, 95, 99))
+        lines.append(f"{stage:<14}{len(values):>7}{p50:>10.0f}{p95:>10.0f}{p99:>10.0f}")
+    completed = len(result["timings"].get("done", []))
+    lines.append("")
+    lines.append(f"requests: {total}, completed: {completed}, elapsed: {result['elapsed']:.1f}s, "
+                 f"throughput: {completed / result['elapsed']:.2f} req/s")
+    if result["errors"]:
+        lines.append("errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(result["errors"].items())))
+    return "\n".join(lines)
+
+
+def _start(command: list, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def run_benchmark(args) -> str:
+    """
+    Start the fake providers and the API if needed, replay the requests and return the report.
+    """
+    bodies = load_requests(args.requests)
+    if not bodies:
+        raise ValueError(f"No requests found in {args.requests}")
+    for body in bodies:
+        body["cache"] = args.cache
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="postgenius-bench-")
+    try:
+        providers_url = args.providers
+        if providers_url is None:
+            port = _free_port()
+            providers_url = f"http://127.0.0.1:{port}"
+            processes.append(_start(
+                [sys.executable, "-m", "benchmark.fake_providers", "--port", str(port)] + profile_arguments(args),
+                {}, os.path.join(workdir, "providers.log"),
+            ))
+            await _wait_until_up(providers_url)
+
+        target = args.target
+        if target is None:
+            port = _free_port()
+            target = f"http://127.0.0.1:{port}"
+            env = {
+                **provider_environment(providers_url),
+                "JOB_WORKERS": "0",
+                "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+                "VECTARA_REGISTRY_PATH": os.path.join(workdir, "vectara_registry.db"),
+                "IMGFLIP_TEMPLATES_PATH": os.path.join(workdir, "imgflip_templates.json"),
+            }
+            processes.append(_start(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                env, os.path.join(workdir, "api.log"),
+            ))
+            # Measure a warmed-up instance, as after a deploy once the readiness probe passed
+            await _wait_until_up(f"{target}/ready", timeout=90, require_ok=True)
+
+        logger.info(f"Replaying {args.total} requests at concurrency {args.concurrency} against {target} (logs in {workdir})")
+        result = await replay(target, bodies, args.concurrency, args.total)
+        return format_report(result, args.total)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description="Replay requests against the API with fake upstream providers.")
+    parser.add_argument("--requests", default=os.path.join(BACKEND_DIR, "..", "requests.jsonl"),
+                        help="JSONL file of requests to replay")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at the same time")
+    parser.add_argument("--total", type=int, default=50, help="Number of requests sent, cycling through the file")
+    parser.add_argument("--cache", choices=("default", "refresh", "bypass"), default="bypass",
+                        help="Response cache mode of the replayed requests")
+    parser.add_argument("--target", help="URL of a running API instead of starting one")
+    parser.add_argument("--providers", help="URL of running fake providers instead of starting them")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    print(asyncio.run(run_benchmark(args)))
@@ -1,20 +1,68 @@
+import json
+import asyncio
+import time
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from models.requests import ContentRequest
-from models.responses import ContentResponse
-from services.news_retrieval import get_relevant_articles
-from utils.content_generation import generate_social_post
-from utils.image_generation import generate_image
-from utils.video_generation import generate_video, generate_video_prompt_with_gpt
-from utils.meme_generation import generate_meme
-from services.vectara import index_vectara_document, search_documents
+from models.responses import ContentResponse, JobResponse
+from services.clients import close_clients
+from services.indexed_documents import close_registry
+from services.indexing_queue import indexing_queue, INDEXING_CONFIG
+from utils.video_generation import video_jobs
+from utils.content_pipeline import DELTA_STAGES, RESPONSE_STAGES, TEXT_DELTA, omitted_assets
+from utils.response_cache import cached_content_pipeline
+from utils.cache import close_caches
+from utils.jobs import JOBS_CONFIG, create_worker, get_job_store
+from utils.batch import create_batch_runner, parse_batch
+from utils.metrics import Histogram, registry
+from utils.warmup import WARMUP_CONFIG, warm_up
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PostGenius API")
+time_to_first_text = registry.register(Histogram(
+    "postgenius_time_to_first_text_seconds", "Time from a streamed request to the first piece of its text post sent."
+))
+
+
+async def _warm_up(app: FastAPI):
+    try:
+        app.state.warmup_report = await warm_up()
+    except Exception as e:
+        logger.exception(f"Error during warm-up: {e}")
+        app.state.warmup_report = {"error": str(e)}
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Jobs can also be run only by standalone workers (python -m utils.jobs) with JOB_WORKERS=0
+    app.state.job_worker = create_worker() if JOBS_CONFIG["workers"] > 0 else None
+    if app.state.job_worker is not None:
+        app.state.job_worker.start()
+    # The API serves during the warm-up, but only reports ready once it is over
+    app.state.ready = not WARMUP_CONFIG["enabled"]
+    app.state.warmup_report = None
+    warmup = asyncio.create_task(_warm_up(app)) if WARMUP_CONFIG["enabled"] else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    if app.state.job_worker is not None:
+        await app.state.job_worker.stop()
+    # Flush the documents still waiting to be indexed, then release the pooled upstream connections
+    await indexing_queue.close(INDEXING_CONFIG["shutdown_timeout"])
+    await close_registry()
+    await close_caches()
+    await video_jobs.close()
+    await close_clients()
+
+
+app = FastAPI(title="PostGenius API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,60 +72,147 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the startup warm-up is over, then 200 with the warm-up report.
+    """
+    if not app.state.ready:
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    return {"status": "ready", "warmup": app.state.warmup_report}
+
+
 @app.post("/generate", response_model=ContentResponse)
 async def generate_content(req: ContentRequest):
     logger.debug(f"Received request: prompt={req.prompt}, tone={req.tone}, platform={req.platform}")
     try:
-        articles = get_relevant_articles(req.prompt, req.tone, req.platform)
-        logger.debug(f"Articles retrieved: {articles}")
-
-        if not articles:
-            logger.warning("No articles found for the given prompt.")
-            return ContentResponse(text="", image="", video="", meme="", sources=[])
-
-        for document in articles:
-            try:
-                # Index the document with embeddings on Vectara
-                index_vectara_document(document)
-            except Exception as e:
-                print(f"Error processing document {document['id']}: {e}")
-
-        summary = search_documents(req.prompt)
-        logger.debug(f"Generated summary: {summary}")
-
-        if not summary:
-            logger.warning("No summary generated by LLM.")
-            return ContentResponse(text="", image="", video="", meme="", sources=[])
-        
-        text_post = generate_social_post(summary, req.prompt, req.tone, req.platform)
-        logger.debug(f"Generated text post: {text_post}")
-
-        meme_url = generate_meme(summary, req.prompt, req.tone, req.platform)
-        logger.debug(f"Generated meme url: {meme_url}")
-        
-        # Generate video prompt using GPT-4
-        video_prompt = generate_video_prompt_with_gpt(summary, req.prompt, req.tone, req.platform)
-        logger.debug(f"Generated video prompt: {video_prompt}")
-
-        image_url = generate_image(summary, req.prompt, req.tone, req.platform)
-        logger.debug(f"Generated image url: {image_url}")
-
-        video_url = generate_video(video_prompt, image_url, duration=10)
-        logger.debug(f"Generated video url: {video_url}")
-
-        sources = [art["metadata"].get("source", "Source unavailable") for art in articles if "metadata" in art]
-        logger.debug(f"Sources: {sources}")
-
+        response = await cached_content_pipeline(req)
         logger.debug(f"***END***")
-
-        return ContentResponse(
-            text=text_post or "",
-            image=image_url or "",
-            video=video_url or "",
-            meme=meme_url or "",
-            sources=sources
-        )
+        return response
 
     except Exception as e:
         logger.exception(f"Error during content generation: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_content_stream(req: ContentRequest):
+    """
+    Stream the generated content as Server-Sent Events.
+
+    An event named after each `ContentResponse` field (sources, summary, text, meme, image,
+    video) is sent as soon as that asset is ready, for the requested assets only, followed by a `done` event carrying the
+    complete response, or an `error` event. While the summary and the post are generated, `summary_delta` and
+    `text_delta` events carry their pieces; the `summary` and `text` events that follow hold the complete texts and
+    replace them. Cached responses only send the `text` event.
+    """
+    logger.debug(f"Received stream request: prompt={req.prompt}, tone={req.tone}, platform={req.platform}")
+    started = time.perf_counter()
+    events = asyncio.Queue()
+    # Inputs of a requested asset, e.g. the image of a video, are not streamed when not requested
+    omitted = omitted_assets(req)
+    text_sent = False
+
+    def on_result(name, result):
+        nonlocal text_sent
+        if name in (TEXT_DELTA, "text") and result and not text_sent:
+            text_sent = True
+            time_to_first_text.observe(time.perf_counter() - started)
+        if name in DELTA_STAGES:
+            events.put_nowait(_sse_event(name, result))
+        elif name in RESPONSE_STAGES and name not in omitted:
+            events.put_nowait(_sse_event(name, result or ([] if name == "sources" else "")))
+
+    async def run():
+        try:
+            response = await cached_content_pipeline(req, on_result=on_result)
+            events.put_nowait(_sse_event("done", response.model_dump()))
+        except Exception as e:
+            logger.exception(f"Error during content generation: {e}")
+            events.put_nowait(_sse_event("error", {"detail": "Internal server error"}))
+        finally:
+            events.put_nowait(None)
+
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            # The client went away: stop generating
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/generate/batch")
+async def generate_content_batch(request: Request):
+    """
+    Generate the content of a JSONL batch of requests, streaming JSONL results.
+
+    Each line of the body is a ContentRequest, optionally with an `id`. A result line (`index`,
+    `id` and `response` or `error`) is streamed as soon as each request completes.
+    """
+    body = await request.body()
+    items = parse_batch(body.decode("utf-8").splitlines())
+    logger.debug(f"Received batch of {len(items)} requests")
+
+    async def stream():
+        async for result in create_batch_runner().run(items):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _job_response(job: dict) -> JobResponse:
+    # Only the stages that are part of the response are exposed, not the raw articles
+    stages = {name: result for name, result in job["stages"].items() if name in RESPONSE_STAGES}
+    return JobResponse(
+        id=job["id"],
+        status=job["status"],
+        attempts=job["attempts"],
+        stages=stages,
+        result=job["result"],
+        error=job["error"],
+    )
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(req: ContentRequest):
+    """
+    Queue a generation and return its job id at once. Poll `GET /jobs/{id}` for the results.
+    """
+    store = get_job_store()
+    job_id = await asyncio.to_thread(store.create, req)
+    logger.debug(f"Queued job {job_id}: prompt={req.prompt}, tone={req.tone}, platform={req.platform}")
+    if app.state.job_worker is not None:
+        app.state.job_worker.notify()
+    return _job_response(await asyncio.to_thread(store.get, job_id))
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Return the status of a job, the results of its completed stages and, once done, the full response.
+    """
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Expose the per-stage latency histograms, in-flight gauges and error counters to Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,6 +1,16 @@
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+# Assets a request can ask for; all of them by default
+ASSETS = ("text", "meme", "image", "video")
 
 class ContentRequest(BaseModel):
     prompt: str
     tone: str = "humorous"
     platform: str = "twitter"
+    # Only the stages needed by these assets are run, e.g. ["text"] skips DALL·E and Runway
+    assets: List[Literal["text", "meme", "image", "video"]] = Field(default=list(ASSETS), min_length=1)
+    # Latency budget in seconds, shared by every stage and upstream call; REQUEST_TIMEOUT_SECONDS by default
+    timeout: Optional[float] = Field(default=None, gt=0)
+    # "refresh" regenerates and updates the cached response, "bypass" skips the response cache
+    cache: Literal["default", "refresh", "bypass"] = "default"
@@ -1,9 +1,20 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class ContentResponse(BaseModel):
-    text: str
-    image: str
-    video: str
-    meme: str
+    # Assets that were not requested are null and listed in `omitted`
+    text: Optional[str] = None
+    image: Optional[str] = None
+    video: Optional[str] = None
+    meme: Optional[str] = None
     sources: Optional[List[str]] = []
+    omitted: List[str] = []
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str  # queued, running, completed or failed
+    attempts: int = 0
+    stages: Dict[str, Any] = {}
+    result: Optional[ContentResponse] = None
+    error: Optional[str] = None
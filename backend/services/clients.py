@@ -0,0 +1,126 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Iterable, Optional
+from services.env import load_environment
+from services.http import get_http_client
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+
+class ServiceRegistry:
+    """
+    Provider clients built on first use and shared by every module.
+
+    The provider SDKs are only imported when their client is first needed, which keeps
+    the import of the API fast, and a provider without credentials only fails the calls
+    that need it instead of the whole startup. `warm_up` builds them ahead of time.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """
+        Register the factory building the client of a provider.
+        """
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """
+        Return the client of a provider, building it on first use.
+
+        Raises:
+            KeyError: If no factory is registered under `name`.
+            ValueError: If the credentials of the provider are missing.
+        """
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self._factories[name]()
+                    logger.info(f"Client '{name}' initialized")
+        return client
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> dict:
+        """
+        Build the clients of the given providers, all of them by default.
+
+        Returns:
+            dict: Name of each provider that could not be built -> error message.
+        """
+        errors = {}
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Client '{name}' is not available: {e}")
+                errors[name] = str(e)
+        return errors
+
+    def reset(self):
+        """
+        Drop the built clients, e.g. after the shared HTTP client was closed.
+        """
+        with self._lock:
+            self._clients = {}
+
+
+def _require(variable: str) -> str:
+    value = os.getenv(variable)
+    if not value:
+        raise ValueError(f"{variable} is missing. Make sure it is correctly set in the .env file.")
+    return value
+
+
+def _create_openai_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=_require("OPENAI_API_KEY"), http_client=get_http_client())
+
+
+def _create_groq_client():
+    from groq import AsyncGroq
+
+    return AsyncGroq(api_key=_require("GROQ_API_KEY"), http_client=get_http_client())
+
+
+def _create_runway_client():
+    from runwayml import AsyncRunwayML
+
+    return AsyncRunwayML(api_key=_require("RUNWAYML_API_KEY"), http_client=get_http_client())
+
+
+services = ServiceRegistry()
+services.register("openai", _create_openai_client)
+services.register("groq", _create_groq_client)
+services.register("runway", _create_runway_client)
+
+
+def get_openai_client():
+    return services.get("openai")
+
+
+def get_groq_client():
+    return services.get("groq")
+
+
+def get_runway_client():
+    return services.get("runway")
+
+
+async def close_clients():
+    """
+    Drop the provider clients and close the shared HTTP client they use.
+    """
+    from services.http import close_http_client
+
+    services.reset()
+    await close_http_client()
@@ -0,0 +1,21 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+_lock = threading.Lock()
+_loaded = False
+
+
+def load_environment():
+    """
+    Load the .env file into the environment, once per process.
+
+    Variables already set in the environment take precedence over the .env file, so that
+    deployments and tools (e.g. the benchmark) can override any setting. `ENV_FILE` points
+    to another file, e.g. `/dev/null` to ignore the .env file.
+    """
+    global _loaded
+    with _lock:
+        if not _loaded:
+            load_dotenv(os.getenv("ENV_FILE") or None)
+            _loaded = True
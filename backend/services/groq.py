@@ -1,18 +1,32 @@
 import os
 import json
 import logging
-from dotenv import load_dotenv
-from groq import Groq
+from services.env import load_environment
+from services.clients import get_groq_client
+from utils.cache import TTLCache, make_key
+from utils.singleflight import SingleFlight
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import circuit_breaker
+from utils.deadline import DeadlineExceeded, within_deadline
+from utils.hedging import hedged
+from utils.rate_limit import estimate_tokens, rate_limited
 
-load_dotenv()
+load_environment()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 logger = logging.getLogger(__name__)
 
-# Initialize Groq client
-groq_client = Groq(api_key=GROQ_API_KEY)
+# Cache of processed prompts: trending topics arrive again and again with the same prompt
+prompt_cache = TTLCache(
+    "groq_prompts",
+    maxsize=int(os.getenv("GROQ_CACHE_MAXSIZE", "2048")),
+    ttl=float(os.getenv("GROQ_CACHE_TTL_SECONDS", "86400")),
+    path=os.getenv("GROQ_CACHE_PATH"),  # Optional SQLite file that survives restarts
+)
 
-def process_prompt_with_groq(prompt: str, tone: str, platform: str) -> dict:
+# Concurrent misses for the same prompt share one Groq call
+prompt_flight = SingleFlight("groq_prompts")
+
+async def process_prompt_with_groq(prompt: str, tone: str, platform: str) -> dict:
     """
     Uses Groq to process the prompt and return metadata, translated and improved prompts.
     Optimizes the improved prompt for Reddit searches.
@@ -25,6 +39,30 @@ def process_prompt_with_groq(prompt: str, tone: str, platform: str) -> dict:
     Returns:
         dict: Contains `metadata`, `en_prompt`, and `improved_prompt`.
     """
+    cache_key = make_key(prompt, tone, platform)
+    cached = prompt_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Groq cache hit for prompt: {prompt}")
+        return cached
+    try:
+        return await prompt_flight.do(cache_key, _process_prompt, prompt, tone, platform, cache_key)
+    except DeadlineExceeded as e:
+        # The shared call may still complete and be cached for the next request
+        logger.warning(f"Groq did not process the prompt within the request deadline: {e}")
+        return _fallback(prompt)
+
+
+def _fallback(prompt: str) -> dict:
+    # Return an object with fallback values
+    return {
+        "metadata": {"category": "unknown", "keywords": []},
+        "en_prompt": prompt,  # Use the original prompt as a fallback
+        "improved_prompt": f"title:{prompt} OR subreddit:all"  # Use a basic query optimized for Reddit as a fallback
+    }
+
+
+@instrument("groq")
+async def _process_prompt(prompt: str, tone: str, platform: str, cache_key: str) -> dict:
     try:
         system_message = (
             "You are an intelligent metadata assistant. Your task is to translate the user's input into English, "
@@ -53,15 +91,23 @@ def process_prompt_with_groq(prompt: str, tone: str, platform: str) -> dict:
         
         user_message = f"Prompt: {prompt}\nTone: {tone}\nPlatform: {platform}"
         
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ]
+
         # Request to Groq
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            model="llama3-8b-8192",
-            response_format={"type": "json_object"}
-        )
+        async def _request():
+            async with rate_limited("groq", "llama3-8b-8192", tokens=estimate_tokens(messages, 200)), \
+                    circuit_breaker("groq", "llama3-8b-8192"):
+                return await within_deadline(get_groq_client().chat.completions.create(
+                    messages=messages,
+                    model="llama3-8b-8192",
+                    response_format={"type": "json_object"}
+                ))
+
+        # Normalizing a prompt is idempotent: a slow call is hedged with a second one
+        chat_completion = await hedged("groq", _request)
         
         metadata_str = chat_completion.choices[0].message.content.strip()
         logger.debug(f"Groq response content: {metadata_str}")
@@ -69,13 +115,11 @@ def process_prompt_with_groq(prompt: str, tone: str, platform: str) -> dict:
         # Parse JSON response
         processed_data = json.loads(metadata_str)
         logger.info(f"Processed data: {processed_data}")
-        
+
+        # Only successful results are cached, fallbacks are retried on the next request
+        prompt_cache.set(cache_key, processed_data)
         return processed_data
-    except (ValueError, KeyError, json.JSONDecodeError) as e:
+    except (ValueError, KeyError, json.JSONDecodeError, DeadlineExceeded) as e:
         logger.exception(f"Failed to process prompt with Groq: {e}")
-        # Return an object with fallback values
-        return {
-            "metadata": {"category": "unknown", "keywords": []},
-            "en_prompt": prompt,  # Use the original prompt as a fallback
-            "improved_prompt": f"title:{prompt} OR subreddit:all"  # Use a basic query optimized for Reddit as a fallback
-        }
+        record_error("groq")
+        return _fallback(prompt)
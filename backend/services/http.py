@@ -0,0 +1,77 @@
+import os
+import logging
+import threading
+import importlib.util
+import httpx
+from services.env import load_environment
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+# Centralized configuration of the shared transport
+HTTP_CONFIG = {
+    "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    "read_timeout": float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+    "write_timeout": float(os.getenv("HTTP_WRITE_TIMEOUT", "30")),
+    "pool_timeout": float(os.getenv("HTTP_POOL_TIMEOUT", "10")),
+    "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", "200")),
+    "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50")),
+    "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+    # HTTP/2 needs the `h2` package (in requirements.txt); without it the client falls back to HTTP/1.1
+    "http2": os.getenv("HTTP_ENABLE_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None,
+}
+
+_http_client = None
+_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide async HTTP client shared by every upstream service.
+
+    The client keeps a keep-alive connection pool per host, so NewsAPI, Reddit, Vectara,
+    Imgflip and the SDK clients (OpenAI, Groq, RunwayML) reuse TCP/TLS connections across
+    requests instead of paying a fresh handshake on each call.
+
+    Returns:
+        httpx.AsyncClient: The shared client, created on first use.
+    """
+    global _http_client
+    client = _http_client
+    if client is not None and not client.is_closed:
+        return client
+    # Concurrent first calls (e.g. the warm-up and the SDK clients in worker threads) share one pool
+    with _lock:
+        if _http_client is not None and not _http_client.is_closed:
+            return _http_client
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=HTTP_CONFIG["connect_timeout"],
+                read=HTTP_CONFIG["read_timeout"],
+                write=HTTP_CONFIG["write_timeout"],
+                pool=HTTP_CONFIG["pool_timeout"],
+            ),
+            limits=httpx.Limits(
+                max_connections=HTTP_CONFIG["max_connections"],
+                max_keepalive_connections=HTTP_CONFIG["max_keepalive_connections"],
+                keepalive_expiry=HTTP_CONFIG["keepalive_expiry"],
+            ),
+            http2=HTTP_CONFIG["http2"],
+            follow_redirects=True,
+        )
+        logger.debug(f"Shared HTTP client created (http2={HTTP_CONFIG['http2']})")
+        return _http_client
+
+
+async def close_http_client():
+    """
+    Close the shared HTTP client and release its pooled connections.
+    """
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+        logger.debug("Shared HTTP client closed")
+    _http_client = None
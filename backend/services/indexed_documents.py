@@ -0,0 +1,220 @@
+import os
+import math
+import sqlite3
+import logging
+import argparse
+import asyncio
+import hashlib
+import threading
+import time
+from services.env import load_environment
+from utils.write_behind import WriteBehind
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+REGISTRY_CONFIG = {
+    "path": os.getenv("VECTARA_REGISTRY_PATH", "vectara_registry.db"),
+    "capacity": int(os.getenv("VECTARA_REGISTRY_CAPACITY", "100000")),  # Expected number of documents
+    "error_rate": float(os.getenv("VECTARA_REGISTRY_ERROR_RATE", "0.01")),  # Bloom filter false positive rate
+    "flush_delay": float(os.getenv("VECTARA_REGISTRY_FLUSH_DELAY", "1.0")),  # Batching of the writes to disk, in seconds
+}
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set: `in` may return false positives, but never false negatives.
+
+    Args:
+        capacity (int): Expected number of items.
+        error_rate (float): Target false positive rate at full capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class IndexedDocumentRegistry:
+    """
+    Local registry of the document ids already indexed on Vectara.
+
+    A Bloom filter held in memory answers most lookups for new documents without touching
+    the disk, while an exact set stored in SQLite confirms the positives and survives restarts.
+    New ids are written to SQLite in batches, from a worker thread.
+
+    Args:
+        path (str): Path of the SQLite file holding the exact set of ids.
+        capacity (int): Expected number of documents, used to size the Bloom filter.
+        error_rate (float): False positive rate of the Bloom filter.
+        flush_delay (float): How long new ids are batched before being written, in seconds.
+    """
+
+    def __init__(self, path: str, capacity: int, error_rate: float, flush_delay: float = 1.0):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, indexed_at REAL)")
+        self._db.commit()
+        # Separate connection for the batched writes, so that lookups never wait on a commit
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writes = WriteBehind(f"registry {path}", self._write, flush_delay)
+        self._load_filter()
+
+    def _load_filter(self):
+        count = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        self._filter = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+        for (doc_id,) in self._db.execute("SELECT id FROM documents"):
+            self._filter.add(doc_id)
+        logger.info(f"Indexed document registry loaded with {count} ids from {self.path}")
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id not in self._filter:
+                return False
+            if self._writes.get(doc_id) is not None:
+                return True
+            row = self._db.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, doc_id: str):
+        """
+        Record that a document is present in the corpus.
+        """
+        self.add_many([doc_id])
+
+    def add_many(self, doc_ids):
+        """
+        Record that several documents are present in the corpus.
+
+        The ids are known at once; they are written to disk in the next batch.
+        """
+        now = time.time()
+        self._writes.update({doc_id: now for doc_id in doc_ids})
+        with self._lock:
+            for doc_id in doc_ids:
+                self._filter.add(doc_id)
+
+    def _write(self, batch: dict):
+        self._writer.executemany(
+            "INSERT OR IGNORE INTO documents (id, indexed_at) VALUES (?, ?)", list(batch.items())
+        )
+        self._writer.commit()
+
+    async def close(self):
+        """
+        Write the ids still waiting for the next batch.
+        """
+        await self._writes.close()
+
+    def discard(self, doc_id: str):
+        """
+        Forget a document. The Bloom filter keeps it until the next rebuild, which is harmless
+        because positives are always confirmed against the exact set.
+        """
+        self._writes.discard(doc_id)
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._db.commit()
+
+    def replace(self, doc_ids):
+        """
+        Replace the whole registry with the given ids and rebuild the Bloom filter.
+        """
+        doc_ids = list(doc_ids)
+        now = time.time()
+        self._writes.discard()
+        with self._lock:
+            self._db.execute("DELETE FROM documents")
+            self._db.executemany(
+                "INSERT OR IGNORE INTO documents (id, indexed_at) VALUES (?, ?)",
+                [(doc_id, now) for doc_id in doc_ids],
+            )
+            self._db.commit()
+            self._load_filter()
+
+
+_registry = None
+
+
+def get_registry() -> IndexedDocumentRegistry:
+    """
+    Return the process-wide registry, opening it on first use.
+    """
+    global _registry
+    if _registry is None:
+        _registry = IndexedDocumentRegistry(
+            REGISTRY_CONFIG["path"], REGISTRY_CONFIG["capacity"], REGISTRY_CONFIG["error_rate"],
+            REGISTRY_CONFIG["flush_delay"],
+        )
+    return _registry
+
+
+async def rebuild_from_corpus() -> int:
+    """
+    Rebuild the registry from the list of documents currently stored in the Vectara corpus.
+
+    Returns:
+        int: Number of document ids found in the corpus.
+    """
+    from services.vectara import list_document_ids
+
+    doc_ids = await list_document_ids()
+    await asyncio.to_thread(get_registry().replace, doc_ids)
+    logger.info(f"Indexed document registry rebuilt with {len(doc_ids)} ids")
+    return len(doc_ids)
+
+
+async def close_registry():
+    """
+    Write the ids still waiting to be saved, if the registry was opened.
+    """
+    if _registry is not None:
+        await _registry.close()
+
+
+async def _rebuild_command():
+    from services.http import close_http_client
+
+    try:
+        count = await rebuild_from_corpus()
+        print(f"Registry rebuilt from the corpus: {count} documents.")
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage the local registry of documents indexed on Vectara.")
+    parser.add_argument("command", choices=["rebuild", "count"], help="'rebuild' reloads the ids from the corpus, 'count' prints how many are known")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        asyncio.run(_rebuild_command())
+    else:
+        print(f"{len(get_registry())} documents known to be indexed.")
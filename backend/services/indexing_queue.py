@@ -0,0 +1,158 @@
+import os
+import asyncio
+import logging
+import httpx
+from services.env import load_environment
+from services.vectara import index_vectara_document
+from services.indexed_documents import get_registry
+from utils.deadline import detached
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+INDEXING_CONFIG = {
+    "concurrency": int(os.getenv("VECTARA_INDEXING_CONCURRENCY", "8")),  # Parallel uploads
+    "max_retries": int(os.getenv("VECTARA_INDEXING_MAX_RETRIES", "3")),
+    "retry_base_delay": float(os.getenv("VECTARA_INDEXING_RETRY_DELAY", "0.5")),  # Doubled at each retry
+    "wait_timeout": float(os.getenv("VECTARA_INDEXING_WAIT_TIMEOUT", "15")),  # Max wait before querying anyway
+    "shutdown_timeout": float(os.getenv("VECTARA_INDEXING_SHUTDOWN_TIMEOUT", "10")),
+}
+
+
+class IndexingQueue:
+    """
+    Write-behind queue that indexes documents on Vectara in the background.
+
+    Documents are uploaded by a pool of workers, which bounds the parallelism towards
+    Vectara. Failed uploads are retried with exponential backoff. Each queued document has a
+    future, so callers can wait until the ids they need are queryable.
+
+    Args:
+        concurrency (int): Number of uploads running at the same time.
+        max_retries (int): Number of retries of a failed upload.
+        retry_base_delay (float): Delay before the first retry, in seconds.
+    """
+
+    def __init__(self, concurrency: int, max_retries: int, retry_base_delay: float):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._loop = None
+        self._queue = None
+        self._workers = []
+        self._pending = {}  # document id -> future resolved with True once indexed
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        # Queues, futures and workers are bound to the event loop that created them
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        # Workers outlive the request that started them: they must not inherit its deadline
+        with detached():
+            self._workers = [
+                loop.create_task(self._worker(), name=f"vectara-indexer-{i}") for i in range(self.concurrency)
+            ]
+
+    def submit(self, documents) -> list:
+        """
+        Queue documents for indexing and return immediately.
+
+        Documents already in the corpus or already queued are not queued again.
+
+        Args:
+            documents (list[dict]): Documents in Vectara format.
+
+        Returns:
+            list[str]: The ids of the submitted documents.
+        """
+        self._ensure_started()
+        registry = get_registry()
+        ids = []
+        for document in documents:
+            doc_id = document['id']
+            ids.append(doc_id)
+            if doc_id in self._pending or doc_id in registry:
+                continue
+            self._pending[doc_id] = self._loop.create_future()
+            self._queue.put_nowait(document)
+        return ids
+
+    async def wait_for(self, ids, timeout: float = None) -> bool:
+        """
+        Wait until the given documents are indexed, or the timeout expires.
+
+        Args:
+            ids (list[str]): Ids of the documents to wait for.
+            timeout (float, optional): Maximum wait in seconds. Waits indefinitely if None.
+
+        Returns:
+            bool: True if all the documents are indexed, False otherwise.
+        """
+        futures = [self._pending[doc_id] for doc_id in ids if doc_id in self._pending]
+        if not futures:
+            return True
+        done, pending = await asyncio.wait(futures, timeout=timeout)
+        if pending:
+            logger.warning(f"{len(pending)} documents are still being indexed after {timeout}s.")
+        return not pending and all(future.result() for future in done)
+
+    async def join(self, timeout: float = None):
+        """
+        Wait until every queued document has been processed.
+        """
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} documents were not indexed before shutdown.")
+
+    async def close(self, timeout: float = None):
+        """
+        Flush the queue and stop the workers.
+        """
+        await self.join(timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            document = await self._queue.get()
+            indexed = False
+            try:
+                indexed = await self._upload(document)
+            except Exception as e:
+                logger.exception(f"Error processing document {document['id']}: {e}")
+            finally:
+                future = self._pending.pop(document['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(indexed)
+                self._queue.task_done()
+
+    async def _upload(self, document) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await index_vectara_document(document)
+            except (ValueError, httpx.HTTPError) as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up indexing document {document['id']}: {e}")
+                    return False
+                delay = self.retry_base_delay * (2 ** attempt)
+                logger.warning(f"Indexing of document {document['id']} failed ({e}), retrying in {delay}s.")
+                await asyncio.sleep(delay)
+        return False
+
+
+indexing_queue = IndexingQueue(
+    concurrency=INDEXING_CONFIG["concurrency"],
+    max_retries=INDEXING_CONFIG["max_retries"],
+    retry_base_delay=INDEXING_CONFIG["retry_base_delay"],
+)
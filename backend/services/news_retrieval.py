@@ -1,18 +1,25 @@
 import os
+import time
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
-import requests
 import hashlib
-import json
-from dotenv import load_dotenv
+import httpx
+from services.env import load_environment
 from services.groq import process_prompt_with_groq
+from services.http import get_http_client
+from services.indexing_queue import indexing_queue
+from utils.cache import make_key
+from utils.deadline import DeadlineExceeded, detached, remaining, within_deadline
+from utils.singleflight import SingleFlight
+from utils.metrics import instrument, record_error
 
 # Configure logger
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Load keys from environment
-load_dotenv(override=True)
+load_environment()
 NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
 REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
 REDDIT_SECRET = os.getenv("REDDIT_SECRET")
@@ -28,15 +35,62 @@ CONFIG = {
         "language": "en",
         "sort_by": "relevancy",
         "lookback_days": 7,
+        "base_url": os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org"),
     },
     "reddit": {
         "subreddits_limit": LIMIT,
         "posts_limit": LIMIT,
+        "token_refresh_margin_seconds": 300,  # Refresh the OAuth token this long before it expires
+        "token_retry_seconds": 30,  # Delay before retrying a failed background refresh
+        "auth_base_url": os.getenv("REDDIT_AUTH_BASE_URL", "https://www.reddit.com"),
+        "api_base_url": os.getenv("REDDIT_API_BASE_URL", "https://oauth.reddit.com"),
+    },
+    "retrieval": {
+        "deadline_seconds": float(os.getenv("RETRIEVAL_DEADLINE_SECONDS", "10")),  # Shared by all sources
+        "enough_articles": LIMIT,  # Once reached, slower sources only get the grace period below
+        "grace_seconds": float(os.getenv("RETRIEVAL_GRACE_SECONDS", "1")),
     },
 }
 
 
-def get_relevant_articles(prompt: str, tone: str, platform: str):
+class ArticleSource:
+    """
+    A pluggable source of articles queried by `get_relevant_articles`.
+
+    Args:
+        name (str): Name of the source, used in logs.
+        fetch (Callable): Coroutine function taking the search query and returning a list of
+                          articles in NewsAPI format (title, description, content, url, ...).
+        is_enabled (Callable): Returns True when the source is configured and should be queried.
+        disabled_message (str): Warning logged when the source is skipped.
+    """
+
+    def __init__(self, name, fetch, is_enabled=lambda: True, disabled_message=""):
+        self.name = name
+        self.fetch = fetch
+        self.is_enabled = is_enabled
+        self.disabled_message = disabled_message or f"Source {name} is not configured. Skipping."
+
+
+# Registered article sources, queried concurrently
+ARTICLE_SOURCES = []
+
+# Concurrent requests for the same en_prompt share one query per source
+source_flight = SingleFlight("article_sources")
+
+
+def register_source(source: ArticleSource):
+    """
+    Register a new article source. Sources with an existing name are replaced.
+
+    Args:
+        source (ArticleSource): The source to register.
+    """
+    ARTICLE_SOURCES[:] = [s for s in ARTICLE_SOURCES if s.name != source.name]
+    ARTICLE_SOURCES.append(source)
+
+
+async def get_relevant_articles(prompt: str, tone: str, platform: str):
     """
     Retrieve relevant articles based on a prompt, tone, and platform.
     
@@ -53,7 +107,7 @@ def get_relevant_articles(prompt: str, tone: str, platform: str):
         return []
 
     # Process the prompt using Groq
-    groq_data = process_prompt_with_groq(prompt, tone, platform)
+    groq_data = await process_prompt_with_groq(prompt, tone, platform)
     processed_data = {
         **groq_data,
         "original_input": {
@@ -64,36 +118,79 @@ def get_relevant_articles(prompt: str, tone: str, platform: str):
     }
     logger.debug(f"\nProcessed Data: {processed_data}")
 
+    # Query all sources concurrently using en_prompt; only unique articles are returned
+    return await _fetch_from_sources(processed_data.get("en_prompt", prompt), processed_data)
+
+
+async def _fetch_from_sources(query: str, processed_data: dict):
+    """
+    Query all enabled sources concurrently and merge their articles as they arrive.
+
+    Concurrent calls with the same query share the in-flight request of each source.
+    The articles of each source are queued for indexing on Vectara as soon as the source
+    returns, while the other sources are still running.
+
+    All sources share a single deadline. Once enough articles are in hand, the sources
+    still running get a short grace period and are then dropped.
+
+    Args:
+        query (str): The search query.
+        processed_data (dict): Data processed by Groq, used to format the articles.
+
+    Returns:
+        list[dict]: A list of unique articles formatted for Vectara.
+    """
+    tasks = {}
+    for source in ARTICLE_SOURCES:
+        if source.is_enabled():
+            fetch = source_flight.do((source.name, make_key(query)), source.fetch, query)
+            tasks[asyncio.create_task(fetch, name=f"source:{source.name}")] = source
+        else:
+            logger.warning(source.disabled_message)
+
+    loop = asyncio.get_running_loop()
+    budget = CONFIG["retrieval"]["deadline_seconds"]
+    left = remaining()
+    deadline = loop.time() + (budget if left is None else min(budget, left))
+    grace_deadline = None
+
     # Use a dictionary to avoid duplicates
     unique_articles = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = (deadline if grace_deadline is None else min(deadline, grace_deadline)) - loop.time()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source = tasks[task]
+                try:
+                    source_articles = task.result()
+                except Exception as e:
+                    logger.exception(f"Error retrieving articles from {source.name}: {e}")
+                    continue
+                logger.debug(f"\n{source.name} Articles Retrieved: {source_articles}")
+                formatted_articles = []
+                for article in source_articles:
+                    vectara_formatted = convert_to_vectara_format(article, processed_data)
+                    if vectara_formatted:
+                        unique_articles[vectara_formatted['id']] = vectara_formatted
+                        formatted_articles.append(vectara_formatted)
+                indexing_queue.submit(formatted_articles)
+
+            if grace_deadline is None and len(unique_articles) >= CONFIG["retrieval"]["enough_articles"]:
+                grace_deadline = loop.time() + CONFIG["retrieval"]["grace_seconds"]
+    finally:
+        for task in pending:
+            logger.warning(f"Dropping slow source {tasks[task].name}.")
+            task.cancel()
 
-    # Retrieve articles from NewsAPI using improved_prompt
-    if NEWSAPI_KEY:
-        news_articles = _get_newsapi_articles(processed_data.get("en_prompt", prompt))
-        logger.debug(f"\nNewsAPI Articles Retrieved: {news_articles}")
-        for article in news_articles:
-            vectara_formatted = convert_to_vectara_format(article, processed_data)
-            if vectara_formatted:
-                unique_articles[vectara_formatted['id']] = vectara_formatted
-    else:
-        logger.warning("NEWSAPI_KEY is missing in environment. Skipping NewsAPI.")
-
-    # Retrieve articles from Reddit using improved_prompt
-    if REDDIT_CLIENT_ID and REDDIT_SECRET:
-        reddit_articles = _get_reddit_posts(processed_data.get("en_prompt", prompt))
-        logger.debug(f"\nReddit Articles Retrieved: {reddit_articles}")
-        for article in reddit_articles:
-            vectara_formatted = convert_to_vectara_format(article, processed_data)
-            if vectara_formatted:
-                unique_articles[vectara_formatted['id']] = vectara_formatted
-    else:
-        logger.warning("Reddit API credentials are missing in environment. Skipping Reddit.")
-
-    # Return only unique articles
     return list(unique_articles.values())
 
 
-def _get_newsapi_articles(improved_prompt: str):
+@instrument("newsapi")
+async def _get_newsapi_articles(improved_prompt: str):
     """
     Retrieve articles from NewsAPI based on an improved prompt. Accepts only the first 'LIMIT' valid articles.
     
@@ -118,11 +215,11 @@ def _get_newsapi_articles(improved_prompt: str):
         "to": current_date.isoformat(),
     }
 
-    url = "https://newsapi.org/v2/everything"
+    url = f"{CONFIG['newsapi']['base_url']}/v2/everything"
     logger.debug(f"\nNewsAPI Request: URL: {url}, Params: {params}")
 
     try:
-        response = requests.get(url, params=params)
+        response = await within_deadline(get_http_client().get(url, params=params))
         response.raise_for_status()
         data = response.json()
         articles = data.get("articles", [])
@@ -147,38 +244,141 @@ def _get_newsapi_articles(improved_prompt: str):
         
         return valid_articles
 
-    except requests.RequestException as e:
+    except (httpx.HTTPError, DeadlineExceeded) as e:
         logger.exception(f"Request error to NewsAPI: {e}")
+        record_error("newsapi")
         return []
 
 
-def _get_reddit_token():
+class RedditTokenManager:
+    """
+    Process-wide cache of the Reddit client-credentials OAuth token.
+
+    The token is reused until it expires and is refreshed in the background shortly before
+    expiry. Concurrent refreshes are coalesced into a single request to the auth endpoint.
+    """
+
+    def __init__(self, refresh_margin: float, retry_delay: float):
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_task = None
+        self._refresh_timer = None
+        self._loop = None
+
+    def _is_valid(self) -> bool:
+        return bool(self._token) and time.monotonic() < self._expires_at
+
+    async def get_token(self):
+        """
+        Return a valid access token, fetching a new one only if none is cached.
+
+        Returns:
+            str or None: The access token, if available. Returns None in case of an error.
+        """
+        if self._is_valid():
+            return self._token
+        return await self.refresh()
+
+    async def refresh(self):
+        """
+        Fetch a new token, joining the refresh already in flight if there is one.
+
+        Returns:
+            str or None: The access token, if available. Returns None in case of an error.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Tasks and timers cannot be shared across event loops
+            self._loop, self._refresh_task, self._refresh_timer = loop, None, None
+        if self._refresh_task is None or self._refresh_task.done():
+            # The token is shared by every request: its refresh is not bound by the deadline of this one
+            with detached():
+                self._refresh_task = loop.create_task(self._fetch(), name="reddit-token-refresh")
+        return await asyncio.shield(self._refresh_task)
+
+    def invalidate(self):
+        """
+        Drop the cached token, e.g. after Reddit rejected it.
+        """
+        self._token = None
+        self._expires_at = 0.0
+
+    async def _fetch(self):
+        token, expires_in = await _request_reddit_token()
+        if token:
+            self._token = token
+            self._expires_at = time.monotonic() + expires_in
+            self._schedule_refresh(max(expires_in - self.refresh_margin, 0))
+        elif self._is_valid():
+            # Keep serving the current token and try again a bit later
+            self._schedule_refresh(self.retry_delay)
+        return self._token if self._is_valid() else None
+
+    def _schedule_refresh(self, delay: float):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        with detached():
+            self._refresh_timer = self._loop.call_later(delay, self._refresh_in_background)
+
+    def _refresh_in_background(self):
+        self._refresh_timer = None
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self._loop.create_task(self._fetch(), name="reddit-token-refresh")
+
+
+@instrument("reddit_auth")
+async def _request_reddit_token():
     """
     Authenticate with Reddit API and retrieve an access token.
     
     Returns:
-        str or None: The access token, if available. Returns None in case of an error.
+        tuple: The access token (or None in case of an error) and its lifetime in seconds.
     """
-    auth = requests.auth.HTTPBasicAuth(REDDIT_CLIENT_ID, REDDIT_SECRET)
+    auth = (REDDIT_CLIENT_ID, REDDIT_SECRET)
     data = {"grant_type": "client_credentials"}
     headers = {"User-Agent": REDDIT_USER_AGENT}
 
     try:
-        token_response = requests.post(
-            "https://www.reddit.com/api/v1/access_token",
+        token_response = await get_http_client().post(
+            f"{CONFIG['reddit']['auth_base_url']}/api/v1/access_token",
             auth=auth,
             data=data,
             headers=headers,
         )
         token_response.raise_for_status()
-        token = token_response.json().get("access_token")
+        token_data = token_response.json()
+        token = token_data.get("access_token")
         # logger.debug(f"\nReddit Access Token: {token}")
-        return token
-    except requests.RequestException as e:
+        return token, float(token_data.get("expires_in", 3600))
+    except httpx.HTTPError as e:
         logger.exception(f"Failed to authenticate with Reddit API: {e}")
-        return None
+        record_error("reddit_auth")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # Not JSON, or a token without a valid lifetime: the current token, if any, is kept
+        logger.exception(f"Invalid token response from Reddit API: {e!r}")
+        record_error("reddit_auth")
+    return None, 0.0
 
-def _get_reddit_posts(improved_prompt: str):
+
+reddit_token_manager = RedditTokenManager(
+    refresh_margin=CONFIG["reddit"]["token_refresh_margin_seconds"],
+    retry_delay=CONFIG["reddit"]["token_retry_seconds"],
+)
+
+
+async def _get_reddit_token():
+    """
+    Return a cached Reddit access token, authenticating only when needed.
+    
+    Returns:
+        str or None: The access token, if available. Returns None in case of an error.
+    """
+    return await reddit_token_manager.get_token()
+
+@instrument("reddit_search")
+async def _get_reddit_posts(improved_prompt: str):
     """
     Retrieve posts from Reddit based on an improved prompt.
     
@@ -197,7 +397,7 @@ def _get_reddit_posts(improved_prompt: str):
                     - content (str): The post content.
     """
    
-    token = _get_reddit_token()
+    token = await _get_reddit_token()
     if not token:
         return []
 
@@ -206,7 +406,7 @@ def _get_reddit_posts(improved_prompt: str):
         "User-Agent": REDDIT_USER_AGENT,
     }
 
-    url = "https://oauth.reddit.com/search"
+    url = f"{CONFIG['reddit']['api_base_url']}/search"
     params = {
         "q": improved_prompt,
         "limit": CONFIG["reddit"]["posts_limit"],
@@ -214,7 +414,10 @@ def _get_reddit_posts(improved_prompt: str):
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = await within_deadline(get_http_client().get(url, headers=headers, params=params))
+        if response.status_code == 401:
+            # The token was revoked or expired early: fetch a new one on the next call
+            reddit_token_manager.invalidate()
         response.raise_for_status()
         posts = response.json().get("data", {}).get("children", [])
 
@@ -232,8 +435,9 @@ def _get_reddit_posts(improved_prompt: str):
             for post in posts
         ]
         return articles
-    except requests.RequestException as e:
+    except (httpx.HTTPError, DeadlineExceeded) as e:
         logger.exception(f"Request error to Reddit API: {e}")
+        record_error("reddit_search")
         return []
 
 def convert_to_vectara_format(article: dict, processed_data: dict):
@@ -290,3 +494,17 @@ def convert_to_vectara_format(article: dict, processed_data: dict):
 
     logger.debug(f"\nVectara Formatted Output: {vectara_output}")
     return vectara_output
+
+
+register_source(ArticleSource(
+    "NewsAPI",
+    _get_newsapi_articles,
+    is_enabled=lambda: bool(NEWSAPI_KEY),
+    disabled_message="NEWSAPI_KEY is missing in environment. Skipping NewsAPI.",
+))
+register_source(ArticleSource(
+    "Reddit",
+    _get_reddit_posts,
+    is_enabled=lambda: bool(REDDIT_CLIENT_ID and REDDIT_SECRET),
+    disabled_message="Reddit API credentials are missing in environment. Skipping Reddit.",
+))
@@ -1,18 +1,50 @@
 import os
-from dotenv import load_dotenv
-import requests
 import json
+import inspect
+import logging
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+from services.env import load_environment
+from services.http import get_http_client
+from services.indexed_documents import get_registry
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import circuit_breaker
+from utils.deadline import within_deadline
+from utils.hedging import hedged
+from utils.rate_limit import rate_limited
 
 # Load environment variables
-load_dotenv()
+load_environment()
+
+# Configure logger
+logger = logging.getLogger(__name__)
 
 VECTARA_CUSTOMER_ID = os.getenv("VECTARA_CUSTOMER_ID")
 VECTARA_API_KEY = os.getenv("VECTARA_API_KEY")
 VECTARA_CORPORA = os.getenv("VECTARA_CORPORA")
 VECTARA_CORPUS_API_KEY = os.getenv("VECTARA_CORPUS_API_KEY")
+VECTARA_BASE_URL = os.getenv("VECTARA_BASE_URL", "https://api.vectara.io")
+
+@instrument("vectara_index")
+async def index_vectara_document(document):
+    """
+    Index a document on Vectara unless it is already in the corpus.
+
+    Args:
+        document (dict): Document in Vectara format, as built by `convert_to_vectara_format`.
+
+    Returns:
+        bool: True if the document is in the corpus, False if it was rejected.
 
-def index_vectara_document(document):
-    url = "https://api.vectara.io/v2/corpora/" + VECTARA_CORPORA + "/documents"
+    Raises:
+        ValueError: On rate limiting or server errors, which are worth retrying.
+    """
+    registry = get_registry()
+    if document['id'] in registry:
+        # Deterministic ids: the article is already in the corpus
+        logger.debug(f"Document {document['id']} already indexed, skipping.")
+        return True
+
+    url = VECTARA_BASE_URL + "/v2/corpora/" + VECTARA_CORPORA + "/documents"
     payload = {
         "id": document['id'],
         "type": "core",
@@ -28,19 +60,28 @@ def index_vectara_document(document):
         'Accept': 'application/json',
         "x-api-key": VECTARA_API_KEY
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    #print("\n\n\n Index Result: ", response)
+    async with rate_limited("vectara") as call, circuit_breaker("vectara", "index") as breaker:
+        response = await within_deadline(get_http_client().post(url, headers=headers, content=json.dumps(payload)))
+        breaker.observe(response)
+        call.observe(response)
     if response.status_code == 201:
-        print("\nDocument indexed successfully.")
+        registry.add(document['id'])
+        logger.debug(f"Document {document['id']} indexed successfully.")
+        return True
+    elif response.status_code == 409:
+        registry.add(document['id'])
+        logger.debug(f"Document {document['id']} was already in the corpus.")
+        return True
+    elif response.status_code == 429 or response.status_code >= 500:
+        raise ValueError(f"Error during indexing: {response.status_code} - {response.text}")
     else:
-        print(f"Error during indexing: {response.status_code} - {response.text}")
-
+        logger.error(f"Error during indexing: {response.status_code} - {response.text}")
+        record_error("vectara_index")
+        return False
 
-def search_documents(prompt, num_results=3, metadata_filter=""):
-    url = "https://api.vectara.io/v2/query"  # Correct URL
 
-    # Construct the payload
-    payload = {
+def _query_payload(prompt, num_results, metadata_filter, save_history=True):
+    return {
         "query": prompt,
         "search": {
             "corpora": [
@@ -71,26 +112,143 @@ def search_documents(prompt, num_results=3, metadata_filter=""):
             "enable_factual_consistency_score": True,
             "max_response_characters": 500
         },
-        "stream_response": False,
-        "save_history": True
+        "stream_response": True,
+        "save_history": save_history
     }
 
-    # Request headers
+
+async def stream_search(prompt, num_results=3, metadata_filter="") -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Query the corpus with a streamed response, yielding its parts as Vectara sends them.
+
+    The search results come first, as soon as the retrieval is over; the summary then
+    follows in chunks while it is generated.
+
+    Args:
+        prompt (str): The query.
+        num_results (int): Number of search results.
+        metadata_filter (str): Vectara metadata filter expression.
+
+    Yields:
+        tuple: `("search_results", list)` once, then `("generation_chunk", str)` for every piece of the
+               summary, until the generation ends.
+
+    Raises:
+        ValueError: If the query fails, possibly after some parts were yielded.
+    """
+    url = VECTARA_BASE_URL + "/v2/query"
     headers = {
         "Content-Type": "application/json",
-        "Accept": "application/json",
+        "Accept": "text/event-stream",
         "x-api-key": VECTARA_API_KEY
     }
+    attempts = 0
+    opened = []
+
+    async def _open():
+        nonlocal attempts
+        attempts += 1
+        # Only the first query is saved in the chat history, not its hedged duplicate
+        content = json.dumps(_query_payload(prompt, num_results, metadata_filter, save_history=attempts == 1))
+        async with rate_limited("vectara") as call, circuit_breaker("vectara", "query") as breaker:
+            client = get_http_client()
+            request = client.build_request("POST", url, headers=headers, content=content)
+            response = await within_deadline(client.send(request, stream=True))
+            opened.append(response)
+            breaker.observe(response)
+            call.observe(response)
+            return response
+
+    # Querying is idempotent: a query slow to start streaming is hedged with a second one
+    response = await hedged("vectara_query", _open)
+    for other in opened:
+        if other is not response:
+            await other.aclose()
 
-    # Make the request
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    
-    print("Result: ", response.json())
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            raise ValueError(f"Error during search: {response.status_code} - {response.text}")
 
-    # Check the response
-    if response.status_code == 200:
+        lines = response.aiter_lines().__aiter__()
+        while True:
+            # Every read is bounded by the deadline, not only the first one
+            try:
+                line = await within_deadline(lines.__anext__())
+            except StopAsyncIteration:
+                break
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            if event.get("type") == "search_results":
+                yield "search_results", event.get("search_results", [])
+            elif event.get("type") == "generation_chunk":
+                yield "generation_chunk", event.get("generation_chunk", "")
+            elif event.get("type") == "error":
+                raise ValueError(f"Error during search: {event.get('messages')}")
+            elif event.get("type") in ("generation_end", "end"):
+                # The summary is complete: do not wait for the trailing events
+                break
+    finally:
+        await response.aclose()
+
+
+@instrument("vectara_query")
+async def search_documents(prompt, num_results=3, metadata_filter="", on_delta: Optional[Callable] = None):
+    """
+    Query the corpus and return the summary generated from the search results.
+
+    Args:
+        prompt (str): The query.
+        num_results (int): Number of search results.
+        metadata_filter (str): Vectara metadata filter expression.
+        on_delta (Callable, optional): Called with each piece of the summary as soon as it is generated.
+
+    Returns:
+        str: The summary.
+
+    Raises:
+        ValueError: If the query fails.
+    """
+    pieces = []
+    async for kind, value in stream_search(prompt, num_results, metadata_filter):
+        if kind == "search_results":
+            # Not passed on: the sources of the response are the retrieved articles, which these
+            # results are drawn from. Streaming pays off through the summary pieces below.
+            logger.debug(f"Search results: {value}")
+            continue
+        pieces.append(value)
+        if on_delta is not None and value:
+            outcome = on_delta(value)
+            if inspect.isawaitable(outcome):
+                await outcome
+    return "".join(pieces)
+
+
+async def list_document_ids(page_size=100):
+    """
+    List the ids of all the documents stored in the corpus.
+
+    Args:
+        page_size (int): Number of documents requested per page.
+
+    Returns:
+        list[str]: The document ids.
+    """
+    url = VECTARA_BASE_URL + "/v2/corpora/" + VECTARA_CORPORA + "/documents"
+    headers = {
+        "Accept": "application/json",
+        "x-api-key": VECTARA_API_KEY
+    }
+    doc_ids = []
+    params = {"limit": page_size}
+    while True:
+        response = await get_http_client().get(url, headers=headers, params=params)
+        if response.status_code != 200:
+            raise ValueError(f"Error listing documents: {response.status_code} - {response.text}")
         results = response.json()
-        output = results['summary']
-        return output
-    else:
-        raise ValueError(f"Error during search: {response.status_code} - {response.text}")
+        doc_ids.extend(doc["id"] for doc in results.get("documents", []))
+        page_key = results.get("metadata", {}).get("page_key")
+        if not page_key:
+            return doc_ids
+        params = {"limit": page_size, "page_key": page_key}
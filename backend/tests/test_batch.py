@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from unittest import mock
+from models.requests import ContentRequest
+from utils.batch import BatchRunner
+from utils.deadline import remaining
+
+ARTICLES = [{"id": "article-1", "text": "News", "metadata": {"source": "https://news.example/1"}}]
+
+
+class TestBatchRunner(unittest.IsolatedAsyncioTestCase):
+    """
+    Items of a batch share retrieval and summary, each within its own deadline.
+    """
+
+    def setUp(self):
+        self.retrievals = []
+
+        async def get_relevant_articles(prompt, tone, platform):
+            self.retrievals.append((prompt, tone, platform, remaining()))
+            await asyncio.sleep(0.3)
+            return ARTICLES
+
+        async def returning(value, *args, **kwargs):
+            return value
+
+        indexing_queue = mock.MagicMock()
+        indexing_queue.wait_for = mock.AsyncMock()
+        patches = {
+            "get_relevant_articles": get_relevant_articles,
+            "indexing_queue": indexing_queue,
+            "search_documents": lambda *args, **kwargs: returning("Summary"),
+            "generate_social_post": lambda *args, **kwargs: returning("Post"),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch(f"utils.content_pipeline.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _run(self, requests: list) -> list:
+        items = [(index, req) for index, req in enumerate(requests)]
+        results = [result async for result in BatchRunner(4, 4).run(items)]
+        return sorted(results, key=lambda result: result["index"])
+
+    async def test_shared_retrieval_has_no_deadline(self):
+        results = await self._run([
+            ContentRequest(prompt="cats", assets=["text"], timeout=0.1),
+            ContentRequest(prompt="cats", assets=["text"]),
+        ])
+        self.assertEqual(len(self.retrievals), 1)
+        self.assertIsNone(self.retrievals[0][3])
+        self.assertIn("error", results[0])
+        self.assertEqual(results[1]["response"]["text"], "Post")
+
+    async def test_shared_by_prompt_tone_and_platform(self):
+        await self._run([
+            ContentRequest(prompt="cats", tone="humorous", assets=["text"]),
+            ContentRequest(prompt="Cats!", tone="humorous", assets=["text"]),
+            ContentRequest(prompt="cats", tone="serious", assets=["text"]),
+            ContentRequest(prompt="cats", tone="serious", platform="linkedin", assets=["text"]),
+        ])
+        self.assertEqual(len(self.retrievals), 3)
+
+    async def test_close_cancels_shared_stages(self):
+        runner = BatchRunner(4, 4)
+        results = runner.run([(0, "Invalid request"), (1, ContentRequest(prompt="cats", assets=["text"]))])
+        self.assertEqual((await results.__anext__())["error"], "Invalid request")
+        await asyncio.sleep(0.01)
+        shared = list(runner._shared.values())
+        await asyncio.wait_for(results.aclose(), 0.1)
+        self.assertTrue(all(task.done() for task in shared))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from utils.cache import TTLCache, close_caches
+
+
+class TestTTLCacheStore(unittest.IsolatedAsyncioTestCase):
+    """
+    Writes to the backing store are batched off the event loop and drained on shutdown.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cache.db")
+
+    def _stored(self) -> dict:
+        with sqlite3.connect(self.path) as db:
+            return {key: value for key, value in db.execute("SELECT key, value FROM cache")}
+
+    def _cache(self, **settings) -> TTLCache:
+        return TTLCache("test", **{"maxsize": 1, "ttl": 60, "path": self.path, "flush_delay": 0.05, **settings})
+
+    async def test_batched_flush(self):
+        cache = self._cache()
+        with mock.patch.object(cache._writes, "_write", wraps=cache._writes._write) as write:
+            for key in ("a", "b", "c"):
+                cache.set(key, {"key": key})
+            # Nothing is written on the event loop, evicted entries are still found
+            self.assertEqual(self._stored(), {})
+            self.assertEqual(cache.get("a"), {"key": "a"})
+            await asyncio.sleep(0.2)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(set(self._stored()), {"a", "b", "c"})
+
+    async def test_delete_and_clear_are_queued(self):
+        cache = self._cache(maxsize=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        await asyncio.sleep(0.2)
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(set(self._stored()), {"a", "b"})
+        await asyncio.sleep(0.2)
+        self.assertEqual(set(self._stored()), {"b"})
+
+        cache.set("c", 3)
+        cache.clear()
+        cache.set("d", 4)
+        cache._data.clear()
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("d"), 4)
+        await asyncio.sleep(0.2)
+        self.assertEqual(set(self._stored()), {"d"})
+
+    async def test_shutdown_drains_pending_writes(self):
+        cache = self._cache(flush_delay=60)
+        cache.set("a", 1)
+        cache.delete("missing")
+        await asyncio.wait_for(close_caches(), 1)
+        self.assertEqual(self._stored(), {"a": "1"})
+        self.assertEqual(self._cache().get("a"), 1)
+
+    def test_without_event_loop(self):
+        cache = self._cache()
+        cache.set("a", 1)
+        self.assertEqual(self._stored(), {"a": "1"})
+        cache.clear()
+        self.assertEqual(self._stored(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
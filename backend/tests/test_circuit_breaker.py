@@ -0,0 +1,135 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, CircuitOpen
+from utils.rate_limit import RateLimitExceeded
+
+SETTINGS = {"window": 60, "min_calls": 4, "error_rate": 0.5, "slow": 10, "slow_rate": 0.5, "open": 30, "probes": 2}
+
+
+class CircuitTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("utils.circuit_breaker.time", SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _open(self, breaker: CircuitBreaker):
+        for _ in range(int(breaker.settings["min_calls"])):
+            self.assertTrue(breaker.allow())
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, OPEN)
+
+
+class TestCircuitBreaker(CircuitTestCase):
+    """
+    Closed -> open -> half-open -> closed (or open again), with one trial per probe slot.
+    """
+
+    def test_opens_on_errors(self):
+        breaker = CircuitBreaker("test", SETTINGS)
+        for failed in (True, False, True):
+            self.assertTrue(breaker.allow())
+            breaker.record(failed, 0.1)
+        # Below `min_calls` the circuit stays closed whatever the error rate
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_opens_on_slow_calls(self):
+        breaker = CircuitBreaker("test", SETTINGS)
+        for seconds in (0.1, 0.1, 12, 15):
+            breaker.record(False, seconds)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_old_calls_leave_the_window(self):
+        breaker = CircuitBreaker("test", SETTINGS)
+        for _ in range(3):
+            breaker.record(True, 0.1)
+        self.now += 61
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_probes_close_the_circuit(self):
+        breaker = CircuitBreaker("test", SETTINGS)
+        self._open(breaker)
+        self.now += 29
+        self.assertFalse(breaker.allow())
+        self.now += 1
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        # Only `probes` trial calls at a time
+        self.assertFalse(breaker.allow())
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_opens_again(self):
+        breaker = CircuitBreaker("test", SETTINGS)
+        self._open(breaker)
+        self.now += 30
+        self.assertTrue(breaker.allow())
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, OPEN)
+        self.now += 29
+        self.assertFalse(breaker.allow())
+
+    def test_single_probe(self):
+        breaker = CircuitBreaker("test", {**SETTINGS, "probes": 1})
+        self._open(breaker)
+        self.now += 30
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        # A trial that never reached the provider frees its slot
+        breaker.release()
+        self.assertTrue(breaker.allow())
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+
+class TestCircuitBreakers(CircuitTestCase):
+    """
+    Guarded calls record their outcome, and open circuits route chat models to their alternate.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.breakers = CircuitBreakers(
+            {"openai": SETTINGS}, {"openai/gpt-4": "groq/llama3-70b-8192", "openai/gpt-4o": "groq"}
+        )
+
+    async def test_guard(self):
+        for _ in range(2):
+            with self.assertRaises(RateLimitExceeded):
+                async with self.breakers.guard("openai", "gpt-4"):
+                    raise RateLimitExceeded("queued too long")
+        for _ in range(4):
+            async with self.breakers.guard("openai", "gpt-4") as call:
+                call.observe(httpx.Response(503))
+        self.assertEqual(self.breakers.get("openai/gpt-4").state, OPEN)
+        self.assertEqual(self.breakers.get("openai").state, CLOSED)
+        with self.assertRaises(CircuitOpen):
+            async with self.breakers.guard("openai", "gpt-4"):
+                self.fail("An open circuit lets no call through")
+
+    def test_route(self):
+        self.assertEqual(self.breakers.route("openai", "gpt-4"), ("openai", "gpt-4"))
+        self._open(self.breakers.get("openai/gpt-4"))
+        self.assertEqual(self.breakers.route("openai", "gpt-4"), ("groq", "llama3-70b-8192"))
+        # No alternate when it is down too, or not a provider/model
+        self._open(self.breakers.get("groq/llama3-70b-8192"))
+        self.assertEqual(self.breakers.route("openai", "gpt-4"), ("openai", "gpt-4"))
+        self._open(self.breakers.get("openai/gpt-4o"))
+        self.assertEqual(self.breakers.route("openai", "gpt-4o"), ("openai", "gpt-4o"))
+        self.assertEqual(self.breakers.route("openai", "dall-e-3"), ("openai", "dall-e-3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
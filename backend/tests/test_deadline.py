@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest import mock
+from models.requests import ContentRequest
+from utils.response_cache import cached_content_pipeline
+
+ARTICLES = [{"id": "article-1", "text": "News", "metadata": {"source": "https://news.example/1"}}]
+
+
+def _returning(value, delay: float = 0.0):
+    async def _call(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return value
+    return _call
+
+
+class TestRequestDeadline(unittest.IsolatedAsyncioTestCase):
+    """
+    A request whose budget runs out gets fallback assets instead of an error.
+    """
+
+    def setUp(self):
+        indexing_queue = mock.MagicMock()
+        indexing_queue.wait_for = mock.AsyncMock()
+        patches = {
+            "get_relevant_articles": _returning(ARTICLES),
+            "indexing_queue": indexing_queue,
+            "search_documents": _returning("Summary"),
+            "generate_social_post": _returning("Post"),
+            "generate_meme": _returning("https://memes.example/1"),
+            "generate_video_prompt_with_gpt": _returning("Video prompt"),
+            "generate_image": _returning("https://images.example/1", delay=10),
+            "generate_video": _returning("https://videos.example/1", delay=10),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch(f"utils.content_pipeline.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_slow_assets_fall_back(self):
+        for cache in ("bypass", "default"):
+            with self.subTest(cache=cache):
+                req = ContentRequest(prompt=f"slow assets {cache}", timeout=0.5, cache=cache)
+                response = await asyncio.wait_for(cached_content_pipeline(req), 5)
+                self.assertEqual(response.text, "Post")
+                self.assertEqual(response.image, "/placeholder_image_url.jpg")
+                self.assertEqual(response.video, "/placeholder_video_url.mp4")
+                self.assertEqual(response.sources, ["https://news.example/1"])
+
+    async def test_slow_summary_falls_back(self):
+        with mock.patch("utils.content_pipeline.search_documents", _returning("Summary", delay=10)):
+            for cache in ("bypass", "default"):
+                with self.subTest(cache=cache):
+                    req = ContentRequest(prompt=f"slow summary {cache}", timeout=0.2, cache=cache)
+                    response = await asyncio.wait_for(cached_content_pipeline(req), 5)
+                    self.assertEqual(response.text, "")
+
+    async def test_tiny_timeout(self):
+        req = ContentRequest(prompt="tiny timeout", timeout=0.001)
+        response = await asyncio.wait_for(cached_content_pipeline(req), 5)
+        self.assertIn(response.image, ("", "/placeholder_image_url.jpg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,17 @@
+import os
+import unittest
+from benchmark.import_time import check_import_budget
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    The API imports quickly, without credentials and without loading the provider SDKs.
+    """
+
+    def test_import_budget(self):
+        budget = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "1.0"))
+        self.assertEqual(check_import_budget(budget)["problems"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
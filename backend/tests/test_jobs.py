@@ -0,0 +1,80 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from models.requests import ContentRequest
+from utils.jobs import JobStore, JobWorker
+
+
+class JobTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.store = JobStore(os.path.join(tempfile.mkdtemp(), "jobs.db"))
+        self.job_id = self.store.create(ContentRequest(prompt="cats", assets=["text"]))
+
+
+class TestJobLease(JobTestCase):
+    """
+    A job whose lease expires is claimed again, and the previous worker loses it.
+    """
+
+    def test_reclaim_after_expiry(self):
+        first = self.store.claim("first", lease_seconds=0.05)
+        self.assertEqual((first["id"], first["attempts"]), (self.job_id, 1))
+        # Leased: nothing else to claim
+        self.assertIsNone(self.store.claim("second", lease_seconds=60))
+        self.assertTrue(self.store.renew(self.job_id, "first", 0.05))
+        time.sleep(0.1)
+        second = self.store.claim("second", lease_seconds=60)
+        self.assertEqual((second["id"], second["attempts"]), (self.job_id, 2))
+        self.assertFalse(self.store.renew(self.job_id, "first", 60))
+        # The previous owner can no longer settle the job
+        self.assertFalse(self.store.complete(self.job_id, {"text": "late"}, "first"))
+        self.assertFalse(self.store.requeue(self.job_id, "first"))
+        self.assertTrue(self.store.complete(self.job_id, {"text": "Post"}, "second"))
+        self.assertEqual(self.store.get(self.job_id)["result"], {"text": "Post"})
+
+
+class TestJobWorker(JobTestCase):
+    """
+    A worker stops running a job once it loses the lease.
+    """
+
+    async def test_lost_lease_cancels_the_job(self):
+        cancelled = asyncio.Event()
+
+        async def run_stage_graph(*args, **kwargs):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        worker = JobWorker(self.store, concurrency=1, lease_seconds=0.15, poll_interval=0.01, max_attempts=3)
+        job = await asyncio.to_thread(self.store.claim, worker.worker_id, worker.lease_seconds)
+        with mock.patch("utils.jobs.run_stage_graph", run_stage_graph):
+            running = asyncio.create_task(worker.run_job(job))
+            await asyncio.sleep(0.2)
+            # Paused past its lease, e.g. the event loop was blocked: another worker takes over
+            self.store.requeue(self.job_id)
+            self.assertEqual(self.store.claim("other", 60)["id"], self.job_id)
+            await asyncio.wait_for(running, 1)
+        self.assertTrue(cancelled.is_set())
+        state = self.store.get(self.job_id)
+        self.assertEqual((state["status"], state["attempts"]), ("running", 2))
+
+    async def test_completes(self):
+        async def run_stage_graph(*args, **kwargs):
+            return {"articles": [{"id": "article-1"}], "sources": [], "summary": "Summary", "text": "Post"}
+
+        worker = JobWorker(self.store, concurrency=1, lease_seconds=60, poll_interval=0.01, max_attempts=3)
+        with mock.patch("utils.jobs.run_stage_graph", run_stage_graph):
+            await worker.run_job(self.store.claim(worker.worker_id, 60))
+        state = self.store.get(self.job_id)
+        self.assertEqual((state["status"], state["result"]["text"]), ("completed", "Post"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from unittest import mock
+import httpx
+from utils.meme_generation import _create_meme
+
+
+class TestCreateMeme(unittest.IsolatedAsyncioTestCase):
+    """
+    A bad caption_image response falls back instead of failing the request.
+    """
+
+    async def _create(self, response: httpx.Response):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response))
+        with mock.patch("utils.meme_generation.get_http_client", return_value=client):
+            return await _create_meme("2", "Top", "Bottom")
+
+    async def test_meme_url(self):
+        response = httpx.Response(200, json={"success": True, "data": {"url": "https://i.imgflip.com/1.jpg"}})
+        self.assertEqual(await self._create(response), "https://i.imgflip.com/1.jpg")
+
+    async def test_invalid_responses(self):
+        responses = {
+            "not json": httpx.Response(200, text="<html>Bad gateway</html>"),
+            "no url": httpx.Response(200, json={"success": True, "data": {}}),
+            "failure": httpx.Response(200, json={"success": False, "error_message": "No texts specified"}),
+        }
+        for name, response in responses.items():
+            with self.subTest(name):
+                self.assertIsNone(await self._create(response))
+
+
+if __name__ == "__main__":
+    unittest.main()
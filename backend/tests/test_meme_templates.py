@@ -0,0 +1,54 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+import httpx
+from utils.meme_templates import MemeTemplateCatalogue
+
+MEMES = [
+    {"id": "1", "name": "Cat Sign", "box_count": 1},
+    {"id": "2", "name": "Drake Hotline Bling", "box_count": 2},
+    {"id": "3", "name": "Expanding Brain", "box_count": 4},
+    {"id": "4", "name": "Grumpy Cat", "box_count": 2},
+]
+
+
+class TestMemeTemplateCatalogue(unittest.IsolatedAsyncioTestCase):
+    """
+    The catalogue survives bad Imgflip responses and only selects templates for two captions.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "templates.json")
+
+    def _serve(self, response: httpx.Response):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response))
+        patcher = mock.patch("utils.meme_templates.get_http_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_select_skips_templates_with_one_box(self):
+        self._serve(httpx.Response(200, json={"success": True, "data": {"memes": MEMES}}))
+        catalogue = MemeTemplateCatalogue(self.path, 3600)
+        self.assertEqual(await catalogue.select("my cat", "is a cat", "unknown"), "4")
+        self.assertEqual(await catalogue.select("nothing", "matches", "unknown"), "2")
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual([meme["id"] for meme in json.load(f)["memes"]], ["2", "3", "4"])
+
+    async def test_invalid_responses(self):
+        responses = {
+            "not json": httpx.Response(200, text="<html>Bad gateway</html>"),
+            "no data": httpx.Response(200, json={"success": False, "error_message": "Down"}),
+            "no memes": httpx.Response(200, json={"data": {"memes": None}}),
+            "server error": httpx.Response(502),
+        }
+        for name, response in responses.items():
+            with self.subTest(name):
+                self._serve(response)
+                catalogue = MemeTemplateCatalogue(self.path, 3600)
+                self.assertIsNone(await catalogue.select("my cat", "is a cat", "humorous"))
+
+
+if __name__ == "__main__":
+    unittest.main()
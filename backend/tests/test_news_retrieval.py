@@ -0,0 +1,49 @@
+import time
+import unittest
+from unittest import mock
+import httpx
+from services.news_retrieval import RedditTokenManager
+
+
+class TestRedditTokenManager(unittest.IsolatedAsyncioTestCase):
+    """
+    A bad answer of the Reddit auth endpoint keeps the current token.
+    """
+
+    def setUp(self):
+        for name in ("REDDIT_CLIENT_ID", "REDDIT_SECRET"):
+            patcher = mock.patch(f"services.news_retrieval.{name}", "test")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _serve(self, *responses: httpx.Response):
+        responses = iter(responses)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses)))
+        patcher = mock.patch("services.news_retrieval.get_http_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_invalid_responses_keep_the_token(self):
+        invalid = {
+            "not json": httpx.Response(200, text="<html>Too many requests</html>"),
+            "bad lifetime": httpx.Response(200, json={"access_token": "new", "expires_in": "soon"}),
+            "not an object": httpx.Response(200, json=["new"]),
+            "server error": httpx.Response(503),
+        }
+        for name, response in invalid.items():
+            with self.subTest(name):
+                self._serve(httpx.Response(200, json={"access_token": "first", "expires_in": 3600}), response)
+                manager = RedditTokenManager(refresh_margin=60, retry_delay=30)
+                self.addCleanup(lambda: manager._refresh_timer and manager._refresh_timer.cancel())
+                self.assertEqual(await manager.get_token(), "first")
+                # The background refresh fails: the current token is still served
+                self.assertEqual(await manager.refresh(), "first")
+                self.assertGreater(manager._expires_at, time.monotonic())
+
+    async def test_no_token(self):
+        self._serve(httpx.Response(200, text="not json"))
+        self.assertIsNone(await RedditTokenManager(refresh_margin=60, retry_delay=30).get_token())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from unittest import mock
+from models.requests import ContentRequest
+from utils.content_pipeline import _social_post, build_content_stages
+from utils.pipeline import Stage, prune_stages, run_stage_graph
+
+
+class TestRunStageGraph(unittest.IsolatedAsyncioTestCase):
+    """
+    Stages start once their dependencies are done, and fail as a whole.
+    """
+
+    async def test_dependency_order(self):
+        events = []
+
+        def stage(name, delay=0.0):
+            async def _run(*args):
+                events.append(f"start {name}")
+                await asyncio.sleep(delay)
+                events.append(f"end {name}")
+                return f"{name}({', '.join(args)})"
+            return _run
+
+        results = await run_stage_graph([
+            Stage("joined", stage("joined"), deps=("slow", "fast")),
+            Stage("slow", stage("slow", 0.02), deps=("root",)),
+            Stage("fast", stage("fast"), deps=("root",)),
+            Stage("root", stage("root")),
+        ])
+        self.assertEqual(results["joined"], "joined(slow(root()), fast(root()))")
+        self.assertEqual(events[:2], ["start root", "end root"])
+        # Independent stages run concurrently, and the join waits for both
+        self.assertLess(events.index("start slow"), events.index("end fast"))
+        self.assertEqual(events[-2:], ["start joined", "end joined"])
+
+    async def test_blocking_functions_and_completed(self):
+        on_result = mock.Mock()
+        results = await run_stage_graph(
+            [Stage("a", lambda: 1), Stage("b", lambda a: a + 1, deps=("a",))],
+            on_result=on_result, completed={"a": 10},
+        )
+        self.assertEqual(results, {"a": 10, "b": 11})
+        on_result.assert_called_once_with("b", 11)
+
+    async def test_invalid_graphs(self):
+        graphs = {
+            "unknown": [Stage("a", lambda b: b, deps=("b",))],
+            "cycle": [Stage("a", lambda c: c, deps=("c",)), Stage("b", lambda a: a, deps=("a",)),
+                      Stage("c", lambda b: b, deps=("b",))],
+            "duplicate": [Stage("a", lambda: 1), Stage("a", lambda: 2)],
+        }
+        for name, stages in graphs.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                await run_stage_graph(stages)
+
+    async def test_failure_cancels_dependents(self):
+        cancelled = []
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append("slow")
+                raise
+
+        dependent = mock.AsyncMock()
+        with self.assertRaisesRegex(RuntimeError, "upstream down"):
+            await asyncio.wait_for(run_stage_graph([
+                Stage("fail", fail), Stage("slow", slow), Stage("dependent", dependent, deps=("fail",)),
+            ]), 1)
+        self.assertEqual(cancelled, ["slow"])
+        dependent.assert_not_called()
+
+
+class TestPruneStages(unittest.TestCase):
+    """
+    Only the stages needed by the requested assets are kept.
+    """
+
+    def test_transitive_dependencies(self):
+        stages = [Stage("a", None), Stage("b", None, deps=("a",)), Stage("c", None, deps=("b",)), Stage("d", None)]
+        self.assertEqual([stage.name for stage in prune_stages(stages, ["c"])], ["a", "b", "c"])
+
+    def test_content_stages(self):
+        expected = {
+            ("text",): {"articles", "sources", "summary", "text"},
+            ("meme",): {"articles", "sources", "summary", "meme"},
+            ("image",): {"articles", "sources", "summary", "image"},
+            ("video",): {"articles", "sources", "summary", "video_prompt", "image", "video"},
+        }
+        with mock.patch.dict("utils.content_pipeline.COMBINED_CONFIG", {"enabled": False}):
+            for assets, names in expected.items():
+                with self.subTest(assets=assets):
+                    stages = build_content_stages(ContentRequest(prompt="cats", assets=list(assets)))
+                    self.assertEqual({stage.name for stage in stages}, names)
+
+
+
+class TestSocialPost(unittest.IsolatedAsyncioTestCase):
+    """
+    The text post gets the tone and platform of the request.
+    """
+
+    async def test_tone_and_platform(self):
+        req = ContentRequest(prompt="cats", tone="serious", platform="linkedin")
+        with mock.patch("utils.content_pipeline.generate_social_post", mock.AsyncMock(return_value="Post")) as generate:
+            self.assertEqual(await _social_post("Summary", req=req), "Post")
+        self.assertEqual(generate.call_args.kwargs["tone"], "serious")
+        self.assertEqual(generate.call_args.kwargs["platform"], "linkedin")
+
+if __name__ == "__main__":
+    unittest.main()
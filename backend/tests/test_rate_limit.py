@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+from utils.rate_limit import RateLimiter, RateLimitExceeded, retry_after
+
+_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """
+    Monotonic clock advanced by the sleeps of the rate limiter, which then return at once.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        self.sleeps.append(round(delay, 6))
+        self.now += delay
+        await _sleep(0)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """
+    Rates (GCRA), calls in flight served in arrival order, wait budgets and provider throttling.
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for target, value in {
+            "utils.rate_limit.time": SimpleNamespace(monotonic=self.clock.monotonic, time=lambda: self.clock.now),
+            "utils.rate_limit.asyncio.sleep": self.clock.sleep,
+        }.items():
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_requests_refill(self):
+        limiter = RateLimiter("test", rps=2)
+        for _ in range(4):
+            await limiter.acquire()
+            limiter.release()
+        # A burst of one second, then one call every 1/rps seconds
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+        self.clock.now += 10
+        for _ in range(2):
+            await limiter.acquire()
+            limiter.release()
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+
+    async def test_tokens_refill(self):
+        limiter = RateLimiter("test", tpm=600)
+        await limiter.acquire(tokens=600)
+        await limiter.acquire(tokens=100)
+        self.assertEqual(self.clock.sleeps, [10.0])
+
+    async def test_concurrency_first_in_first_out(self):
+        limiter = RateLimiter("test", concurrency=1)
+        await limiter.acquire()
+        order = []
+
+        async def call(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(call(name)) for name in ("first", "second", "third")]
+        await _sleep(0)
+        for _ in waiters:
+            limiter.release()
+            await _sleep(0)
+        await asyncio.gather(*waiters)
+        self.assertEqual(order, ["first", "second", "third"])
+
+    async def test_wait_budget_rejects(self):
+        limiter = RateLimiter("test", rps=1)
+        await limiter.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            await limiter.acquire(deadline=self.clock.now + 0.5)
+        # The rejected call did not take the place of the next one
+        await limiter.acquire(deadline=self.clock.now + 1)
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    async def test_no_free_slot_rejects(self):
+        limiter = RateLimiter("test", concurrency=1)
+        await limiter.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            await limiter.acquire(deadline=self.clock.now + 0.01)
+        limiter.release()
+        await limiter.acquire(deadline=self.clock.now)
+
+    async def test_retry_after_pauses_and_slows_down(self):
+        limiter = RateLimiter("test", rps=10)
+        await limiter.acquire()
+        limiter.release(retry_after(httpx.Response(429, headers={"Retry-After": "5"})))
+        self.assertEqual(limiter.factor, 0.5)
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [5.0])
+        limiter.release()
+        self.assertEqual(limiter.factor, 0.55)
+
+    async def test_cancelled_call_gives_its_place_back(self):
+        limiter = RateLimiter("test", rps=1)
+        await limiter.acquire()
+        with mock.patch("utils.rate_limit.asyncio.sleep", lambda delay: _sleep(3600)):
+            queued = asyncio.create_task(limiter.acquire())
+            await _sleep(0)
+            queued.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from utils.deadline import DeadlineExceeded, deadline_scope, remaining
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """
+    Concurrent calls with the same key share one call, its result and its errors.
+    """
+
+    def setUp(self):
+        self.flight = SingleFlight("test")
+        self.started = []
+
+    async def _call(self, value, delay=0.02):
+        self.started.append(value)
+        await asyncio.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def test_coalesces_concurrent_calls(self):
+        results = await asyncio.gather(
+            self.flight.do("a", self._call, 1), self.flight.do("a", self._call, 2), self.flight.do("b", self._call, 3),
+        )
+        self.assertEqual(results, [1, 1, 3])
+        self.assertEqual(self.started, [1, 3])
+        self.assertEqual((self.flight.calls, self.flight.coalesced), (2, 1))
+        self.assertEqual(self.flight.in_flight(), 0)
+        # Nothing is cached once the call completed
+        self.assertEqual(await self.flight.do("a", self._call, 4), 4)
+
+    async def test_errors_reach_every_caller(self):
+        results = await asyncio.gather(
+            self.flight.do("a", self._call, ValueError("down")), self.flight.do("a", self._call, 2),
+            return_exceptions=True,
+        )
+        self.assertEqual([type(result) for result in results], [ValueError, ValueError])
+        self.assertIs(results[0], results[1])
+        self.assertEqual(await self.flight.do("a", self._call, 3), 3)
+
+    async def test_cancelled_only_without_waiters(self):
+        first = asyncio.create_task(self.flight.do("a", self._call, 1, 0.05))
+        second = asyncio.create_task(self.flight.do("a", self._call, 2, 0.05))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        self.assertEqual(await second, 1)
+
+        third = asyncio.create_task(self.flight.do("b", self._call, 3, 10))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        await asyncio.gather(third, return_exceptions=True)
+        await asyncio.sleep(0)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    async def test_each_caller_keeps_its_deadline(self):
+        async def call():
+            await asyncio.sleep(0.05)
+            return remaining()
+
+        with deadline_scope(0.01):
+            short = asyncio.create_task(self.flight.do("a", call))
+        unbounded = asyncio.create_task(self.flight.do("a", call))
+        with self.assertRaises(DeadlineExceeded):
+            await short
+        # The shared call runs without the deadline of the caller starting it
+        self.assertIsNone(await unbounded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from utils.video_jobs import VideoJobManager
+
+
+class FakeRunway:
+    """
+    RunwayML client whose tasks go through the given statuses, one per status check.
+    """
+
+    def __init__(self, statuses: dict, hung: set = ()):
+        self.statuses = statuses
+        self.hung = set(hung)
+        self.checks = {task_id: 0 for task_id in statuses}
+        self.deleted = []
+        self.tasks = SimpleNamespace(retrieve=self.retrieve, delete=self.delete)
+
+    async def retrieve(self, task_id: str):
+        self.checks[task_id] += 1
+        if task_id in self.hung:
+            self.hung.discard(task_id)
+            await asyncio.sleep(3600)
+        statuses = self.statuses[task_id]
+        status = statuses[min(self.checks[task_id], len(statuses)) - 1]
+        output = [f"https://videos.example/{task_id}.mp4"] if status == "SUCCEEDED" else None
+        return SimpleNamespace(status=status, output=output, failure="Moderation" if status == "FAILED" else None)
+
+    async def delete(self, task_id: str):
+        self.deleted.append(task_id)
+
+
+class TestVideoJobManager(unittest.IsolatedAsyncioTestCase):
+    """
+    One poller follows every render: completion, failure, deadlines and hung status checks.
+    """
+
+    def _manager(self, runway: FakeRunway, **settings) -> VideoJobManager:
+        manager = VideoJobManager(lambda: runway, **{
+            "initial_delay": 0.01, "max_delay": 0.02, "timeout": 1.0, "poll_timeout": 0.05, **settings
+        })
+        self.addAsyncCleanup(manager.close)
+        return manager
+
+    async def test_completion(self):
+        runway = FakeRunway({"a": ["PENDING", "RUNNING", "SUCCEEDED"], "b": ["SUCCEEDED"]})
+        manager = self._manager(runway)
+        results = await asyncio.wait_for(asyncio.gather(manager.wait("a"), manager.wait("b")), 1)
+        self.assertEqual(results, ["https://videos.example/a.mp4", "https://videos.example/b.mp4"])
+        self.assertEqual(runway.checks, {"a": 3, "b": 1})
+        self.assertEqual(manager.in_flight(), 0)
+
+    async def test_failure(self):
+        manager = self._manager(FakeRunway({"a": ["RUNNING", "FAILED"]}))
+        with self.assertRaisesRegex(RuntimeError, "Task a failed: Moderation"):
+            await asyncio.wait_for(manager.wait("a"), 1)
+
+    async def test_task_timeout(self):
+        runway = FakeRunway({"a": ["RUNNING"]})
+        manager = self._manager(runway, timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            await asyncio.wait_for(manager.wait("a"), 1)
+        self.assertEqual(runway.deleted, ["a"])
+
+    async def test_hung_check_does_not_stall_the_others(self):
+        runway = FakeRunway({"hung": ["SUCCEEDED"], "other": ["RUNNING", "RUNNING", "SUCCEEDED"]}, hung={"hung"})
+        manager = self._manager(runway, poll_timeout=0.2)
+        hung = asyncio.ensure_future(manager.wait("hung"))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.assertEqual(await asyncio.wait_for(manager.wait("other"), 1), "https://videos.example/other.mp4")
+        self.assertLess(loop.time() - started, 0.2)
+        # The check timed out, and the task is checked again at its next poll
+        self.assertEqual(await asyncio.wait_for(hung, 1), "https://videos.example/hung.mp4")
+        self.assertEqual(runway.checks["hung"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Iterable
+from pydantic import ValidationError
+from services.env import load_environment
+from models.requests import ContentRequest
+from utils.cache import make_key
+from utils.content_pipeline import build_content_stages, omitted_assets, to_response
+from utils.deadline import deadline_scope, detached, within_deadline
+from utils.pipeline import run_stage_graph
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+BATCH_CONFIG = {
+    "concurrency": int(os.getenv("BATCH_CONCURRENCY", "8")),  # Requests of a batch generated at the same time
+    "stage_concurrency": int(os.getenv("BATCH_STAGE_CONCURRENCY", "16")),  # Upstream stage calls at the same time
+}
+
+# Stages that only depend on the prompt, tone and platform (which shape the retrieval query):
+# run once for all the requests of a batch sharing them
+SHARED_STAGES = ("articles", "sources", "summary")
+
+
+def parse_batch(lines: Iterable[str]) -> list:
+    """
+    Parse JSONL batch lines into requests.
+
+    Each non-empty line is a ContentRequest object, optionally with an `id` echoed in the results.
+
+    Returns:
+        list[tuple]: One (id, ContentRequest or error message) pair per non-empty line.
+    """
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            items.append((data.pop("id", None), ContentRequest(**data)))
+        except (ValueError, TypeError, AttributeError, ValidationError) as e:
+            items.append((None, f"Invalid request on line {number}: {e}"))
+    return items
+
+
+class BatchRunner:
+    """
+    Run a batch of requests with bounded concurrency, sharing retrieval across the batch.
+
+    Requests with the same normalized prompt, tone and platform retrieve, index and summarize
+    the news once; each request then only runs its own asset stages. The shared stages run
+    without any deadline, and each request waits for them within its own. A semaphore shared by all the stage
+    graphs bounds the upstream calls in flight across the whole batch.
+
+    Args:
+        concurrency (int): Number of requests generated at the same time.
+        stage_concurrency (int): Number of stage calls running at the same time.
+    """
+
+    def __init__(self, concurrency: int, stage_concurrency: int):
+        self.concurrency = concurrency
+        self.stage_concurrency = stage_concurrency
+        self._requests = None
+        self._limiter = None
+        self._shared = {}
+
+    async def run(self, items: list) -> AsyncIterator[dict]:
+        """
+        Generate the content of every item, yielding each result as soon as it is ready.
+
+        Args:
+            items (list): (id, ContentRequest or error message) pairs, as returned by `parse_batch`.
+
+        Yields:
+            dict: `index` and `id` of the item, with its `response` or an `error`.
+        """
+        self._requests = asyncio.Semaphore(self.concurrency)
+        self._limiter = asyncio.Semaphore(self.stage_concurrency)
+        self._shared = {}
+        tasks = [asyncio.create_task(self._run_item(index, item_id, req)) for index, (item_id, req) in enumerate(items)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # Nothing waits for the shared stages any more (e.g. the client disconnected)
+            for task in [*tasks, *self._shared.values()]:
+                task.cancel()
+            await asyncio.gather(*tasks, *self._shared.values(), return_exceptions=True)
+
+    async def _run_item(self, index: int, item_id, req) -> dict:
+        result = {"index": index, "id": item_id}
+        if not isinstance(req, ContentRequest):
+            return {**result, "error": req}
+        # The latency budget of an item starts once it runs, not while it waits for its turn
+        async with self._requests:
+            try:
+                with deadline_scope(req.timeout):
+                    completed = await within_deadline(asyncio.shield(self._shared_results(req)))
+                    results = await run_stage_graph(build_content_stages(req), completed=completed, limiter=self._limiter)
+                return {**result, "response": to_response(results, omitted_assets(req)).model_dump()}
+            except Exception as e:
+                logger.exception(f"Error generating batch item {index}: {e}")
+                return {**result, "error": str(e)}
+
+    def _shared_results(self, req: ContentRequest) -> asyncio.Task:
+        key = make_key(req.prompt, req.tone, req.platform)
+        if key not in self._shared:
+            stages = [stage for stage in build_content_stages(req) if stage.name in SHARED_STAGES]
+            # Shared by items with different deadlines: not bound to the one of the first item
+            with detached():
+                self._shared[key] = asyncio.create_task(run_stage_graph(stages, limiter=self._limiter))
+        return self._shared[key]
+
+
+def create_batch_runner() -> BatchRunner:
+    """
+    Build a batch runner using the configuration from the environment.
+    """
+    return BatchRunner(BATCH_CONFIG["concurrency"], BATCH_CONFIG["stage_concurrency"])
+
+
+async def _run_batch_command(input_path: str, output_path: str, runner: BatchRunner):
+    from services.http import close_http_client
+    from services.indexing_queue import indexing_queue, INDEXING_CONFIG
+
+    if input_path == "-":
+        items = parse_batch(sys.stdin)
+    else:
+        with open(input_path, encoding="utf-8") as f:
+            items = parse_batch(f)
+    logger.info(f"Generating {len(items)} requests")
+
+    output = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    try:
+        async for result in runner.run(items):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await indexing_queue.close(INDEXING_CONFIG["shutdown_timeout"])
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Generate the content of a JSONL batch of requests.")
+    parser.add_argument("input", help="JSONL file of requests (prompt, tone, platform, optional id), - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file of results, - for stdout")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONFIG["concurrency"], help="Requests generated at the same time")
+    parser.add_argument("--stage-concurrency", type=int, default=BATCH_CONFIG["stage_concurrency"], help="Stage calls running at the same time")
+    args = parser.parse_args()
+    asyncio.run(_run_batch_command(args.input, args.output, BatchRunner(args.concurrency, args.stage_concurrency)))
@@ -0,0 +1,274 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from utils.write_behind import WriteBehind
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# Pending write clearing the whole backing store
+_CLEARED = object()
+
+_caches = []
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a free-text value so that trivially different inputs share a cache key.
+
+    Lowercases the text, drops punctuation and collapses whitespace.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def make_key(*parts: str) -> str:
+    """
+    Build a cache key from several free-text values, normalizing each of them.
+    """
+    return "|".join(normalize_text(part) for part in parts)
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a time-to-live.
+
+    Values must be JSON serializable when an on-disk backing store is configured: the store
+    is a small SQLite file that survives restarts and is consulted on in-memory misses. New
+    entries are written to it in batches, from a worker thread.
+    Expired entries can be kept for a further `stale_ttl` seconds (or the one given to `set`)
+    and served by `lookup` flagged as stale, so that callers can refresh them in the background.
+
+    Args:
+        name (str): Name of the cache, used in logs.
+        maxsize (int): Maximum number of entries kept in memory.
+        ttl (float): Default time-to-live of an entry, in seconds.
+        path (str, optional): Path of the SQLite backing store. Memory only if not set.
+        max_bytes (int, optional): Maximum total size of the values kept in memory, measured
+                                   on their JSON encoding. Unbounded if not set.
+        stale_ttl (float): How long expired entries are still served as stale, in seconds.
+        flush_delay (float): How long new entries are batched before being written to the
+                             backing store, in seconds.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, path: Optional[str] = None,
+                 max_bytes: Optional[int] = None, stale_ttl: float = 0, flush_delay: float = 1.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, size, stale_until)
+        self._lock = threading.Lock()
+        self._db = self._open_store(path) if path else None
+        if self._db is not None:
+            # Separate connection for the batched writes, so that lookups never wait on a commit
+            self._writer = sqlite3.connect(path, check_same_thread=False)
+            self._writes = WriteBehind(f"cache {name}", self._write, flush_delay)
+            _caches.append(self)
+
+    def _open_store(self, path: str):
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL, stale_until REAL)")
+            if "stale_until" not in [column[1] for column in db.execute("PRAGMA table_info(cache)")]:
+                # Store written before entries had their own stale window
+                db.execute("ALTER TABLE cache ADD COLUMN stale_until REAL")
+            db.execute("UPDATE cache SET stale_until = expires_at + ? WHERE stale_until IS NULL", (self.stale_ttl,))
+            db.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),))
+            db.commit()
+            logger.info(f"Cache '{self.name}' backed by {path}")
+            return db
+        except sqlite3.Error as e:
+            logger.exception(f"Unable to open the backing store of cache '{self.name}': {e}")
+            return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return the cached value for `key`, or `default` if it is missing or expired.
+        """
+        found = self.lookup(key)
+        if found is None or found[1]:
+            return default
+        return found[0]
+
+    def lookup(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """
+        Return the cached value for `key` and whether it is stale, or None if it is missing.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[3] <= now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                entry = self._load(key, now)
+                if entry is not None:
+                    self._store_in_memory(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if entry[0] <= now:
+                self.stale_hits += 1
+                return entry[1], True
+            self.hits += 1
+            return entry[1], False
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: Optional[float] = None):
+        """
+        Store `value` under `key`, evicting the least recently used entries if needed.
+
+        Args:
+            key (str): The key.
+            value (Any): The value.
+            ttl (float, optional): Time-to-live of the entry; defaults to the one of the cache.
+            stale_ttl (float, optional): How long the entry is served as stale once expired;
+                                         defaults to the one of the cache.
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        stale_until = expires_at + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        entry = (expires_at, value, self._size_of(value), stale_until)
+        with self._lock:
+            self._store_in_memory(key, entry)
+            self._save(key, entry)
+
+    def delete(self, key: str):
+        """
+        Remove `key` from the cache and its backing store.
+        """
+        with self._lock:
+            self._remove(key)
+            if self._db is not None:
+                self._writes.put(key, None)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.stale_hits = self.misses = self.bytes = 0
+            if self._db is not None:
+                self._writes.reset(_CLEARED, None)
+
+    async def close(self):
+        """
+        Write the entries still waiting for the next batch to the backing store.
+        """
+        if self._db is not None:
+            await self._writes.close()
+
+    def stats(self) -> dict:
+        """
+        Return the size of the cache and its hit/miss counters.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+    def _size_of(self, value: Any) -> int:
+        if self.max_bytes is None:
+            return 0
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 0
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def _store_in_memory(self, key: str, entry: tuple):
+        self._remove(key)
+        self._data[key] = entry
+        self.bytes += entry[2]
+        while len(self._data) > self.maxsize or (
+            self.max_bytes is not None and self.bytes > self.max_bytes and len(self._data) > 1
+        ):
+            _, evicted = self._data.popitem(last=False)
+            self.bytes -= evicted[2]
+
+    def _load(self, key: str, now: float):
+        if self._db is None:
+            return None
+        entry = self._writes.get(key, _MISSING)
+        if entry is not _MISSING:
+            # Written, or deleted (None), by the next batch
+            return entry if entry is not None and entry[3] > now else None
+        if self._writes.get(_CLEARED, _MISSING) is not _MISSING:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at, stale_until FROM cache WHERE key = ? AND stale_until > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            return (row[1], value, self._size_of(value), row[2])
+        except (sqlite3.Error, ValueError) as e:
+            logger.exception(f"Error reading cache '{self.name}' from disk: {e}")
+            return None
+
+    def _save(self, key: str, entry: tuple):
+        if self._db is not None:
+            self._writes.put(key, entry)
+
+    def _write(self, batch: dict):
+        # Sets, deletes (None) and clears, in the order they were made, in a single transaction
+        for key, entry in batch.items():
+            if key is _CLEARED:
+                self._writer.execute("DELETE FROM cache")
+            elif entry is None:
+                self._writer.execute("DELETE FROM cache WHERE key = ?", (key,))
+            else:
+                try:
+                    value = json.dumps(entry[1])
+                except (TypeError, ValueError) as e:
+                    logger.exception(f"Error writing cache '{self.name}' to disk: {e}")
+                    continue
+                self._writer.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+                    (key, value, entry[0], entry[3]),
+                )
+        self._writer.commit()
+
+
+async def close_caches():
+    """
+    Write the entries still waiting to be saved by every cache with a backing store.
+    """
+    for cache in _caches:
+        await cache.close()
@@ -0,0 +1,258 @@
+import os
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+from services.env import load_environment
+from utils.deadline import DeadlineExceeded
+from utils.metrics import Counter, Gauge, registry
+from utils.rate_limit import RateLimitExceeded, parse_provider_settings
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+# Settings of every circuit unless overridden in CIRCUIT_BREAKERS
+DEFAULT_CIRCUIT_SETTINGS = {
+    "window": float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60")),  # Rolling window of the recorded calls
+    "min_calls": float(os.getenv("CIRCUIT_MIN_CALLS", "10")),  # Calls in the window before the circuit may open
+    "error_rate": float(os.getenv("CIRCUIT_ERROR_RATE", "0.5")),  # Share of failed calls opening the circuit
+    "slow": float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "30")),  # Duration after which a call counts as slow
+    "slow_rate": float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.5")),  # Share of slow calls opening the circuit
+    "open": float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),  # Time calls fail fast before the first probe
+    "probes": float(os.getenv("CIRCUIT_PROBES", "2")),  # Successful trial calls closing the circuit again
+}
+
+CIRCUIT_CONFIG = {
+    # Per provider or provider/model overrides, e.g. "runway:slow=300;openai/dall-e-3:slow=60"
+    "circuits": parse_provider_settings("runway:slow=300;" + os.getenv("CIRCUIT_BREAKERS", ""), DEFAULT_CIRCUIT_SETTINGS),
+    # Chat models served by another provider while their circuit is open, e.g. "openai/gpt-4=groq/llama3-70b-8192"
+    "alternates": dict(
+        tuple(side.strip() for side in entry.split("=", 1))
+        for entry in os.getenv("CIRCUIT_ALTERNATES", "").split(";") if "=" in entry
+    ),
+}
+
+# Values of the state gauge
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state = registry.register(Gauge(
+    "postgenius_circuit_state", "State of each circuit breaker: 0 closed, 1 half-open, 2 open.", ("circuit",)
+))
+circuit_rejections = registry.register(Counter(
+    "postgenius_circuit_rejections_total", "Calls failed fast because their circuit was open.", ("circuit",)
+))
+
+# Errors raised before reaching the provider, or caused by the budget of the request: not held against it
+_LOCAL_ERRORS = (RateLimitExceeded, DeadlineExceeded)
+
+
+class CircuitOpen(ValueError):
+    """
+    Raised instead of calling a provider whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider or model while most of its recent calls fail or are slow.
+
+    Calls are recorded over a rolling window. Once enough of them failed, or took longer
+    than the slow call threshold, the circuit opens and calls fail fast with CircuitOpen,
+    which the callers handle like any other provider failure. After the open period a few
+    trial calls are let through (half-open): the circuit closes once they all succeed and
+    opens again as soon as one fails.
+
+    Args:
+        name (str): Name of the circuit, e.g. `openai/dall-e-3`.
+        settings (dict): `window`, `min_calls`, `error_rate`, `slow`, `slow_rate`, `open` and
+                         `probes`, see DEFAULT_CIRCUIT_SETTINGS.
+    """
+
+    def __init__(self, name: str, settings: dict):
+        self.name = name
+        self.settings = {**DEFAULT_CIRCUIT_SETTINGS, **settings}
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls = deque()  # (time, failed, slow)
+        self._probes_in_flight = 0
+        self._probes_succeeded = 0
+        circuit_state.set(_STATE_VALUES[CLOSED], name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit '{self.name}' is now {state.replace('_', '-')}")
+        self.state = state
+        circuit_state.set(_STATE_VALUES[state], self.name)
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be sent now; a call allowed while half-open is a trial.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.settings["open"]:
+                return False
+            self._set_state(HALF_OPEN)
+            self._probes_in_flight = 0
+            self._probes_succeeded = 0
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight + self._probes_succeeded >= self.settings["probes"]:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def record(self, failed: bool, seconds: float):
+        """
+        Record the outcome of an allowed call.
+        """
+        slow = seconds >= self.settings["slow"]
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed or slow:
+                self._open()
+            else:
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.settings["probes"]:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+            return
+        if self.state == OPEN:
+            # A call started before the circuit opened
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        while self._calls and self._calls[0][0] < now - self.settings["window"]:
+            self._calls.popleft()
+        if len(self._calls) < self.settings["min_calls"]:
+            return
+        failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures >= self.settings["error_rate"] * len(self._calls) or slow_calls >= self.settings["slow_rate"] * len(self._calls):
+            self._open()
+
+    def release(self):
+        """
+        Give back a trial call that ended without reaching the provider.
+        """
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._calls.clear()
+        self._set_state(OPEN)
+
+
+class CircuitCall:
+    """
+    Handle of a call guarded by a circuit breaker, see `circuit_breaker`.
+    """
+
+    def __init__(self):
+        self.failed = False
+
+    def observe(self, response):
+        """
+        Record the response of the call: server errors count as failures.
+        """
+        self.failed = getattr(response, "status_code", 0) >= 500
+
+
+class CircuitBreakers:
+    """
+    The circuit breakers of every provider and model, built on first use.
+    """
+
+    def __init__(self, circuits: dict, alternates: dict):
+        self.circuits = circuits
+        self.alternates = alternates
+        self._breakers = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self._breakers:
+            # Model circuits inherit the settings of their provider
+            provider = name.split("/", 1)[0]
+            settings = {**self.circuits.get(provider, {}), **self.circuits.get(name, {})}
+            self._breakers[name] = CircuitBreaker(name, settings)
+        return self._breakers[name]
+
+    def route(self, provider: str, model: str) -> Tuple[str, str]:
+        """
+        Return the provider and model to call: the configured alternate while the circuit of
+        `provider/model` is open, `provider` and `model` otherwise.
+        """
+        name = f"{provider}/{model}"
+        alternate = self.alternates.get(name)
+        if alternate is None or self.get(name).state != OPEN or "/" not in alternate:
+            return provider, model
+        if self.get(alternate).state == OPEN:
+            return provider, model
+        logger.info(f"Circuit '{name}' is open: calling {alternate} instead")
+        alternate_provider, alternate_model = alternate.split("/", 1)
+        return alternate_provider, alternate_model
+
+    @asynccontextmanager
+    async def guard(self, provider: str, model: Optional[str] = None):
+        """
+        Fail fast if the circuit of the provider (or of its model) is open, otherwise record
+        the outcome and duration of the call.
+
+        Errors raised in the block count as failures, except rate limiting and the request
+        deadline; calls whose errors are not raised report their response with `CircuitCall.observe`.
+
+        Raises:
+            CircuitOpen: If the circuit is open.
+        """
+        breaker = self.get(f"{provider}/{model}" if model else provider)
+        if not breaker.allow():
+            circuit_rejections.inc(breaker.name)
+            raise CircuitOpen(f"Circuit '{breaker.name}' is open")
+
+        call = CircuitCall()
+        started = time.monotonic()
+        try:
+            yield call
+        except _LOCAL_ERRORS as e:
+            if isinstance(e, RateLimitExceeded):
+                # The provider was not called
+                breaker.release()
+            else:
+                breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException as e:
+            if isinstance(e, Exception):
+                breaker.record(True, time.monotonic() - started)
+            else:
+                breaker.release()
+            raise
+        else:
+            breaker.record(call.failed, time.monotonic() - started)
+
+
+circuit_breakers = CircuitBreakers(CIRCUIT_CONFIG["circuits"], CIRCUIT_CONFIG["alternates"])
+
+
+def circuit_breaker(provider: str, model: Optional[str] = None):
+    """
+    Guard a call to `provider` (or to one of its models) with its circuit breaker.
+
+    Enter it inside `rate_limited`: the time spent queueing for a slot is not part of the
+    call, and must not make it count as slow.
+
+    Usage:
+        async with rate_limited("openai", "dall-e-3"), circuit_breaker("openai", "dall-e-3"):
+            response = await client.images.generate(...)
+    """
+    return circuit_breakers.guard(provider, model)
+
+
+def route(provider: str, model: str) -> Tuple[str, str]:
+    """
+    Return the provider and model to call for `provider/model`, see `CircuitBreakers.route`.
+    """
+    return circuit_breakers.route(provider, model)
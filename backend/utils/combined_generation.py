@@ -0,0 +1,148 @@
+import os
+import json
+import logging
+from services.env import load_environment
+from services.clients import services
+from utils.circuit_breaker import circuit_breaker, route
+from utils.deadline import within_deadline
+from utils.metrics import instrument, record_error
+from utils.rate_limit import estimate_tokens, rate_limited
+
+# Load environment variables
+load_environment()
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+COMBINED_CONFIG = {
+    # Generate the post, meme captions and video prompt of a request with a single call
+    "enabled": os.getenv("COMBINED_GENERATION_ENABLED", "false").lower() == "true",
+    "model": os.getenv("COMBINED_GENERATION_MODEL", "gpt-4o"),  # Must support JSON schema outputs
+}
+
+# Longest video prompt accepted by RunwayML
+VIDEO_PROMPT_MAX_LENGTH = 512
+
+# JSON schema and instructions of each field that can be generated
+_FIELDS = {
+    "text": (
+        {"type": "string"},
+        "text: a concise, engaging post for the platform, with hashtags, emojis or calls to action "
+        "relevant to it, in the requested tone.",
+    ),
+    "meme": (
+        {
+            "type": "object",
+            "properties": {"top_caption": {"type": "string"}, "bottom_caption": {"type": "string"}},
+            "required": ["top_caption", "bottom_caption"],
+            "additionalProperties": False,
+        },
+        "meme: two short meme captions, positioned at the top and at the bottom of the meme, without emojis.",
+    ),
+    "video_prompt": (
+        {"type": "string"},
+        f"video_prompt: a highly descriptive and visually engaging description of a video for an AI model, "
+        f"strictly under {VIDEO_PROMPT_MAX_LENGTH} characters.",
+    ),
+}
+
+
+def _validate(field: str, value):
+    """
+    Return the value of a generated field if it is usable, None otherwise.
+    """
+    if field == "meme":
+        if not isinstance(value, dict):
+            return None
+        captions = [value.get("top_caption"), value.get("bottom_caption")]
+        if not all(isinstance(caption, str) and caption.strip() for caption in captions):
+            return None
+        return [caption.strip() for caption in captions]
+    if not isinstance(value, str) or not value.strip():
+        return None
+    if field == "video_prompt" and len(value.strip()) > VIDEO_PROMPT_MAX_LENGTH:
+        return None
+    return value.strip()
+
+
+@instrument("text_assets")
+async def generate_text_assets(summary: str, prompt: str, tone: str, platform: str, fields) -> dict:
+    """
+    Generate several text assets of a request with a single JSON-schema-constrained call.
+
+    The summary is sent once for the post, the meme captions and the video prompt, instead of
+    once per asset. Each field is validated on its own: the callers generate the missing ones
+    with the per-asset calls.
+
+    Args:
+        summary (str): Summary of the articles.
+        prompt (str): The user-provided prompt.
+        tone (str): Desired tone (e.g., "humorous").
+        platform (str): Target platform (e.g., "twitter").
+        fields (Iterable[str]): Fields to generate among `text`, `meme` and `video_prompt`.
+
+    Returns:
+        dict: The valid fields: `text` (str), `meme` ([top caption, bottom caption]) and
+              `video_prompt` (str). Empty if the call failed.
+    """
+    fields = [field for field in fields if field in _FIELDS]
+    if not summary or not fields:
+        return {}
+
+    schema = {
+        "type": "object",
+        "properties": {field: _FIELDS[field][0] for field in fields},
+        "required": fields,
+        "additionalProperties": False,
+    }
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You are a professional content creator specialized in social media posts, memes and "
+                "video descriptions for AI video models. Ensure that the outputs are concise, creative, "
+                "tailored to the platform and tone, and optimized for maximum engagement."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Summary: {summary}\n"
+                f"Prompt: {prompt}\n"
+                f"Tone: {tone}\n"
+                f"Platform: {platform}\n\n"
+                "Generate the following fields, all based on the same summary and prompt:\n"
+                + "\n".join(f"- {_FIELDS[field][1]}" for field in fields)
+            )
+        }
+    ]
+
+    try:
+        provider, model = route("openai", COMBINED_CONFIG["model"])
+        async with rate_limited(provider, model, tokens=estimate_tokens(messages, 500)), \
+                circuit_breaker(provider, model):
+            response = await within_deadline(services.get(provider).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": "text_assets", "strict": True, "schema": schema},
+                },
+            ))
+        generated = json.loads(response.choices[0].message.content)
+    except Exception as e:
+        logger.exception(f"Error generating the text assets with OpenAI: {e}")
+        record_error("text_assets")
+        return {}
+
+    assets = {}
+    for field in fields:
+        value = _validate(field, generated.get(field) if isinstance(generated, dict) else None)
+        if value is None:
+            logger.warning(f"Invalid '{field}' in the combined generation, falling back to its own call")
+        else:
+            assets[field] = value
+    logger.debug(f"Generated text assets: {assets}")
+    return assets
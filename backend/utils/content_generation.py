@@ -1,42 +1,22 @@
-import os
+import inspect
 import logging
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import AsyncIterator, Callable, Optional
+from services.env import load_environment
+from services.clients import services
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import circuit_breaker, route
+from utils.deadline import within_deadline
+from utils.rate_limit import estimate_tokens, rate_limited
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Logger configuration
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
-# OpenAI API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.error("OPENAI_API_KEY is missing.")
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def generate_social_post(summary, prompt, platform="twitter", tone="humorous", temperature=0.7, max_tokens=200):
-    """
-    Generates a social media post based on a prompt and summary and makes a direct call to the OpenAI API.
-
-    Args:
-        summary (str): Summary of the articles.
-        prompt (str): The user-provided prompt.
-        platform (str): Target platform (e.g., "twitter").
-        tone (str): Desired tone (e.g., "humorous").
-        temperature (float): Temperature for generation (default: 0.7).
-        max_tokens (int): Maximum number of tokens in the response (default: 200).
-
-    Returns:
-        str: Content of the generated post.
-    """
-    if not summary:
-        logger.warning("No summary provided to generate social posts.")
-        return ""
-
-    # Define the message for OpenAI
-    messages = [
+def _social_post_messages(summary, prompt, platform, tone):
+    return [
         {
             "role": "system",
             "content": (
@@ -61,17 +41,91 @@ def generate_social_post(summary, prompt, platform="twitter", tone="humorous", t
         }
     ]
 
-    try:
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4",
+
+async def stream_social_post(summary, prompt, platform="twitter", tone="humorous", temperature=0.7,
+                             max_tokens=200) -> AsyncIterator[str]:
+    """
+    Generates a social media post like `generate_social_post`, yielding the text as the OpenAI API streams it.
+
+    Args:
+        summary (str): Summary of the articles.
+        prompt (str): The user-provided prompt.
+        platform (str): Target platform (e.g., "twitter").
+        tone (str): Desired tone (e.g., "humorous").
+        temperature (float): Temperature for generation (default: 0.7).
+        max_tokens (int): Maximum number of tokens in the response (default: 200).
+
+    Yields:
+        str: The next piece of the post, as generated.
+
+    Raises:
+        Exception: If the call fails, possibly after some pieces were yielded.
+    """
+    if not summary:
+        logger.warning("No summary provided to generate social posts.")
+        return
+
+    messages = _social_post_messages(summary, prompt, platform, tone)
+
+    # Call OpenAI API, or the alternate chat model configured for when GPT-4 is down
+    provider, model = route("openai", "gpt-4")
+    async with rate_limited(provider, model, tokens=estimate_tokens(messages, max_tokens)), \
+            circuit_breaker(provider, model):
+        stream = await within_deadline(services.get(provider).chat.completions.create(
+            model=model,
             messages=messages,
             temperature=temperature,
-            max_tokens=max_tokens
-        )
-        content = response.choices[0].message.content.strip()
-        logger.debug(f"Generated social post: {content}")
-        return content
+            max_tokens=max_tokens,
+            stream=True
+        ))
+        try:
+            chunks = stream.__aiter__()
+            while True:
+                # Every read is bounded by the deadline, not only the first one
+                try:
+                    chunk = await within_deadline(chunks.__anext__())
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the connection when the consumer stops early
+            await stream.close()
+
+
+@instrument("social_post")
+async def generate_social_post(summary, prompt, platform="twitter", tone="humorous", temperature=0.7, max_tokens=200,
+                               on_delta: Optional[Callable] = None):
+    """
+    Generates a social media post based on a prompt and summary and makes a direct call to the OpenAI API.
+
+    Args:
+        summary (str): Summary of the articles.
+        prompt (str): The user-provided prompt.
+        platform (str): Target platform (e.g., "twitter").
+        tone (str): Desired tone (e.g., "humorous").
+        temperature (float): Temperature for generation (default: 0.7).
+        max_tokens (int): Maximum number of tokens in the response (default: 200).
+        on_delta (Callable, optional): Called with each piece of the post as soon as it is generated.
+
+    Returns:
+        str: Content of the generated post.
+    """
+    pieces = []
+    try:
+        async for delta in stream_social_post(summary, prompt, platform=platform, tone=tone, temperature=temperature,
+                                              max_tokens=max_tokens):
+            pieces.append(delta)
+            if on_delta is not None:
+                outcome = on_delta(delta)
+                if inspect.isawaitable(outcome):
+                    await outcome
     except Exception as e:
         logger.exception(f"Error generating social post with OpenAI: {e}")
+        record_error("social_post")
         return ""
+
+    content = "".join(pieces).strip()
+    if content:
+        logger.debug(f"Generated social post: {content}")
+    return content
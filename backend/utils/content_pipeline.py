@@ -0,0 +1,229 @@
+import logging
+from functools import partial
+from typing import Callable, Optional
+from models.requests import ASSETS, ContentRequest
+from models.responses import ContentResponse
+from services.news_retrieval import get_relevant_articles
+from services.vectara import search_documents
+from services.indexing_queue import indexing_queue, INDEXING_CONFIG
+from utils.combined_generation import COMBINED_CONFIG, generate_text_assets
+from utils.content_generation import generate_social_post
+from utils.image_generation import generate_image
+from utils.video_generation import generate_video, generate_video_prompt_with_gpt
+from utils.meme_generation import generate_meme
+from utils.pipeline import Stage, prune_stages, run_stage_graph
+from utils.cache import make_key
+from utils.deadline import DeadlineExceeded, remaining
+from utils.singleflight import SingleFlight, coalesce
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Stages whose results are fields of ContentResponse
+RESPONSE_STAGES = ("sources", "summary", "text", "meme", "image", "video")
+
+# Pieces of the summary and of the text post passed to `on_result` as they are generated,
+# before the stage they belong to completes
+SUMMARY_DELTA = "summary_delta"
+TEXT_DELTA = "text_delta"
+DELTA_STAGES = {SUMMARY_DELTA: "summary", TEXT_DELTA: "text"}
+
+# Assets returned when the request deadline is spent, as when their provider fails
+FALLBACKS = {
+    "meme": "/placeholder_meme_url.jpg",
+    "image": "/placeholder_image_url.jpg",
+    "video": "/placeholder_video_url.mp4",
+}
+
+# Concurrent requests for the same trending topic share the upstream calls of each stage
+summary_flight = SingleFlight("summary")
+
+
+async def _retrieve_articles(req: ContentRequest):
+    articles = await get_relevant_articles(req.prompt, req.tone, req.platform)
+    logger.debug(f"Articles retrieved: {articles}")
+    if not articles:
+        logger.warning("No articles found for the given prompt.")
+    return articles
+
+
+async def _list_sources(articles):
+    sources = [art["metadata"].get("source", "Source unavailable") for art in articles if "metadata" in art]
+    logger.debug(f"Sources: {sources}")
+    return sources
+
+
+async def _summarize(req: ContentRequest, articles, on_delta=None):
+    if not articles:
+        return ""
+    # Articles are indexed in the background as they are retrieved: only wait for the ones still in flight.
+    # Submitting again is a no-op for queued or indexed articles, and requeues them after a restart.
+    indexing_queue.submit(articles)
+    timeout = INDEXING_CONFIG["wait_timeout"]
+    if (left := remaining()) is not None:
+        timeout = max(0.0, min(timeout, left))
+    await indexing_queue.wait_for([art["id"] for art in articles], timeout=timeout)
+
+    try:
+        # Only the request starting a shared query gets the pieces of the summary
+        summary = await summary_flight.do(make_key(req.prompt), search_documents, req.prompt, on_delta=on_delta)
+    except DeadlineExceeded as e:
+        logger.warning(f"No summary within the request deadline: {e}")
+        return ""
+    logger.debug(f"Generated summary: {summary}")
+    if not summary:
+        logger.warning("No summary generated by LLM.")
+    return summary
+
+
+def _from_summary(generate: Callable, fallback: str = "") -> Callable:
+    """
+    Wrap an asset generator so that it is skipped when there is no summary, and returns
+    `fallback` once the request deadline is spent.
+    """
+    async def _stage(summary, *args):
+        if not summary:
+            return ""
+        try:
+            return await generate(summary, *args)
+        except DeadlineExceeded as e:
+            logger.warning(f"Falling back after the request deadline: {e}")
+            return fallback
+    return _stage
+
+
+def build_content_stages(req: ContentRequest, on_delta: Optional[Callable] = None):
+    """
+    Build the stage graph of a content generation request.
+
+    Retrieval and summary run first; then the text post, meme and video prompt + image
+    branches run in parallel, and only the video waits on its two inputs. Only the stages
+    needed by the requested assets are kept. In combined generation mode, the post, meme
+    captions and video prompt come from a single `text_assets` call when at least two of
+    them are needed; each field missing from it is generated by its own call.
+
+    Args:
+        req (ContentRequest): The request to serve.
+        on_delta (Callable, optional): Called with SUMMARY_DELTA or TEXT_DELTA and each piece of the
+                                       summary or text post as it is generated.
+
+    Returns:
+        list[Stage]: The stages of the pipeline.
+    """
+    summary_delta = partial(on_delta, SUMMARY_DELTA) if on_delta is not None else None
+    text_delta = partial(on_delta, TEXT_DELTA) if on_delta is not None else None
+    stages = [
+        Stage("articles", partial(_retrieve_articles, req)),
+        Stage("sources", _list_sources, deps=("articles",)),
+        Stage("summary", partial(_summarize, req, on_delta=summary_delta), deps=("articles",)),
+        Stage("text", _from_summary(partial(_social_post, req=req, on_delta=text_delta)), deps=("summary",)),
+        Stage("meme", _from_summary(partial(_meme, req=req), FALLBACKS["meme"]), deps=("summary",)),
+        # Generate video prompt using GPT-4
+        Stage("video_prompt", _from_summary(partial(_video_prompt, req=req)), deps=("summary",)),
+        Stage("image", _from_summary(partial(_image, req=req), FALLBACKS["image"]), deps=("summary",)),
+        # The video starts from the video prompt and the generated image
+        Stage("video", _from_summary(_video, FALLBACKS["video"]), deps=("summary", "video_prompt", "image")),
+    ]
+    text_fields = [field for asset, field in (("text", "text"), ("meme", "meme"), ("video", "video_prompt"))
+                   if asset in req.assets]
+    if COMBINED_CONFIG["enabled"] and len(text_fields) > 1:
+        combined = {
+            "text_assets": Stage(
+                "text_assets", _from_summary(partial(_text_assets, req=req, fields=tuple(text_fields))), deps=("summary",)
+            ),
+            "text": Stage("text", _from_summary(partial(_combined_social_post, req=req, on_delta=text_delta)), deps=("summary", "text_assets")),
+            "meme": Stage("meme", _from_summary(partial(_combined_meme, req=req), FALLBACKS["meme"]), deps=("summary", "text_assets")),
+            "video_prompt": Stage("video_prompt", _from_summary(partial(_combined_video_prompt, req=req)), deps=("summary", "text_assets")),
+        }
+        stages = [combined.get(stage.name, stage) for stage in stages] + [combined["text_assets"]]
+    return prune_stages(stages, ("sources", *req.assets))
+
+
+def omitted_assets(req: ContentRequest) -> list:
+    """
+    Return the assets not requested by `req`, left out of its response.
+    """
+    return [asset for asset in ASSETS if asset not in req.assets]
+
+
+def _asset_key(summary, req: ContentRequest) -> str:
+    # Assets only depend on the summary and on the prompt, tone and platform of the request
+    return make_key(summary, req.prompt, req.tone, req.platform)
+
+
+# Only the request starting a shared call gets its pieces, the others get the complete post
+@coalesce(SingleFlight("text"), lambda summary, req, on_delta=None: _asset_key(summary, req))
+async def _social_post(summary, req: ContentRequest, on_delta=None):
+    return await generate_social_post(summary, req.prompt, platform=req.platform, tone=req.tone, on_delta=on_delta)
+
+
+@coalesce(SingleFlight("meme"), lambda summary, req, captions=None: _asset_key(summary, req))
+async def _meme(summary, req: ContentRequest, captions=None):
+    return await generate_meme(summary, req.prompt, req.tone, req.platform, captions=captions)
+
+
+@coalesce(SingleFlight("video_prompt"), _asset_key)
+async def _video_prompt(summary, req: ContentRequest):
+    return await generate_video_prompt_with_gpt(summary, req.prompt, req.tone, req.platform)
+
+
+@coalesce(SingleFlight("image"), _asset_key)
+async def _image(summary, req: ContentRequest):
+    return await generate_image(summary, req.prompt, req.tone, req.platform)
+
+
+@coalesce(SingleFlight("text_assets"), lambda summary, req, fields: (_asset_key(summary, req), fields))
+async def _text_assets(summary, req: ContentRequest, fields):
+    return await generate_text_assets(summary, req.prompt, req.tone, req.platform, fields)
+
+
+# Fields of the combined generation, or their own call for the ones that failed validation
+async def _combined_social_post(summary, text_assets, req: ContentRequest, on_delta=None):
+    return (text_assets or {}).get("text") or await _social_post(summary, req=req, on_delta=on_delta)
+
+
+async def _combined_meme(summary, text_assets, req: ContentRequest):
+    return await _meme(summary, req=req, captions=(text_assets or {}).get("meme"))
+
+
+async def _combined_video_prompt(summary, text_assets, req: ContentRequest):
+    return (text_assets or {}).get("video_prompt") or await _video_prompt(summary, req=req)
+
+
+@coalesce(SingleFlight("video"), lambda summary, video_prompt, image_url: (video_prompt, image_url))
+async def _video(summary, video_prompt, image_url):
+    return await generate_video(video_prompt, image_url, duration=10)
+
+
+def to_response(results: dict, omitted=()) -> ContentResponse:
+    """
+    Build the API response from the results of the pipeline stages.
+
+    Args:
+        results (dict): Stage name -> result.
+        omitted (Iterable[str]): Assets that were not requested, left null in the response.
+    """
+    if not results.get("articles") or not results.get("summary"):
+        results = {}
+
+    assets = {asset: None if asset in omitted else results.get(asset) or "" for asset in ASSETS}
+    return ContentResponse(**assets, sources=results.get("sources") or [], omitted=list(omitted))
+
+
+async def run_content_pipeline(req: ContentRequest, on_result: Optional[Callable] = None) -> ContentResponse:
+    """
+    Run the whole generation pipeline for a request.
+
+    Args:
+        req (ContentRequest): The request to serve.
+        on_result (Callable, optional): Called with the name and result of each stage as soon as it completes,
+                                        and with SUMMARY_DELTA or TEXT_DELTA and each piece of the summary or
+                                        text post as it is generated.
+
+    Returns:
+        ContentResponse: The generated content.
+    """
+    results = await run_stage_graph(build_content_stages(req, on_delta=on_result), on_result=on_result)
+    for name in ("text", "meme", "video_prompt", "image", "video"):
+        logger.debug(f"Generated {name}: {results.get(name)}")
+    return to_response(results, omitted_assets(req))
@@ -0,0 +1,89 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Awaitable, Optional
+from services.env import load_environment
+
+# Load environment variables
+load_environment()
+
+DEADLINE_CONFIG = {
+    # Latency budget of a request that does not set its own `timeout`, video render included
+    "request_timeout": float(os.getenv("REQUEST_TIMEOUT_SECONDS", "600")),
+}
+
+# `time.monotonic()` by which the current request must be served, None when unbounded.
+# Tasks copy the context when they are created, so every stage of a request sees its deadline.
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """
+    Raised when the latency budget of the request is spent before an upstream call completes.
+    """
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Run the enclosed code, and the tasks it creates, within `seconds`.
+
+    Nested scopes can only shorten the deadline of the enclosing one.
+
+    Args:
+        seconds (float, optional): Latency budget; defaults to `REQUEST_TIMEOUT_SECONDS`.
+    """
+    deadline = time.monotonic() + (DEADLINE_CONFIG["request_timeout"] if seconds is None else seconds)
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(deadline, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached():
+    """
+    Lift the deadline of the current request, for background tasks created in the enclosed code
+    (workers, pollers, refreshes) that outlive it.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Return the seconds left before the deadline of the current request, or None if unbounded.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def within_deadline(awaitable: Awaitable):
+    """
+    Await an upstream call with the time left to the current request as timeout.
+
+    The SDKs retry failed calls on their own: the deadline bounds the call, retries included.
+    Calls shared by several requests run detached: there is no deadline and the call is not
+    bounded, each request bounds its own wait for the shared call instead.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes first; the call is cancelled.
+    """
+    timeout = remaining()
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("The request deadline was reached before the call started")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as e:
+        raise DeadlineExceeded(f"The call did not complete within the {timeout:.1f}s left to the request") from e
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+from services.env import load_environment
+from utils.deadline import remaining
+from utils.metrics import Counter, registry
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+HEDGE_CONFIG = {
+    # Idempotent calls that may be sent twice; an empty list disables hedging
+    "stages": [stage.strip() for stage in os.getenv("HEDGE_STAGES", "groq,imgflip,vectara_query").split(",") if stage.strip()],
+    "percentile": float(os.getenv("HEDGE_PERCENTILE", "95")),  # Latency after which the second call is sent
+    "min_samples": int(os.getenv("HEDGE_MIN_SAMPLES", "20")),  # Calls observed before hedging starts
+    "window": int(os.getenv("HEDGE_WINDOW", "200")),  # Recent calls the percentile is computed on
+}
+
+hedged_calls = registry.register(Counter(
+    "postgenius_hedged_calls_total", "Second calls sent because the first one was slower than usual.", ("stage",)
+))
+hedge_wins = registry.register(Counter(
+    "postgenius_hedge_wins_total", "Hedged calls that completed before the first one.", ("stage",)
+))
+
+
+class LatencyTracker:
+    """
+    Recent latencies of the successful calls of a stage.
+
+    Args:
+        window (int): Number of recent calls kept.
+    """
+
+    def __init__(self, window: int):
+        self._latencies = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def percentile(self, q: float, min_samples: int) -> Optional[float]:
+        """
+        Return the q-th percentile of the recent latencies, or None with fewer than `min_samples` calls.
+        """
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+_trackers = {}
+
+
+def _tracker(stage: str) -> LatencyTracker:
+    if stage not in _trackers:
+        _trackers[stage] = LatencyTracker(HEDGE_CONFIG["window"])
+    return _trackers[stage]
+
+
+async def _timed(tracker: LatencyTracker, call: Callable[[], Awaitable]) -> Any:
+    started = time.perf_counter()
+    result = await call()
+    tracker.observe(time.perf_counter() - started)
+    return result
+
+
+async def hedged(stage: str, call: Callable[[], Awaitable]) -> Any:
+    """
+    Run an idempotent upstream call, sending a second one if the first is slower than usual.
+
+    Once the first call outlasts the configured percentile of the recent latencies of the
+    stage, the same call is sent again and the first successful result wins; the other call
+    is cancelled. Stages not listed in HEDGE_STAGES are called once.
+
+    Args:
+        stage (str): Name of the stage, e.g. `vectara_query`.
+        call (Callable): Function starting the call, invoked once per attempt.
+
+    Returns:
+        Any: Result of the first call to succeed.
+
+    Raises:
+        Exception: The error of the last call to fail, if both fail.
+    """
+    tracker = _tracker(stage)
+    delay = None
+    if stage in HEDGE_CONFIG["stages"]:
+        delay = tracker.percentile(HEDGE_CONFIG["percentile"], HEDGE_CONFIG["min_samples"])
+    left = remaining()
+    if delay is None or (left is not None and left <= delay):
+        return await _timed(tracker, call)
+
+    first = asyncio.ensure_future(_timed(tracker, call))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+
+        logger.debug(f"Hedging '{stage}' call after {delay:.2f}s")
+        hedged_calls.inc(stage)
+        tasks.add(asyncio.ensure_future(_timed(tracker, call)))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        hedge_wins.inc(stage)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,16 +1,16 @@
 import logging
-import openai
-from openai import OpenAI
-import os
+from services.clients import get_openai_client
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import circuit_breaker
+from utils.deadline import within_deadline
+from utils.rate_limit import rate_limited
 
 # Configure the logger
 logger = logging.getLogger(__name__)
 
-# Configure OpenAI API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)  # Ensure the openai library is installed
 
-def generate_image(summary: str, prompt: str, tone: str, platform: str) -> str:
+@instrument("dalle")
+async def generate_image(summary: str, prompt: str, tone: str, platform: str) -> str:
     """
     Generate an image using the DALL·E 3 API based on the prompt, tone, platform, and summary.
 
@@ -38,20 +38,20 @@ def generate_image(summary: str, prompt: str, tone: str, platform: str) -> str:
         logger.debug(f"Sending request to DALL·E with detailed prompt: {detailed_prompt}")
 
         # API call to generate the image
-        response = client.images.generate(model="dall-e-3",
-        prompt=detailed_prompt,
-        size="1024x1024",
-        quality="standard",
-        n=1)
+        async with rate_limited("openai", "dall-e-3"), circuit_breaker("openai", "dall-e-3"):
+            response = await within_deadline(get_openai_client().images.generate(model="dall-e-3",
+            prompt=detailed_prompt,
+            size="1024x1024",
+            quality="standard",
+            n=1))
 
         # Extract the URL of the generated image
         image_url = response.data[0].url
         logger.info(f"Image successfully generated: {image_url}")
         return image_url
 
-    except openai.OpenAIError as e:
-        logger.exception(f"Error generating image with DALL·E: {e}")
-        return "/placeholder_image_url.jpg"
     except Exception as e:
-        logger.exception(f"Unexpected error in image generation: {e}")
+        # OpenAI errors, or a missing OPENAI_API_KEY
+        logger.exception(f"Error generating image with DALL·E: {e}")
+        record_error("dalle")
         return "/placeholder_image_url.jpg"  # Fallback in case of error
@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from services.env import load_environment
+from models.requests import ContentRequest
+from utils.content_pipeline import build_content_stages, omitted_assets, to_response
+from utils.deadline import deadline_scope
+from utils.pipeline import run_stage_graph
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+JOBS_CONFIG = {
+    "path": os.getenv("JOBS_DB_PATH", "jobs.db"),
+    "workers": int(os.getenv("JOB_WORKERS", "2")),  # Jobs run concurrently by the API process, 0 to disable
+    "lease_seconds": float(os.getenv("JOB_LEASE_SECONDS", "60")),  # A job is resumed elsewhere if not renewed
+    "poll_interval": float(os.getenv("JOB_POLL_INTERVAL", "1")),
+    "max_attempts": int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+}
+
+
+class JobStore:
+    """
+    Durable store of generation jobs and of the results of their stages, backed by SQLite.
+
+    The database runs in WAL mode so that the API and any number of worker processes can
+    share it. Jobs are claimed with a lease: if a worker dies, the lease expires and another
+    worker resumes the job from the stages already saved.
+
+    Args:
+        path (str): Path of the SQLite database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, request TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER DEFAULT 0,"
+            " worker_id TEXT, lease_expires_at REAL, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_stages ("
+            " job_id TEXT NOT NULL, stage TEXT NOT NULL, result TEXT, completed_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, stage))"
+        )
+
+    def create(self, req: ContentRequest) -> str:
+        """
+        Store a new queued job and return its id.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, request, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, req.model_dump_json(), now, now),
+            )
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float):
+        """
+        Atomically claim the oldest queued job, or a running job whose lease expired.
+
+        Returns:
+            dict or None: The claimed job (`id`, `request`, `attempts`), or None if there is nothing to do.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, request, attempts FROM jobs"
+                    " WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires_at = ?,"
+                    " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, row[0]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return {"id": row[0], "request": json.loads(row[1]), "attempts": row[2] + 1}
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Extend the lease of a running job. Returns False if the worker no longer owns the job.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def save_stage(self, job_id: str, stage: str, result):
+        """
+        Persist the result of a completed stage.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO job_stages (job_id, stage, result, completed_at) VALUES (?, ?, ?, ?)",
+                (job_id, stage, json.dumps(result), time.time()),
+            )
+
+    def stage_results(self, job_id: str) -> dict:
+        """
+        Return the results of the stages of a job that already completed.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT stage, result FROM job_stages WHERE job_id = ?", (job_id,)).fetchall()
+        return {stage: json.loads(result) for stage, result in rows}
+
+    def complete(self, job_id: str, result: dict, worker_id: str = None) -> bool:
+        return self._finish(job_id, "completed", worker_id, result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str, worker_id: str = None) -> bool:
+        return self._finish(job_id, "failed", worker_id, error=error)
+
+    def requeue(self, job_id: str, worker_id: str = None) -> bool:
+        """
+        Put a job back in the queue, keeping the results of its completed stages.
+
+        Like `complete` and `fail`, only updates the job if `worker_id`, when given, still owns it.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE id = ? AND (? IS NULL OR worker_id = ?)",
+                (time.time(), job_id, worker_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, status: str, worker_id: str = None, result=None, error=None) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ?"
+                " WHERE id = ? AND (? IS NULL OR worker_id = ?)",
+                (status, result, error, time.time(), job_id, worker_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str):
+        """
+        Return the state of a job, or None if it does not exist.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, attempts, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "attempts": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "stages": self.stage_results(job_id),
+        }
+
+
+class JobWorker:
+    """
+    Run queued jobs through the content pipeline, saving each stage as it completes.
+
+    Workers can run inside the API process or as separate processes sharing the same store
+    (`python -m utils.jobs`). Jobs interrupted by a crash are resumed once their lease expires,
+    skipping the stages whose results were already saved. A worker that fails to renew its
+    lease (e.g. after a long pause) stops running the job, which another worker may have claimed.
+
+    Args:
+        store (JobStore): The job store.
+        concurrency (int): Number of jobs run at the same time.
+        lease_seconds (float): Duration of the lease on a claimed job.
+        poll_interval (float): Delay between two polls of the store when idle.
+        max_attempts (int): Jobs are failed after this many attempts.
+    """
+
+    def __init__(self, store: JobStore, concurrency: int, lease_seconds: float, poll_interval: float, max_attempts: int):
+        self.store = store
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = None
+        self._runners = []
+
+    def start(self):
+        """
+        Start the job runners on the running event loop.
+        """
+        self._wakeup = asyncio.Event()
+        self._runners = [
+            asyncio.create_task(self._run_forever(), name=f"job-runner-{i}") for i in range(self.concurrency)
+        ]
+        logger.info(f"Job worker {self.worker_id} started with {self.concurrency} runners")
+
+    def notify(self):
+        """
+        Wake up an idle runner, e.g. right after a job was submitted.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def join(self):
+        """
+        Wait until the runners stop.
+        """
+        await asyncio.gather(*self._runners)
+
+    async def stop(self):
+        """
+        Stop the runners. Interrupted jobs are put back in the queue.
+        """
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+
+    async def _run_forever(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim, self.worker_id, self.lease_seconds)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job)
+
+    async def run_job(self, job: dict):
+        """
+        Run a claimed job to completion, resuming from its saved stages.
+        """
+        job_id = job["id"]
+        if job["attempts"] > self.max_attempts:
+            logger.error(f"Job {job_id} failed after {self.max_attempts} attempts")
+            await asyncio.to_thread(self.store.fail, job_id, "Too many attempts", self.worker_id)
+            return
+
+        heartbeat = None
+        try:
+            req = ContentRequest(**job["request"])
+            completed = await asyncio.to_thread(self.store.stage_results, job_id)
+            if completed:
+                logger.info(f"Resuming job {job_id}: stages {sorted(completed)} already completed")
+
+            async def on_result(stage, result):
+                await asyncio.to_thread(self.store.save_stage, job_id, stage, result)
+
+            # Each attempt gets the latency budget of the request
+            with deadline_scope(req.timeout):
+                work = asyncio.create_task(
+                    run_stage_graph(build_content_stages(req), on_result=on_result, completed=completed)
+                )
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, work))
+            results = await work
+            if await asyncio.to_thread(self.store.complete, job_id, to_response(results, omitted_assets(req)).model_dump(),
+                                       self.worker_id):
+                logger.info(f"Job {job_id} completed")
+            else:
+                logger.warning(f"Job {job_id} completed after its lease was lost, result dropped")
+        except asyncio.CancelledError:
+            if heartbeat is not None and heartbeat.done() and not heartbeat.cancelled():
+                # Stopped by the heartbeat: the job belongs to another worker now
+                logger.warning(f"Lost the lease on job {job_id}, stopped running it")
+                return
+            await asyncio.to_thread(self.store.requeue, job_id, self.worker_id)
+            raise
+        except Exception as e:
+            logger.exception(f"Error running job {job_id}: {e}")
+            await asyncio.to_thread(self.store.fail, job_id, str(e), self.worker_id)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str, work: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id, self.worker_id, self.lease_seconds):
+                work.cancel()
+                return
+
+
+_store = None
+
+
+def get_job_store() -> JobStore:
+    """
+    Return the process-wide job store, opening it on first use.
+    """
+    global _store
+    if _store is None:
+        _store = JobStore(JOBS_CONFIG["path"])
+    return _store
+
+
+def create_worker(concurrency: int = None) -> JobWorker:
+    """
+    Build a job worker using the configuration from the environment.
+    """
+    return JobWorker(
+        get_job_store(),
+        concurrency=JOBS_CONFIG["workers"] if concurrency is None else concurrency,
+        lease_seconds=JOBS_CONFIG["lease_seconds"],
+        poll_interval=JOBS_CONFIG["poll_interval"],
+        max_attempts=JOBS_CONFIG["max_attempts"],
+    )
+
+
+async def _run_worker(concurrency: int):
+    from services.http import close_http_client
+
+    worker = create_worker(concurrency)
+    worker.start()
+    try:
+        await worker.join()
+    finally:
+        await worker.stop()
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run a standalone PostGenius job worker.")
+    parser.add_argument("--concurrency", type=int, default=max(JOBS_CONFIG["workers"], 1), help="Jobs run at the same time")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_run_worker(args.concurrency))
+    except KeyboardInterrupt:
+        pass
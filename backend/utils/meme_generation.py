@@ -1,12 +1,19 @@
 import logging
-import requests
 import os
 import re
-from openai import OpenAI
-from dotenv import load_dotenv
+import httpx
+from services.env import load_environment
+from services.clients import services
+from services.http import get_http_client
+from utils.meme_templates import IMGFLIP_BASE_URL, template_catalogue
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import CircuitOpen, circuit_breaker, route
+from utils.deadline import DeadlineExceeded, within_deadline
+from utils.hedging import hedged
+from utils.rate_limit import RateLimitExceeded, estimate_tokens, rate_limited
 
 # Load environment variables
-load_dotenv(override=True)
+load_environment()
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -14,18 +21,9 @@ logger = logging.getLogger(__name__)
 # Configure credentials
 IMGFLIP_USERNAME = os.getenv("IMGFLIP_USERNAME")
 IMGFLIP_PASSWORD = os.getenv("IMGFLIP_PASSWORD")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Check OpenAI API key
-if OPENAI_API_KEY is None:
-    raise ValueError("OpenAI API key not found. Make sure it is correctly set in the .env file.")
 
-# Configure OpenAI client
-client = OpenAI()
-client.api_key = OPENAI_API_KEY
-
-
-def generate_meme(summary: str, prompt: str, tone: str, platform: str) -> str:
+async def generate_meme(summary: str, prompt: str, tone: str, platform: str, captions: list = None) -> str:
     """
     Generate a meme using the Imgflip API and analyze the summary, tone, platform, and prompt with OpenAI.
 
@@ -33,27 +31,31 @@ def generate_meme(summary: str, prompt: str, tone: str, platform: str) -> str:
     :param tone: The desired tone for the meme (e.g., humorous, serious, sarcastic).
     :param platform: The target platform for the meme (e.g., Instagram, Twitter, LinkedIn).
     :param prompt: An additional message to include in the meme generation.
+    :param captions: Top and bottom captions already generated, e.g. by the combined generation.
     :return: URL of the generated meme.
     """
     if not summary or not tone or not platform or not prompt:
         logger.warning("Invalid input: summary, tone, platform, or prompt is missing.")
         return "/placeholder_meme_url.jpg"
 
-    # Analyze the summary, tone, platform, and prompt with OpenAI
-    text0, text1 = _get_meme_text_from_summary(summary, tone, platform, prompt)
+    if captions:
+        text0, text1 = (_remove_emoji(caption).strip() for caption in captions)
+    else:
+        # Analyze the summary, tone, platform, and prompt with OpenAI
+        text0, text1 = await _get_meme_text_from_summary(summary, tone, platform, prompt)
 
     if not text0 or not text1:
         logger.warning("Failed to generate meme text.")
         return "/placeholder_meme_url.jpg"
 
-    # Retrieve popular meme templates from Imgflip
-    template_id = _get_popular_meme_template()
+    # Pick the best template from the local copy of the Imgflip catalogue
+    template_id = await template_catalogue.select(text0, text1, tone)
     if not template_id:
         logger.error("Failed to retrieve a meme template.")
         return "/placeholder_meme_url.jpg"
 
     # Generate the meme using the selected template
-    meme_url = _create_meme(template_id, text0, text1)
+    meme_url = await _create_meme(template_id, text0, text1)
     if meme_url:
         return meme_url
     else:
@@ -61,7 +63,8 @@ def generate_meme(summary: str, prompt: str, tone: str, platform: str) -> str:
         return "/placeholder_meme_url.jpg"
 
 
-def _get_meme_text_from_summary(summary: str, tone: str, platform: str, prompt: str) -> tuple:
+@instrument("meme_captions")
+async def _get_meme_text_from_summary(summary: str, tone: str, platform: str, prompt: str) -> tuple:
     """
     Analyze the summary, tone, platform, and prompt using OpenAI to generate meme text.
 
@@ -72,32 +75,35 @@ def _get_meme_text_from_summary(summary: str, tone: str, platform: str, prompt:
     :return: Tuple containing (text0, text1).
     """
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert meme generator. Create two short captions for a meme based on the following input. "
-                        "Consider the tone, publishing platform, and prompt to optimize the result."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Summary: {summary}\n"
-                        f"Tone: {tone}\n"
-                        f"Platform: {platform}\n"
-                        f"Additional prompt: {prompt}\n"
-                        "Generate two captions. The first should be positioned at the top of the meme, "
-                        "and the second at the bottom. Do not use emojis in the text.\n"
-                        "Output format:\n"
-                        "Top caption: <text0>\n"
-                        "Bottom caption: <text1>"
-                    ),
-                },
-            ],
-        )
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are an expert meme generator. Create two short captions for a meme based on the following input. "
+                    "Consider the tone, publishing platform, and prompt to optimize the result."
+                ),
+            },
+            {
+                "role": "user",
+                "content": (
+                    f"Summary: {summary}\n"
+                    f"Tone: {tone}\n"
+                    f"Platform: {platform}\n"
+                    f"Additional prompt: {prompt}\n"
+                    "Generate two captions. The first should be positioned at the top of the meme, "
+                    "and the second at the bottom. Do not use emojis in the text.\n"
+                    "Output format:\n"
+                    "Top caption: <text0>\n"
+                    "Bottom caption: <text1>"
+                ),
+            },
+        ]
+        provider, model = route("openai", "gpt-3.5-turbo")
+        async with rate_limited(provider, model, tokens=estimate_tokens(messages, 100)), \
+                circuit_breaker(provider, model):
+            response = await within_deadline(
+                services.get(provider).chat.completions.create(model=model, messages=messages)
+            )
         content = response.choices[0].message.content.strip()
         lines = content.split("\n")
         text0 = _remove_emoji(lines[0].replace("Top caption: ", "").strip()) if len(lines) > 0 else ""
@@ -107,6 +113,7 @@ def _get_meme_text_from_summary(summary: str, tone: str, platform: str, prompt:
         return text0, text1
     except Exception as e:
         logger.exception(f"Error generating meme text with OpenAI: {e}")
+        record_error("meme_captions")
         return "", ""
 
 
@@ -136,27 +143,8 @@ def _remove_emoji(text: str) -> str:
     return emoji_pattern.sub(r"", text)
 
 
-def _get_popular_meme_template() -> str:
-    """
-    Retrieve a popular meme template ID using the Imgflip API.
-
-    :return: Meme template ID.
-    """
-    url = "https://api.imgflip.com/get_memes"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        memes = response.json().get("data", {}).get("memes", [])
-        if memes:
-            template_id = memes[0]["id"]  # Use the first popular template
-            logger.info(f"Retrieved popular meme template ID: {template_id}")
-            return template_id
-    except requests.RequestException as e:
-        logger.exception(f"Error fetching popular memes: {e}")
-    return None
-
-
-def _create_meme(template_id: str, text0: str, text1: str) -> str:
+@instrument("imgflip")
+async def _create_meme(template_id: str, text0: str, text1: str) -> str:
     """
     Create a meme using the Imgflip API.
 
@@ -165,7 +153,7 @@ def _create_meme(template_id: str, text0: str, text1: str) -> str:
     :param text1: Bottom text for the meme.
     :return: URL of the generated meme.
     """
-    url = "https://api.imgflip.com/caption_image"
+    url = f"{IMGFLIP_BASE_URL}/caption_image"
     payload = {
         "template_id": template_id,
         "username": IMGFLIP_USERNAME,
@@ -174,9 +162,15 @@ def _create_meme(template_id: str, text0: str, text1: str) -> str:
         "text1": text1,
     }
 
+    async def _request():
+        async with rate_limited("imgflip"), circuit_breaker("imgflip"):
+            response = await within_deadline(get_http_client().post(url, data=payload))
+            response.raise_for_status()
+            return response
+
     try:
-        response = requests.post(url, data=payload)
-        response.raise_for_status()
+        # Captioning a template is idempotent: a slow call is hedged with a second one
+        response = await hedged("imgflip", _request)
         result = response.json()
         if result.get("success"):
             meme_url = result["data"]["url"]
@@ -184,6 +178,12 @@ def _create_meme(template_id: str, text0: str, text1: str) -> str:
             return meme_url
         else:
             logger.error(f"Imgflip API error: {result.get('error_message')}")
-    except requests.RequestException as e:
+            record_error("imgflip")
+    except (httpx.HTTPError, RateLimitExceeded, DeadlineExceeded, CircuitOpen) as e:
         logger.exception(f"Error creating meme: {e}")
+        record_error("imgflip")
+    except (ValueError, KeyError, TypeError) as e:
+        # Not JSON, or not the expected structure
+        logger.exception(f"Invalid response creating meme: {e!r}")
+        record_error("imgflip")
     return None
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import httpx
+from services.env import load_environment
+from services.http import get_http_client
+from utils.deadline import detached
+
+# Load environment variables
+load_environment()
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+IMGFLIP_BASE_URL = os.getenv("IMGFLIP_BASE_URL", "https://api.imgflip.com")
+
+TEMPLATES_CONFIG = {
+    "path": os.getenv("IMGFLIP_TEMPLATES_PATH", "imgflip_templates.json"),  # On-disk copy of the catalogue
+    "refresh_interval": float(os.getenv("IMGFLIP_TEMPLATES_REFRESH_SECONDS", "86400")),
+    "captions": 2,  # Number of text boxes we fill (top and bottom caption)
+}
+
+# Words found in the names of templates that suit each tone
+TONE_HINTS = {
+    "humorous": {"drake", "distracted", "boyfriend", "buttons", "brain", "pikachu", "cat"},
+    "sarcastic": {"change", "mind", "sure", "pikachu", "surprised", "wonka", "condescending"},
+    "casual": {"drake", "cat", "dog", "doge", "boyfriend", "buttons"},
+    "formal": {"batman", "buttons", "tuxedo", "pooh", "presentation", "expanding", "brain"},
+    "inspiring": {"brain", "expanding", "success", "kid", "leonardo", "cheers"},
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> set:
+    return set(_WORD.findall((text or "").lower()))
+
+
+class MemeTemplateCatalogue:
+    """
+    Local copy of the Imgflip template catalogue with a small selection index.
+
+    The catalogue is kept in memory and on disk, and refreshed in the background once it is
+    older than `refresh_interval`, so selecting a template never waits on the network except
+    on the very first use without a disk copy.
+
+    Args:
+        path (str): Path of the JSON file holding the catalogue.
+        refresh_interval (float): Age in seconds after which the catalogue is refreshed.
+    """
+
+    def __init__(self, path: str, refresh_interval: float):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.templates = []
+        self.fetched_at = 0.0
+        self._index = {}  # word -> positions of the templates whose name contains it
+        self._refresh_task = None
+        self._load_from_disk()
+
+    def _load_from_disk(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._set_templates(data.get("memes", []), data.get("fetched_at", 0.0))
+            logger.info(f"Loaded {len(self.templates)} meme templates from {self.path}")
+        except (OSError, ValueError, AttributeError) as e:
+            logger.exception(f"Error loading meme templates from disk: {e}")
+
+    def _save_to_disk(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": self.fetched_at, "memes": self.templates}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.exception(f"Error saving meme templates to disk: {e}")
+
+    def _set_templates(self, templates: list, fetched_at: float):
+        # The captions always fill two text boxes: templates with fewer can't be used
+        self.templates = [
+            template for template in templates
+            if isinstance(template, dict) and "id" in template
+            and isinstance(template.get("box_count"), int) and template["box_count"] >= TEMPLATES_CONFIG["captions"]
+        ]
+        self.fetched_at = fetched_at
+        index = {}
+        for position, template in enumerate(self.templates):
+            for word in _tokens(template.get("name", "")):
+                index.setdefault(word, []).append(position)
+        self._index = index
+
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched_at > self.refresh_interval
+
+    async def refresh(self) -> bool:
+        """
+        Download the catalogue from Imgflip, joining the download already in flight if any.
+
+        Returns:
+            bool: True if the catalogue was refreshed.
+        """
+        if self._refresh_task is None or self._refresh_task.done():
+            with detached():
+                self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self) -> bool:
+        templates = await _fetch_meme_templates()
+        if not templates:
+            return False
+        self._set_templates(templates, time.time())
+        await asyncio.to_thread(self._save_to_disk)
+        logger.info(f"Meme template catalogue refreshed: {len(templates)} templates")
+        return True
+
+    async def select(self, text0: str, text1: str, tone: str):
+        """
+        Pick the template that best fits the captions and the tone.
+
+        Only templates with at least two text boxes are considered. They are scored by how many
+        words of their name appear in the captions or in the hints for the tone, favouring
+        templates with exactly two text boxes and popular ones. The most popular template is
+        used when nothing matches.
+
+        Returns:
+            str or None: The template ID, or None if the catalogue is unavailable.
+        """
+        if not self.templates:
+            await self.refresh()
+        elif self.is_stale() and (self._refresh_task is None or self._refresh_task.done()):
+            with detached():
+                self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+        if not self.templates:
+            return None
+
+        words = _tokens(f"{text0} {text1}") | TONE_HINTS.get((tone or "").lower(), set())
+        scores = {}
+        for word in words:
+            for position in self._index.get(word, ()):
+                scores[position] = scores.get(position, 0) + 1
+
+        best_position, best_score = 0, 0.0
+        for position, matches in scores.items():
+            template = self.templates[position]
+            score = matches
+            score += 1 if template.get("box_count") == TEMPLATES_CONFIG["captions"] else 0
+            score += 1 / (1 + position)  # Popularity: the catalogue is sorted by usage
+            if score > best_score:
+                best_position, best_score = position, score
+
+        template_id = self.templates[best_position]["id"]
+        logger.info(f"Selected meme template '{self.templates[best_position].get('name')}' ({template_id})")
+        return template_id
+
+
+async def _fetch_meme_templates() -> list:
+    """
+    Retrieve the popular meme templates using the Imgflip API.
+
+    :return: List of templates (id, name, box_count, ...), sorted by popularity.
+    """
+    url = f"{IMGFLIP_BASE_URL}/get_memes"
+    try:
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+        memes = response.json()["data"]["memes"]
+        if not isinstance(memes, list):
+            raise ValueError(f"Unexpected list of memes: {memes!r:.100}")
+        return memes
+    except httpx.HTTPError as e:
+        logger.exception(f"Error fetching popular memes: {e}")
+    except (ValueError, KeyError, TypeError) as e:
+        # Not JSON, or not the expected structure
+        logger.exception(f"Invalid response fetching popular memes: {e!r}")
+    return []
+
+
+template_catalogue = MemeTemplateCatalogue(
+    path=TEMPLATES_CONFIG["path"],
+    refresh_interval=TEMPLATES_CONFIG["refresh_interval"],
+)
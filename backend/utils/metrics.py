@@ -0,0 +1,188 @@
+import math
+import time
+import bisect
+import logging
+import threading
+from functools import wraps
+from typing import Callable, Sequence, Tuple
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets, in seconds: from fast lookups to video renders
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, e.g. of errors.
+    """
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, e.g. the calls in flight.
+    """
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """
+    A distribution of observed values in cumulative buckets, e.g. of durations.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, labels: tuple, state) -> list:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text exposition format.
+
+    Collectors are called right before rendering, to refresh gauges whose values are only
+    known by other components (cache sizes, tracked jobs, ...).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.exception(f"Error collecting metrics: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.register(Histogram(
+    "postgenius_stage_duration_seconds", "Duration of the calls of each stage.", ("stage",)
+))
+stage_in_flight = registry.register(Gauge(
+    "postgenius_stage_in_flight", "Calls of each stage currently running.", ("stage",)
+))
+stage_errors = registry.register(Counter(
+    "postgenius_stage_errors_total", "Failed calls of each stage, including the ones replaced by a fallback.", ("stage",)
+))
+
+
+def record_error(stage: str):
+    """
+    Count a failure of `stage` that was handled by a fallback instead of raised.
+    """
+    stage_errors.inc(stage)
+
+
+def instrument(stage: str) -> Callable:
+    """
+    Decorate a coroutine function to record its duration, calls in flight and raised errors.
+
+    Args:
+        stage (str): Label of the stage in the metrics, e.g. the upstream provider called.
+    """
+    def decorator(func: Callable) -> Callable:
+        # Expose the error counter from the start, so that alerts can compare it to zero
+        stage_errors.inc(stage, amount=0)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            stage_in_flight.inc(stage)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                stage_errors.inc(stage)
+                raise
+            finally:
+                stage_duration.observe(time.perf_counter() - started, stage)
+                stage_in_flight.dec(stage)
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    A single node of the generation pipeline.
+
+    Args:
+        name (str): Unique name of the stage, used as key for its result.
+        func (Callable): Function computing the stage. It receives the results of `deps`
+                         as positional arguments, in the same order. Blocking functions are
+                         run in a worker thread, coroutine functions are awaited directly.
+        deps (Sequence[str]): Names of the stages whose results this stage needs.
+    """
+
+    def __init__(self, name: str, func: Callable, deps: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+    def __repr__(self):
+        return f"Stage(name={self.name!r}, deps={self.deps!r})"
+
+
+async def _call(func: Callable, *args) -> Any:
+    """
+    Run `func` without blocking the event loop.
+    """
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+async def run_stage_graph(stages: List[Stage], on_result: Optional[Callable] = None,
+                          completed: Optional[Dict[str, Any]] = None, limiter=None) -> Dict[str, Any]:
+    """
+    Execute a graph of stages, starting each one as soon as all its dependencies are done.
+
+    Independent stages run concurrently, so the total latency is bounded by the longest
+    chain of dependent stages instead of the sum of all of them.
+
+    Args:
+        stages (list[Stage]): The stages to run. Dependencies must refer to stages in the list.
+        on_result (Callable, optional): Called with the name and the result of each stage as soon
+                                        as it completes. May be a coroutine function; plain
+                                        functions are called on the event loop and must be quick.
+        completed (dict, optional): Results of stages that already ran, e.g. before a restart.
+                                    These stages are not run again and `on_result` is not called.
+        limiter (optional): Async context manager, e.g. an asyncio.Semaphore, held while each
+                            stage runs. Share it between graphs to bound their concurrent calls.
+
+    Returns:
+        dict: Mapping from stage name to its result.
+
+    Raises:
+        ValueError: If the graph references unknown stages or contains a cycle.
+        Exception: The first exception raised by a stage; the remaining stages are cancelled.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Stage names must be unique.")
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+    _check_acyclic(by_name)
+
+    tasks: Dict[str, asyncio.Task] = {}
+
+    completed = completed or {}
+
+    async def _run(stage: Stage) -> Any:
+        if stage.name in completed:
+            logger.debug(f"Stage '{stage.name}' already completed, reusing its result")
+            return completed[stage.name]
+        args = [await tasks[dep] for dep in stage.deps]
+        logger.debug(f"Starting stage '{stage.name}'")
+        if limiter is None:
+            result = await _call(stage.func, *args)
+        else:
+            async with limiter:
+                result = await _call(stage.func, *args)
+        logger.debug(f"Stage '{stage.name}' completed")
+        if on_result is not None:
+            notified = on_result(stage.name, result)
+            if inspect.isawaitable(notified):
+                await notified
+        return result
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(_run(stage), name=f"stage:{stage.name}")
+
+    try:
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return dict(zip(tasks.keys(), results))
+
+
+def prune_stages(stages: List[Stage], targets: Iterable[str]) -> List[Stage]:
+    """
+    Keep only the stages needed to compute `targets`: the targets and their transitive dependencies.
+
+    Args:
+        stages (list[Stage]): The whole graph.
+        targets (Iterable[str]): Names of the stages whose results are wanted.
+
+    Returns:
+        list[Stage]: The needed stages, in their original order.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name].deps)
+    return [stage for stage in stages if stage.name in needed]
+
+
+def _check_acyclic(by_name: Dict[str, Stage]):
+    """
+    Raise a ValueError if the stages contain a dependency cycle.
+    """
+    visiting, done = set(), set()
+
+    def _visit(name: str):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle detected at stage '{name}'")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            _visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in by_name:
+        _visit(name)
@@ -0,0 +1,392 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from services.env import load_environment
+from utils.deadline import remaining
+from utils.metrics import Counter, Gauge, registry
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+# Limits applied unless overridden by RATE_LIMITS: only the calls in flight are bounded by default,
+# set the requests/s and tokens/min of each provider or model to the quota of the account.
+# Only the creation of Runway tasks is limited here, the renders are capped by RUNWAY_MAX_RUNNING_TASKS.
+DEFAULT_RATE_LIMITS = (
+    "groq:concurrency=16;"
+    "openai:concurrency=32;"
+    "vectara:concurrency=16;"
+    "imgflip:concurrency=8;"
+    "runway:concurrency=8"
+)
+
+# Lowest fraction of the configured rates kept after repeated throttling
+MIN_RATE_FACTOR = 0.1
+# Fraction of the configured rates recovered after each successful call
+RATE_RECOVERY_STEP = 0.05
+
+rate_limit_waiting = registry.register(Gauge(
+    "postgenius_rate_limit_waiting", "Calls waiting for a slot of each rate limit.", ("limit",)
+))
+rate_limit_rejections = registry.register(Counter(
+    "postgenius_rate_limit_rejections_total", "Calls given up because their wait budget was exceeded.", ("limit",)
+))
+rate_limit_throttled = registry.register(Counter(
+    "postgenius_rate_limit_throttled_total", "Calls throttled by the provider (HTTP 429).", ("limit",)
+))
+
+
+class RateLimitExceeded(ValueError):
+    """
+    Raised when a call cannot start within its wait budget.
+    """
+
+
+def parse_provider_settings(spec: str, allowed) -> dict:
+    """
+    Parse per-provider settings written as `name:setting=value,...` entries separated by `;`.
+
+    Names are a provider (`openai`) or a provider and model (`openai/gpt-4`). Later entries
+    override the settings of earlier ones.
+
+    Args:
+        spec (str): The entries, e.g. `openai/gpt-4:rps=8,tpm=40000;groq:rps=0.5`.
+        allowed (Iterable[str]): Names of the accepted settings.
+
+    Returns:
+        dict: Name -> settings.
+
+    Raises:
+        ValueError: On an unknown setting or a value that is not a number.
+    """
+    limits = {}
+    for entry in spec.split(";"):
+        name, _, settings = entry.strip().partition(":")
+        if not name:
+            continue
+        limit = limits.setdefault(name.strip(), {})
+        for setting in settings.split(","):
+            key, _, value = setting.strip().partition("=")
+            if not key:
+                continue
+            if key not in allowed:
+                raise ValueError(f"Unknown setting '{key}' for '{name}', expected one of {sorted(allowed)}")
+            limit[key] = float(value)
+    return limits
+
+
+RATE_LIMIT_CONFIG = {
+    "wait_budget": float(os.getenv("RATE_LIMIT_WAIT_SECONDS", "20")),  # Default time a call may queue
+    # `rps` (requests per second), `tpm` (tokens per minute), `concurrency` (calls in flight), `wait` (seconds a call may queue)
+    "limits": parse_provider_settings(DEFAULT_RATE_LIMITS + ";" + os.getenv("RATE_LIMITS", ""), ("rps", "tpm", "concurrency", "wait")),
+}
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """
+    Estimate the tokens counted by a chat completion: about 4 characters per prompt token,
+    plus the completion tokens.
+    """
+    return sum(len(message.get("content") or "") for message in messages) // 4 + max_tokens
+
+
+def retry_after(response) -> Optional[float]:
+    """
+    Return how long a provider asked to wait before the next call, or None if it did not throttle.
+
+    Args:
+        response: An httpx response, as returned by the HTTP client or attached to SDK errors.
+
+    Returns:
+        float: Seconds from `Retry-After` (0 when absent) for a 429, otherwise None.
+    """
+    if response is None or getattr(response, "status_code", None) != 429:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Schedule:
+    """
+    Token bucket written as the time at which the bucket will be full again (GCRA), so that
+    a call can reserve its place in the queue without holding a lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.full_at = 0.0
+
+    def start_time(self, amount: float, now: float, factor: float) -> float:
+        rate = self.rate * factor
+        full_at = max(self.full_at, now)
+        return max(now, full_at + (amount - self.burst) / rate)
+
+    def reserve(self, amount: float, start: float, factor: float) -> float:
+        cost = amount / (self.rate * factor)
+        self.full_at = max(self.full_at, start) + cost
+        return cost
+
+    def cancel(self, cost: float):
+        # The calls reserved behind this one keep their place; only the capacity is given back
+        self.full_at -= cost
+
+
+class RateLimiter:
+    """
+    Limit the calls to a provider or model: requests per second, tokens per minute and calls in flight.
+
+    Callers are served in arrival order. A call waiting longer than its budget is rejected
+    with RateLimitExceeded, which the callers handle like any other provider failure. When the
+    provider answers 429, calls are paused for its `Retry-After` and the rates are halved, then
+    recovered step by step as calls succeed.
+
+    Args:
+        name (str): Name of the limit, e.g. `openai/gpt-4`.
+        rps (float): Requests per second, 0 for no limit. Bursts of one second are allowed.
+        tpm (float): Tokens per minute, 0 for no limit. Bursts of one minute are allowed.
+        concurrency (int): Calls in flight, 0 for no limit.
+        wait (float, optional): Default wait budget of the calls, in seconds.
+    """
+
+    def __init__(self, name: str, rps: float = 0, tpm: float = 0, concurrency: int = 0, wait: Optional[float] = None):
+        self.name = name
+        self.concurrency = int(concurrency)
+        self.wait = wait
+        self.factor = 1.0
+        self.paused_until = 0.0
+        self._requests = _Schedule(rps, max(1.0, rps)) if rps else None
+        self._tokens = _Schedule(tpm / 60, tpm) if tpm else None
+        self._in_flight = 0
+        self._waiters = deque()
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters are futures bound to the running event loop
+            self._loop = loop
+            self._in_flight = 0
+            self._waiters = deque()
+
+    async def acquire(self, tokens: int = 0, deadline: Optional[float] = None):
+        """
+        Wait for a slot and for the rates to allow the call.
+
+        Args:
+            tokens (int): Tokens the call is expected to use.
+            deadline (float, optional): `time.monotonic()` after which the call gives up.
+
+        Raises:
+            RateLimitExceeded: If the call cannot start before the deadline.
+        """
+        self._bind()
+        rate_limit_waiting.inc(self.name)
+        try:
+            await self._acquire_slot(deadline)
+            try:
+                await self._wait_for_rates(tokens, deadline)
+            except BaseException:
+                self._release_slot()
+                raise
+        finally:
+            rate_limit_waiting.dec(self.name)
+
+    def release(self, throttled: Optional[float] = None):
+        """
+        Free the slot of a completed call.
+
+        Args:
+            throttled (float, optional): `Retry-After` seconds if the provider throttled the call.
+        """
+        self._release_slot()
+        if throttled is None:
+            self.factor = min(1.0, self.factor + RATE_RECOVERY_STEP)
+            return
+        rate_limit_throttled.inc(self.name)
+        self.factor = max(MIN_RATE_FACTOR, self.factor / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + throttled)
+        logger.warning(f"Rate limit '{self.name}' throttled by the provider: pausing {throttled:.1f}s, "
+                       f"rates lowered to {self.factor:.0%}")
+
+    def _reject(self, reason: str):
+        rate_limit_rejections.inc(self.name)
+        raise RateLimitExceeded(f"Rate limit '{self.name}' exceeded: {reason}")
+
+    async def _acquire_slot(self, deadline: Optional[float]):
+        if not self.concurrency:
+            return
+        if self._in_flight < self.concurrency and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            self._cancel_waiter(waiter)
+            self._reject(f"no slot freed up among {self.concurrency} in flight")
+        except asyncio.CancelledError:
+            self._cancel_waiter(waiter)
+            raise
+
+    def _cancel_waiter(self, waiter: asyncio.Future):
+        if waiter.done():
+            # The slot was handed over right as the call gave up: pass it on
+            self._release_slot()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _release_slot(self):
+        if not self.concurrency:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot goes to the oldest waiter: the count of calls in flight is unchanged
+                waiter.set_result(None)
+                return
+        self._in_flight = max(0, self._in_flight - 1)
+
+    async def _wait_for_rates(self, tokens: int, deadline: Optional[float]):
+        if self._requests is None and self._tokens is None and self.paused_until <= time.monotonic():
+            return
+        now = time.monotonic()
+        start = max(now, self.paused_until)
+        if self._requests is not None:
+            start = max(start, self._requests.start_time(1, now, self.factor))
+        if self._tokens is not None and tokens:
+            start = max(start, self._tokens.start_time(tokens, now, self.factor))
+        if deadline is not None and start > deadline:
+            self._reject(f"next call allowed in {start - now:.1f}s")
+        # Reserve the place right away, so that later callers queue behind this one
+        reserved = []
+        if self._requests is not None:
+            reserved.append((self._requests, self._requests.reserve(1, start, self.factor)))
+        if self._tokens is not None and tokens:
+            reserved.append((self._tokens, self._tokens.reserve(tokens, start, self.factor)))
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except BaseException:
+                # Cancelled while queued: the call never runs, give its reservation back
+                for schedule, cost in reserved:
+                    schedule.cancel(cost)
+                raise
+
+
+class RateLimitedCall:
+    """
+    Handle of a call holding its rate limits, see `rate_limited`.
+    """
+
+    def __init__(self):
+        self.throttled = None
+
+    def observe(self, response):
+        """
+        Record the response of the call, to adapt the limits if the provider throttled it.
+        """
+        self.throttled = retry_after(response)
+
+
+class RateLimits:
+    """
+    The rate limiters of every provider and model, built from their settings on first use.
+    """
+
+    def __init__(self, limits: dict, wait_budget: float):
+        self.limits = limits
+        self.wait_budget = wait_budget
+        self._limiters = {}
+
+    def get(self, name: str) -> Optional[RateLimiter]:
+        """
+        Return the limiter named `name`, or None if no limit is configured for it.
+        """
+        if name not in self._limiters:
+            settings = self.limits.get(name)
+            self._limiters[name] = RateLimiter(name, **settings) if settings else None
+        return self._limiters[name]
+
+    @asynccontextmanager
+    async def limit(self, provider: str, model: Optional[str] = None, tokens: int = 0):
+        """
+        Hold the limits of a provider, and of one of its models, for the duration of a call.
+
+        Errors carrying a 429 response (SDK and httpx errors) adapt the limits automatically;
+        calls whose response is not raised report it with `RateLimitedCall.observe`.
+
+        Args:
+            provider (str): Name of the provider, e.g. `openai`.
+            model (str, optional): Model called, limited by the `provider/model` entry if any.
+            tokens (int): Tokens the call is expected to use, see `estimate_tokens`.
+
+        Raises:
+            RateLimitExceeded: If the call cannot start within the wait budget or the request deadline.
+        """
+        names = [provider] + ([f"{provider}/{model}"] if model else [])
+        limiters = [limiter for limiter in map(self.get, names) if limiter is not None]
+        wait = min((limiter.wait for limiter in limiters if limiter.wait is not None), default=self.wait_budget)
+        left = remaining()
+        # Never queue past the deadline of the request
+        deadline = time.monotonic() + (wait if left is None else min(wait, left))
+
+        acquired = []
+        try:
+            for limiter in limiters:
+                await limiter.acquire(tokens, deadline)
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in acquired:
+                limiter.release()
+            raise
+
+        call = RateLimitedCall()
+        try:
+            yield call
+        except Exception as e:
+            if call.throttled is None:
+                call.observe(getattr(e, "response", None))
+            raise
+        finally:
+            for limiter in acquired:
+                limiter.release(call.throttled)
+
+
+rate_limits = RateLimits(RATE_LIMIT_CONFIG["limits"], RATE_LIMIT_CONFIG["wait_budget"])
+
+
+def rate_limited(provider: str, model: Optional[str] = None, tokens: int = 0):
+    """
+    Hold the configured limits of `provider` (and `provider/model`) for the duration of a call.
+
+    Usage:
+        async with rate_limited("openai", "gpt-4", tokens=estimate_tokens(messages, 200)):
+            response = await client.chat.completions.create(...)
+    """
+    return rate_limits.limit(provider, model, tokens)
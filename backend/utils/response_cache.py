@@ -0,0 +1,208 @@
+import os
+import asyncio
+import logging
+from typing import Callable, Optional
+from services.env import load_environment
+from models.requests import ASSETS, ContentRequest
+from models.responses import ContentResponse
+from services.news_retrieval import CONFIG as NEWS_CONFIG
+from utils.cache import TTLCache, make_key
+from utils.content_pipeline import DELTA_STAGES, FALLBACKS, omitted_assets, run_content_pipeline, to_response
+from utils.deadline import DeadlineExceeded, deadline_scope, detached, within_deadline
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+RESPONSE_CACHE_CONFIG = {
+    # Responses are built from news of the last `lookback_days`: keep them as long as that window
+    "ttl_seconds": float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", NEWS_CONFIG["newsapi"]["lookback_days"] * 86400)),
+    # Expired responses are still served for this long while a fresh one is generated in the background
+    "stale_seconds": float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "86400")),
+    "max_bytes": int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    "maxsize": int(os.getenv("RESPONSE_CACHE_MAXSIZE", "10000")),
+    # DALL·E image URLs expire after an hour (signed RunwayML URLs too): responses holding them are
+    # served, stale included, for at most this long
+    "asset_url_seconds": float(os.getenv("RESPONSE_CACHE_ASSET_URL_SECONDS", "3000")),
+    "path": os.getenv("RESPONSE_CACHE_PATH"),  # Optional SQLite file to survive restarts
+}
+
+response_cache = TTLCache(
+    "responses",
+    maxsize=RESPONSE_CACHE_CONFIG["maxsize"],
+    ttl=RESPONSE_CACHE_CONFIG["ttl_seconds"],
+    path=RESPONSE_CACHE_CONFIG["path"],
+    max_bytes=RESPONSE_CACHE_CONFIG["max_bytes"],
+    stale_ttl=RESPONSE_CACHE_CONFIG["stale_seconds"],
+)
+
+# Keys being regenerated in the background, so that a stale entry is refreshed only once
+_refreshing = {}
+
+# Pipeline runs in flight by cache key, shared by concurrent identical requests
+_shared_runs = {}
+
+# Fields of ContentResponse replayed to `on_result` on a cache hit, in pipeline order
+_CACHED_STAGES = ("sources", "text", "meme", "image", "video")
+
+
+async def _notify(on_result: Callable, name: str, result):
+    outcome = on_result(name, result)
+    if asyncio.iscoroutine(outcome):
+        await outcome
+
+
+class _SharedRun:
+    """
+    A pipeline run shared by the concurrent requests with the same key.
+
+    Stage results are fanned out to every subscriber; subscribers joining late first get the
+    results already produced, the summary or post streamed so far coming as a single piece. The run
+    is cancelled once no request is waiting for it. The run has no deadline of its own: each
+    request waits for it within its own budget, then gets the results produced so far.
+    """
+
+    def __init__(self, key: str, req: ContentRequest):
+        self.req = req
+        self.results = {}
+        self.listeners = []
+        self.waiters = 0
+        with detached():
+            self.task = asyncio.create_task(self._run(key, req))
+
+    async def _run(self, key: str, req: ContentRequest) -> ContentResponse:
+        response = await run_content_pipeline(req, on_result=self._publish)
+        _store(key, response)
+        return response
+
+    async def _publish(self, name: str, result):
+        if name in DELTA_STAGES:
+            self.results[name] = self.results.get(name, "") + result
+        else:
+            self.results[name] = result
+        for listener in list(self.listeners):
+            try:
+                await _notify(listener, name, result)
+            except Exception as e:
+                logger.exception(f"Error notifying the result of stage {name}: {e}")
+
+    async def join(self, on_result: Optional[Callable] = None) -> ContentResponse:
+        if on_result is not None:
+            produced = [(name, result) for name, result in self.results.items()
+                        if DELTA_STAGES.get(name) not in self.results]
+            self.listeners.append(on_result)
+            for name, result in produced:
+                await _notify(on_result, name, result)
+        self.waiters += 1
+        try:
+            return await within_deadline(asyncio.shield(self.task))
+        except DeadlineExceeded as e:
+            logger.warning(f"Serving the partial results of a shared run after the request deadline: {e}")
+            return to_response({**FALLBACKS, **self.results}, omitted_assets(self.req))
+        finally:
+            self.waiters -= 1
+            if on_result in self.listeners:
+                self.listeners.remove(on_result)
+            if self.waiters == 0 and not self.task.done():
+                self.task.cancel()
+
+
+async def _run_shared(key: str, req: ContentRequest, on_result: Optional[Callable] = None) -> ContentResponse:
+    run = _shared_runs.get(key)
+    if run is None or run.task.get_loop() is not asyncio.get_running_loop():
+        run = _shared_runs[key] = _SharedRun(key, req)
+        run.task.add_done_callback(lambda _: _shared_runs.pop(key, None) if _shared_runs.get(key) is run else None)
+    else:
+        logger.debug(f"Joined in-flight generation for '{key}'")
+    return await run.join(on_result)
+
+
+def response_cache_key(req: ContentRequest) -> str:
+    """
+    Return the cache key of a request: its normalized prompt, tone, platform and, unless all
+    of them are requested, its assets.
+    """
+    if set(req.assets) == set(ASSETS):
+        return make_key(req.prompt, req.tone, req.platform)
+    return make_key(req.prompt, req.tone, req.platform, *sorted(set(req.assets)))
+
+
+def _is_cacheable(response: ContentResponse) -> bool:
+    # Empty responses (no news found) and placeholders left by failed providers are not worth keeping
+    assets = [getattr(response, asset) for asset in ASSETS if asset not in response.omitted]
+    if not any(assets):
+        return False
+    return not any(asset.startswith("/placeholder") for asset in assets)
+
+
+def _store(key: str, response: ContentResponse):
+    if not _is_cacheable(response):
+        return
+    if response.image or response.video:
+        # Fresh for half the lifetime of the asset URLs, then stale until they expire
+        lifetime = RESPONSE_CACHE_CONFIG["asset_url_seconds"]
+        ttl = min(RESPONSE_CACHE_CONFIG["ttl_seconds"], lifetime / 2)
+        response_cache.set(key, response.model_dump(), ttl=ttl,
+                           stale_ttl=min(RESPONSE_CACHE_CONFIG["stale_seconds"], lifetime - ttl))
+    else:
+        response_cache.set(key, response.model_dump())
+
+
+async def _refresh(key: str, req: ContentRequest):
+    try:
+        await _run_shared(key, req)
+        logger.info(f"Refreshed cached response for '{key}'")
+    except Exception as e:
+        logger.exception(f"Error refreshing cached response for '{key}': {e}")
+    finally:
+        _refreshing.pop(key, None)
+
+
+def _schedule_refresh(key: str, req: ContentRequest):
+    if key not in _refreshing:
+        # The refresh outlives the request that found the stale entry: it gets a budget of its own
+        with detached(), deadline_scope(req.timeout):
+            _refreshing[key] = asyncio.create_task(_refresh(key, req))
+
+
+async def cached_content_pipeline(req: ContentRequest, on_result: Optional[Callable] = None) -> ContentResponse:
+    """
+    Serve a request from the response cache, running the pipeline on a miss.
+
+    `req.cache` selects the behaviour: "default" serves fresh and stale entries (stale ones
+    are regenerated in the background), "refresh" always regenerates and stores the new
+    response, "bypass" neither reads nor writes the cache. Concurrent requests with the same
+    key share a single pipeline run, unless they bypass the cache. Generation runs within the
+    latency budget of the request (`req.timeout`), shared by every stage and upstream call.
+
+    Args:
+        req (ContentRequest): The request to serve.
+        on_result (Callable, optional): Called with the name and result of each stage as soon as
+                                        it completes; replayed from the cached response on a hit.
+
+    Returns:
+        ContentResponse: The generated or cached content.
+    """
+    if req.cache == "bypass":
+        with deadline_scope(req.timeout):
+            return await run_content_pipeline(req, on_result=on_result)
+
+    key = response_cache_key(req)
+    found = response_cache.lookup(key) if req.cache == "default" else None
+    if found is None:
+        with deadline_scope(req.timeout):
+            return await _run_shared(key, req, on_result)
+
+    cached, stale = found
+    logger.debug(f"Serving {'stale' if stale else 'fresh'} cached response for '{key}'")
+    if stale:
+        _schedule_refresh(key, req)
+    response = ContentResponse(**cached)
+    if on_result is not None:
+        for name in _CACHED_STAGES:
+            if name in response.omitted:
+                continue
+            await _notify(on_result, name, getattr(response, name))
+    return response
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from functools import wraps
+from typing import Any, Callable, Hashable
+from utils.deadline import detached, within_deadline
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing a key into a single in-flight call.
+
+    The first caller for a key starts the call; callers arriving while it is in flight wait
+    for the same result (or exception). Once it completes, the next caller starts a new one:
+    nothing is cached. The call is cancelled only when every waiting caller is cancelled.
+    The call is shared by requests with different deadlines: it runs without any, and each
+    caller waits for it within its own (DeadlineExceeded once the caller's budget is spent).
+
+    Args:
+        name (str): Name of the group, used in logs.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._loop = None
+        self._in_flight = {}
+
+    async def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run `func(*args, **kwargs)` unless a call with the same key is in flight, and return its result.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # In-flight calls are bound to the running event loop
+            self._loop = loop
+            self._in_flight = {}
+
+        call = self._in_flight.get(key)
+        if call is None:
+            with detached():
+                call = _Call(loop.create_task(func(*args, **kwargs)))
+            self._in_flight[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight '{self.name}' call for {key!r}")
+
+        call.waiters += 1
+        try:
+            return await within_deadline(asyncio.shield(call.task))
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._in_flight.get(key) is call:
+            del self._in_flight[key]
+
+    def in_flight(self) -> int:
+        """
+        Return the number of calls currently in flight.
+        """
+        return len(self._in_flight)
+
+
+def coalesce(flight: SingleFlight, key: Callable) -> Callable:
+    """
+    Decorate a coroutine function so that concurrent calls with the same key share one call.
+
+    Args:
+        flight (SingleFlight): The group the calls belong to.
+        key (Callable): Called with the arguments of the function, returns the key of the call.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await flight.do(key(*args, **kwargs), func, *args, **kwargs)
+        return wrapper
+    return decorator
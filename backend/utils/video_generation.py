@@ -1,26 +1,35 @@
 import logging
 import os
-from openai import OpenAI
-from runwayml import RunwayML
-from dotenv import load_dotenv
+from contextlib import AsyncExitStack
+from services.env import load_environment
+from services.clients import get_runway_client, services
+from utils.video_jobs import VideoJobManager
+from utils.metrics import instrument, record_error
+from utils.circuit_breaker import circuit_breaker, route
+from utils.deadline import remaining, within_deadline
+from utils.rate_limit import estimate_tokens, rate_limited
 
 # Configura il logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # Load environment variables
-load_dotenv(override=True)
-# Configura le API Key
-RUNWAYML_API_KEY = os.getenv("RUNWAYML_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.error("OPENAI_API_KEY is missing.")
+load_environment()
 
-if not RUNWAYML_API_KEY:
-    logger.error("RUNWAY_API_SECRET is missing.")
+# Shared tracker of the RunwayML renders in flight
+video_jobs = VideoJobManager(
+    get_runway_client,
+    initial_delay=float(os.getenv("RUNWAY_POLL_INITIAL_DELAY", "2")),
+    max_delay=float(os.getenv("RUNWAY_POLL_MAX_DELAY", "15")),
+    backoff_factor=float(os.getenv("RUNWAY_POLL_BACKOFF_FACTOR", "1.5")),
+    timeout=float(os.getenv("RUNWAY_TASK_TIMEOUT", "600")),
+    max_running=int(os.getenv("RUNWAY_MAX_RUNNING_TASKS", "1000")),  # Tasks the account may run at once
+    poll_timeout=float(os.getenv("RUNWAY_POLL_TIMEOUT", "10")),  # Bound of a single status check
+)
 
 
-def generate_video_prompt_with_gpt(summary: str, prompt: str, tone: str, platform: str) -> str:
+@instrument("video_prompt")
+async def generate_video_prompt_with_gpt(summary: str, prompt: str, tone: str, platform: str) -> str:
     """
     Generates a detailed prompt for video generation using GPT-4o.
 
@@ -35,7 +44,6 @@ def generate_video_prompt_with_gpt(summary: str, prompt: str, tone: str, platfor
         return "Create a visually engaging video with a professional style."
 
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
         messages = [
             {
                 "role": "system",
@@ -59,12 +67,15 @@ def generate_video_prompt_with_gpt(summary: str, prompt: str, tone: str, platfor
                 )
             }
         ]
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=200
-        )
+        provider, model = route("openai", "gpt-4o")
+        async with rate_limited(provider, model, tokens=estimate_tokens(messages, 200)), \
+                circuit_breaker(provider, model):
+            response = await within_deadline(services.get(provider).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=200
+            ))
         video_prompt = response.choices[0].message.content.strip()
 
         # Truncate the prompt to ensure it is less than 512 characters
@@ -75,10 +86,12 @@ def generate_video_prompt_with_gpt(summary: str, prompt: str, tone: str, platfor
         return video_prompt
     except Exception as e:
         logger.exception(f"Error generating video prompt with GPT-4o: {e}")
+        record_error("video_prompt")
         return "Create a visually engaging video with a professional style."
 
 
-def generate_video(prompt_text: str, prompt_image_url: str, duration: int = 10) -> str:
+@instrument("runway")
+async def generate_video(prompt_text: str, prompt_image_url: str, duration: int = 10) -> str:
     """
     Generate a video using the RunwayML SDK.
 
@@ -87,36 +100,38 @@ def generate_video(prompt_text: str, prompt_image_url: str, duration: int = 10)
     :param duration: Duration of the video in seconds (default: 10).
     :return: URL of the generated video or a placeholder in case of an error.
     """
-    if not prompt_text or not prompt_image_url:
+    if not prompt_text or not prompt_image_url or prompt_image_url.startswith("/placeholder"):
+        # No render without a real first frame, e.g. while the DALL·E circuit is open
         logger.warning("Prompt text or image URL is missing for video generation.")
         return "/placeholder_video_url.mp4"
 
     try:
-        client = RunwayML(api_key=RUNWAYML_API_KEY)
-        task = client.image_to_video.create(
-            model="gen3a_turbo",
-            prompt_image=prompt_image_url,
-            prompt_text=prompt_text,
-            duration=duration,
-            watermark=False,
-            ratio="1280:768"
-        )
-        logger.info(f"Video generation task started. Task ID: {task.id}")
-        
-        # Wait for the task to complete
-        task_result = client.tasks.retrieve(task.id)
-        while task_result.status not in ["COMPLETED", "FAILED"]:
-            logger.info(f"Task {task.id} is still {task_result.status}. Waiting...")
-            task_result = client.tasks.retrieve(task.id)
-
-        if task_result.status == "COMPLETED":
-            video_url = task_result.data.get("url")
-            logger.info(f"Video generation completed. Video URL: {video_url}")
-            return video_url
-        else:
-            logger.error(f"Task {task.id} failed with status: {task_result.status}")
+        # A render holds one of the RUNWAY_MAX_RUNNING_TASKS slots until it completes, but only the
+        # creation of its task is rate limited. The circuit breaker covers the creation and the render,
+        # not the wait for a rate limit slot
+        async with video_jobs.slot(), AsyncExitStack() as guarded:
+            async with rate_limited("runway", "gen3a_turbo"):
+                await guarded.enter_async_context(circuit_breaker("runway", "gen3a_turbo"))
+                task_id = await video_jobs.create(
+                    model="gen3a_turbo",
+                    prompt_image=prompt_image_url,
+                    prompt_text=prompt_text,
+                    duration=duration,
+                    watermark=False,
+                    ratio="1280:768"
+                )
+            # The shared poller checks the task with exponential backoff until it completes.
+            # Shared by the requests waiting for this video, the render is not bound to their deadlines:
+            # it is abandoned, and cancelled, once they all gave up
+            video_url = await video_jobs.wait(task_id, remaining())
+        if not video_url:
+            logger.error("Video generation completed without an output URL.")
             return "/placeholder_video_url.mp4"
 
+        logger.info(f"Video generation completed. Video URL: {video_url}")
+        return video_url
+
     except Exception as e:
         logger.exception(f"Error generating video with RunwayML: {e}")
+        record_error("runway")
         return "/placeholder_video_url.mp4"
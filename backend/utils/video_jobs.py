@@ -0,0 +1,274 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from utils.deadline import DeadlineExceeded, detached, within_deadline
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Statuses of a RunwayML task
+SUCCEEDED_STATUSES = {"SUCCEEDED"}
+FAILED_STATUSES = {"FAILED", "CANCELLED"}
+
+
+class VideoJob:
+    """
+    A RunwayML task tracked by the VideoJobManager.
+    """
+
+    def __init__(self, task_id: str, future: asyncio.Future, deadline: float, delay: float, next_poll_at: float,
+                 request_deadline: bool = False):
+        self.task_id = task_id
+        self.future = future
+        self.deadline = deadline
+        self.request_deadline = request_deadline  # The deadline is the one of the request, not of the task
+        self.delay = delay
+        self.next_poll_at = next_poll_at
+        self.polling = False  # A status check is in flight
+
+
+class VideoJobManager:
+    """
+    Track RunwayML render tasks from a single background poller.
+
+    Each tracked task is polled with exponential backoff; at every tick the poller starts the
+    checks of all the tasks that are due, each on its own, so one worker can follow hundreds
+    of renders without a loop per task and a slow check does not hold back the others. Callers get an awaitable future resolved with the video URL.
+    At most `max_running` renders are in flight at once, to stay within the quota of the account.
+
+    :param client_factory: Callable returning the AsyncRunwayML client.
+    :param initial_delay: Delay before the first poll of a task, in seconds.
+    :param max_delay: Upper bound of the delay between two polls of a task, in seconds.
+    :param backoff_factor: Multiplier applied to the delay after each poll.
+    :param timeout: Default deadline of a task, in seconds from its submission.
+    :param max_running: Maximum number of renders in flight.
+    :param poll_timeout: Maximum duration of a single status check or cancellation, in seconds;
+                         a check that takes longer is retried at the next poll of the task.
+    """
+
+    def __init__(self, client_factory: Callable, initial_delay: float = 2.0, max_delay: float = 15.0,
+                 backoff_factor: float = 1.5, timeout: float = 600.0, max_running: int = 1000,
+                 poll_timeout: float = 10.0):
+        self.client_factory = client_factory
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.max_running = max_running
+        self.poll_timeout = poll_timeout
+        self._jobs = {}
+        self._loop = None
+        self._wakeup = None
+        self._poller = None
+        self._slots = None
+        self._checks = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._poller is not None and not self._poller.done():
+            return
+        if self._loop is not loop:
+            # The poller, its event and the futures are bound to the running event loop
+            self._loop = loop
+            self._jobs = {}
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_running)
+        elif self._poller is not None and not self._poller.cancelled() and self._poller.exception() is not None:
+            # Keep the tracked tasks: the new poller picks them up
+            logger.error(f"Runway poller stopped ({self._poller.exception()!r}), restarting it for "
+                         f"{len(self._jobs)} tracked tasks")
+        with detached():
+            self._poller = loop.create_task(self._poll_loop(), name="runway-poller")
+
+    def track(self, task_id: str, timeout: Optional[float] = None) -> asyncio.Future:
+        """
+        Start tracking a submitted task.
+
+        :param task_id: ID of the RunwayML task.
+        :param timeout: Time left to the deadline of the request, in seconds; the task never
+                        outlives the manager timeout.
+        :return: Future resolved with the URL of the video, or with an exception if the task
+                 fails or misses its deadline (DeadlineExceeded if it is the one of the request).
+        """
+        self._ensure_started()
+        if task_id in self._jobs:
+            return self._jobs[task_id].future
+        now = self._loop.time()
+        deadline = now + self.timeout
+        request_deadline = timeout is not None and timeout < self.timeout
+        if request_deadline:
+            deadline = now + timeout
+        future = self._loop.create_future()
+        self._jobs[task_id] = VideoJob(task_id, future, deadline, self.initial_delay,
+                                       min(now + self.initial_delay, deadline), request_deadline)
+        self._wakeup.set()
+        return future
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the `max_running` render slots, from the creation of a task to its result.
+
+        :raises DeadlineExceeded: If no slot frees up before the request deadline.
+        """
+        self._ensure_started()
+        slots = self._slots
+        await within_deadline(slots.acquire())
+        try:
+            yield
+        finally:
+            slots.release()
+
+    async def create(self, **params) -> str:
+        """
+        Create an image-to-video task.
+
+        :param params: Arguments of `image_to_video.create`.
+        :return: ID of the task, to `track`.
+        """
+        task = await within_deadline(self.client_factory().image_to_video.create(**params))
+        logger.info(f"Video generation task started. Task ID: {task.id}")
+        return task.id
+
+    async def wait(self, task_id: str, timeout: Optional[float] = None) -> str:
+        """
+        Track a submitted task and wait for its result, never past its deadline.
+
+        :param task_id: ID of the RunwayML task.
+        :param timeout: Time left to the deadline of the request, in seconds.
+        :return: URL of the generated video.
+        :raises DeadlineExceeded: If the request deadline passes first; TimeoutError for the task deadline.
+        """
+        future = self.track(task_id, timeout)
+        job = self._jobs.get(task_id)
+        if job is None:
+            return await future
+        # The poller settles the future at the deadline; the margin only matters if it is stuck
+        try:
+            return await asyncio.wait_for(future, job.deadline - self._loop.time() + self.max_delay)
+        except asyncio.TimeoutError as e:
+            if future.done() and not future.cancelled():
+                # Failed by the poller itself
+                raise
+            if job.request_deadline:
+                raise DeadlineExceeded(f"Task {task_id} did not complete within the request deadline") from e
+            raise TimeoutError(f"Task {task_id} did not complete in time") from e
+
+    async def submit(self, timeout: Optional[float] = None, **params) -> str:
+        """
+        Create an image-to-video task and wait for its result.
+
+        :param timeout: Time left to the deadline of the request, in seconds.
+        :param params: Arguments of `image_to_video.create`.
+        :return: URL of the generated video.
+        """
+        async with self.slot():
+            return await self.wait(await self.create(**params), timeout)
+
+    def in_flight(self) -> int:
+        """
+        Return the number of tasks currently tracked.
+        """
+        return len(self._jobs)
+
+    async def close(self):
+        """
+        Stop the poller. Pending futures are cancelled.
+        """
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        for check in self._checks:
+            check.cancel()
+        await asyncio.gather(*self._checks, return_exceptions=True)
+        for job in self._jobs.values():
+            job.future.cancel()
+        self._jobs = {}
+
+    async def _poll_loop(self):
+        while True:
+            # Jobs being checked are left out until their check completes and wakes the poller up
+            idle = [job for job in self._jobs.values() if not job.polling]
+            if not idle:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = self._loop.time()
+            next_poll_at = min(job.next_poll_at for job in idle)
+            if next_poll_at > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_poll_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for job in idle:
+                if job.next_poll_at <= now:
+                    job.polling = True
+                    check = self._loop.create_task(self._check(job))
+                    self._checks.add(check)
+                    check.add_done_callback(self._checks.discard)
+
+    async def _check(self, job: VideoJob):
+        try:
+            await self._poll(job)
+        except Exception as e:
+            logger.exception(f"Error polling task {job.task_id}: {e}")
+            job.next_poll_at = self._loop.time() + job.delay
+        finally:
+            job.polling = False
+            self._wakeup.set()
+
+    async def _poll(self, job: VideoJob):
+        if job.future.done():
+            # The caller gave up: stop tracking and cancel the render
+            self._jobs.pop(job.task_id, None)
+            await self._cancel_task(job.task_id)
+            return
+
+        now = self._loop.time()
+        if now >= job.deadline:
+            self._jobs.pop(job.task_id, None)
+            if job.request_deadline:
+                # The budget of the request ran out, not the patience with RunwayML
+                job.future.set_exception(DeadlineExceeded(f"Task {job.task_id} did not complete within the request deadline"))
+            else:
+                job.future.set_exception(TimeoutError(f"Task {job.task_id} did not complete in time"))
+            await self._cancel_task(job.task_id)
+            return
+
+        try:
+            # A hung check must not hold back the other tasks due at this tick
+            task = await asyncio.wait_for(self.client_factory().tasks.retrieve(job.task_id), self.poll_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Checking task {job.task_id} took more than {self.poll_timeout:.1f}s, retrying later")
+            task = None
+        except Exception as e:
+            logger.warning(f"Error retrieving task {job.task_id}: {e}")
+            task = None
+
+        if task is not None and task.status in SUCCEEDED_STATUSES:
+            self._jobs.pop(job.task_id, None)
+            if not job.future.done():
+                job.future.set_result(task.output[0] if task.output else None)
+            return
+        if task is not None and task.status in FAILED_STATUSES:
+            self._jobs.pop(job.task_id, None)
+            if not job.future.done():
+                job.future.set_exception(RuntimeError(f"Task {job.task_id} {task.status.lower()}: {task.failure}"))
+            return
+
+        if task is not None:
+            logger.info(f"Task {job.task_id} is still {task.status}. Next check in {job.delay:.1f}s")
+        job.next_poll_at = min(self._loop.time() + job.delay, job.deadline)
+        job.delay = min(job.delay * self.backoff_factor, self.max_delay)
+
+    async def _cancel_task(self, task_id: str):
+        try:
+            await asyncio.wait_for(self.client_factory().tasks.delete(task_id), self.poll_timeout)
+        except Exception as e:
+            logger.warning(f"Unable to cancel task {task_id}: {e}")
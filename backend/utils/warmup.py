@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+import httpx
+from models.requests import ContentRequest
+from services.clients import services
+from services.env import load_environment
+from services.groq import process_prompt_with_groq
+from services.http import get_http_client
+from services.news_retrieval import CONFIG as NEWS_CONFIG, NEWSAPI_KEY, REDDIT_CLIENT_ID, REDDIT_SECRET, reddit_token_manager
+from services.vectara import VECTARA_API_KEY, VECTARA_BASE_URL
+from utils.meme_templates import IMGFLIP_BASE_URL, template_catalogue
+from utils.response_cache import response_cache, response_cache_key
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_environment()
+
+WARMUP_CONFIG = {
+    "enabled": os.getenv("WARMUP_ENABLED", "true").lower() == "true",
+    "timeout": float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30")),
+    # Optional canned prompts, separated by "|", whose Groq processing and cached responses are preloaded
+    "prompts": [prompt.strip() for prompt in os.getenv("WARMUP_PROMPTS", "").split("|") if prompt.strip()],
+}
+
+
+def _upstream_origins() -> list:
+    """
+    Return the origins of the configured providers, whose connections are opened ahead of time.
+    """
+    urls = [IMGFLIP_BASE_URL]
+    if NEWSAPI_KEY:
+        urls.append(NEWS_CONFIG["newsapi"]["base_url"])
+    if REDDIT_CLIENT_ID and REDDIT_SECRET:
+        urls += [NEWS_CONFIG["reddit"]["auth_base_url"], NEWS_CONFIG["reddit"]["api_base_url"]]
+    if VECTARA_API_KEY:
+        urls.append(VECTARA_BASE_URL)
+    for name in ("openai", "groq", "runway"):
+        try:
+            urls.append(str(services.get(name).base_url))
+        except Exception:
+            # Not configured: warm_up_clients already reported it
+            pass
+    origins = []
+    for url in urls:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in origins:
+            origins.append(origin)
+    return origins
+
+
+async def _open_connection(origin: str):
+    # Any answer will do: the point is to leave a resolved, TLS-established connection in the pool
+    try:
+        await get_http_client().head(origin)
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Unable to connect to {origin}: {e}") from e
+
+
+async def warm_up_clients() -> dict:
+    errors = await asyncio.to_thread(services.warm_up)
+    return {"unavailable": errors} if errors else {}
+
+
+async def warm_up_connections() -> dict:
+    origins = _upstream_origins()
+    results = await asyncio.gather(*(_open_connection(origin) for origin in origins), return_exceptions=True)
+    failed = {origin: str(result) for origin, result in zip(origins, results) if isinstance(result, Exception)}
+    return {"opened": len(origins) - len(failed), "failed": failed}
+
+
+async def warm_up_reddit_token() -> dict:
+    if not (REDDIT_CLIENT_ID and REDDIT_SECRET):
+        return {"skipped": "Reddit is not configured"}
+    if await reddit_token_manager.get_token() is None:
+        raise RuntimeError("Unable to fetch the Reddit token")
+    return {}
+
+
+async def warm_up_meme_templates() -> dict:
+    if template_catalogue.templates and not template_catalogue.is_stale():
+        return {"templates": len(template_catalogue.templates), "source": "disk"}
+    if not await template_catalogue.refresh():
+        raise RuntimeError("Unable to download the meme templates")
+    return {"templates": len(template_catalogue.templates), "source": "imgflip"}
+
+
+async def warm_up_prompts() -> dict:
+    cached = 0
+    for prompt in WARMUP_CONFIG["prompts"]:
+        req = ContentRequest(prompt=prompt)
+        await process_prompt_with_groq(req.prompt, req.tone, req.platform)
+        # Loads the response from the on-disk cache, if any, into memory
+        if response_cache.lookup(response_cache_key(req)) is not None:
+            cached += 1
+    return {"prompts": len(WARMUP_CONFIG["prompts"]), "cached_responses": cached}
+
+
+async def _step(name: str, step) -> dict:
+    started = time.perf_counter()
+    try:
+        result = {"status": "ok", **await step()}
+    except Exception as e:
+        logger.warning(f"Warm-up step {name} failed: {e}")
+        result = {"status": "failed", "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def warm_up() -> dict:
+    """
+    Pre-establish the upstream state so that the first requests do not pay for it.
+
+    Builds the provider clients, then concurrently opens a pooled connection to each configured
+    provider, fetches the Reddit token, loads the meme templates and preloads the canned prompts.
+    Failed steps are reported but do not prevent the API from serving.
+
+    Returns:
+        dict: Status and duration of each step, and the total duration.
+    """
+    started = time.perf_counter()
+    report = {"clients": await _step("clients", warm_up_clients)}
+    steps = {
+        "connections": warm_up_connections,
+        "reddit_token": warm_up_reddit_token,
+        "meme_templates": warm_up_meme_templates,
+        "prompts": warm_up_prompts,
+    }
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(_step(name, step) for name, step in steps.items())), WARMUP_CONFIG["timeout"]
+        )
+        report.update(zip(steps, results))
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up did not complete within {WARMUP_CONFIG['timeout']}s")
+        report["timeout"] = True
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Warm-up completed in {report['seconds']}s")
+    return report
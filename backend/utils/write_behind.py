@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Hashable
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class WriteBehind:
+    """
+    Batch the writes to a local store and apply them in a worker thread, off the event loop.
+
+    `put` records a pending write and returns at once. Called from a running event loop, the
+    pending writes are handed to `write` as a single batch `delay` seconds later, in a thread;
+    called outside of any event loop (e.g. from a command line tool), they are written at once.
+    Until they are written, pending values can be read back with `get`. Batches are written
+    in order, and within a batch the latest write of a key comes last.
+
+    Args:
+        name (str): Name of the store, used in logs.
+        write (Callable[[dict], None]): Writes a batch of values by key, in one transaction.
+        delay (float): How long writes are batched before being flushed, in seconds.
+    """
+
+    def __init__(self, name: str, write: Callable[[dict], None], delay: float = 1.0):
+        self.name = name
+        self.delay = delay
+        self._write = write
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._loop = None
+        self._task = None
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Record a write of `value` under `key`, replacing any pending write of the same key.
+        """
+        self.update({key: value})
+
+    def update(self, values: dict):
+        """
+        Record the writes of several values by key, as a single batch.
+        """
+        with self._lock:
+            for key, value in values.items():
+                self._pending.pop(key, None)
+                self._pending[key] = value
+        self._schedule()
+
+    def reset(self, key: Hashable, value: Any):
+        """
+        Drop every pending write and record `value` under `key`, e.g. a marker clearing the
+        whole store: the writes recorded afterwards come after it.
+        """
+        with self._lock:
+            self._pending = {key: value}
+        self._schedule()
+
+    def _schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._task = loop.create_task(self._flush_later())
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the pending value of `key`, or `default` if it has no pending write.
+        """
+        with self._lock:
+            return self._pending.get(key, default)
+
+    def discard(self, key: Hashable = _MISSING):
+        """
+        Drop the pending write of `key`, or every pending write if no key is given.
+
+        Waits for the batch being written, if any, so that a delete issued afterwards is not
+        overwritten by it.
+        """
+        with self._write_lock, self._lock:
+            if key is _MISSING:
+                self._pending.clear()
+            else:
+                self._pending.pop(key, None)
+
+    def flush(self):
+        """
+        Write every pending value now, in the calling thread.
+        """
+        with self._write_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.exception(f"Error writing {len(batch)} entries of '{self.name}' to disk: {e}")
+            with self._lock:
+                for key, value in batch.items():
+                    if self._pending.get(key, _MISSING) is value:
+                        del self._pending[key]
+
+    async def close(self):
+        """
+        Write every pending value, without waiting for the end of the current batching delay.
+        """
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _flush_later(self):
+        # Writes recorded while a batch is being written are picked up by the next round
+        while self._pending:
+            await asyncio.sleep(self.delay)
+            await asyncio.to_thread(self.flush)
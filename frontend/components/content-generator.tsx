@@ -8,33 +8,80 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '../components/ui/tabs'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select'
 import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle } from '../components/ui/card'
 import { Loader2, RefreshCw } from 'lucide-react'
-import axios from 'axios'
+
+type GeneratedContent = {
+  text: string
+  image: string
+  video: string
+  meme: string
+  sources: string[]
+  summary: string
+}
+
+const CONTENT_EVENTS = ['summary', 'text', 'image', 'video', 'meme', 'sources']
+// Pieces of the summary and of the post, streamed before the event carrying the complete text
+const DELTA_EVENTS: Record<string, 'summary' | 'text'> = { summary_delta: 'summary', text_delta: 'text' }
 
 export default function ContentGenerator() {
   const [prompt, setPrompt] = useState('')
   const [tone, setTone] = useState('humorous')
   const [platform, setPlatform] = useState('twitter')
   const [isLoading, setIsLoading] = useState(false)
-  const [generatedContent, setGeneratedContent] = useState<{
-    text: string
-    image: string
-    video: string
-    meme: string
-    sources: string[]
-  } | null>(null)
+  const [generatedContent, setGeneratedContent] = useState<GeneratedContent | null>(null)
   const [error, setError] = useState('')
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     setIsLoading(true)
     setError('')
+    setGeneratedContent(null)
     try {
-      const response = await axios.post('http://localhost:8000/generate', {
-        prompt,
-        tone,
-        platform,
+      // Each asset is streamed as a Server-Sent Event as soon as it is ready
+      const response = await fetch('http://localhost:8000/generate/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ prompt, tone, platform }),
       })
-      setGeneratedContent(response.data)
+      if (!response.ok || !response.body) {
+        throw new Error(`Unexpected response: ${response.status}`)
+      }
+      setGeneratedContent({ text: '', image: '', video: '', meme: '', sources: [], summary: '' })
+
+      const handleEvent = (chunk: string) => {
+        let event = 'message'
+        let data = ''
+        for (const line of chunk.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (event === 'error') {
+          throw new Error(data)
+        } else if (event === 'done') {
+          const content = JSON.parse(data)
+          setGeneratedContent((previous) => ({ ...content, summary: previous?.summary ?? '' }))
+        } else if (event in DELTA_EVENTS) {
+          const field = DELTA_EVENTS[event]
+          const piece = JSON.parse(data)
+          setGeneratedContent((previous) => previous && { ...previous, [field]: previous[field] + piece })
+        } else if (CONTENT_EVENTS.includes(event)) {
+          const value = JSON.parse(data)
+          setGeneratedContent((previous) => previous && { ...previous, [event]: value })
+        }
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        let boundary
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          handleEvent(buffer.slice(0, boundary))
+          buffer = buffer.slice(boundary + 2)
+        }
+      }
     } catch (err) {
       console.error('Error generating content:', err)
       setError('Failed to generate content. Please try again.')
@@ -145,6 +192,12 @@ export default function ContentGenerator() {
               )}
             </TabsContent>
           </Tabs>
+          {generatedContent.summary && (
+            <div className="mt-4 w-full">
+              <h4 className="font-semibold mb-2">Summary:</h4>
+              <p className="text-sm">{generatedContent.summary}</p>
+            </div>
+          )}
           {generatedContent.sources.length > 0 && (
             <div className="mt-4 w-full">
               <h4 className="font-semibold mb-2">Sources:</h4>